@@ -8,5 +8,132 @@ class Settings:
     SUPABASE_SERVICE_KEY: str = os.getenv('SUPABASE_SERVICE_KEY')
     SUPABASE_ANON_KEY: str = os.getenv('SUPABASE_ANON_KEY')
     SUPABASE_BUCKET_NAME: str = 'slidedecks'
+    OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY')
 
-settings = Settings()
\ No newline at end of file
+    # Auth: tokens are verified locally with the project's JWT secret (HS256)
+    # or the project's JWKS (asymmetric keys), falling back to the auth server
+    SUPABASE_JWT_SECRET: str = os.getenv('SUPABASE_JWT_SECRET')
+    SUPABASE_JWT_AUDIENCE: str = os.getenv('SUPABASE_JWT_AUDIENCE', 'authenticated')
+    AUTH_CACHE_MAX_SIZE: int = int(os.getenv('AUTH_CACHE_MAX_SIZE', '1024'))
+
+    # Per-user PostgREST clients share one HTTP connection pool
+    SUPABASE_CLIENT_POOL_SIZE: int = int(os.getenv('SUPABASE_CLIENT_POOL_SIZE', '256'))
+    SUPABASE_MAX_CONNECTIONS: int = int(os.getenv('SUPABASE_MAX_CONNECTIONS', '100'))
+    SUPABASE_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv('SUPABASE_MAX_KEEPALIVE_CONNECTIONS', '20'))
+
+    # Rows per PostgREST upsert when writing summaries in bulk
+    SUMMARY_BULK_CHUNK_SIZE: int = int(os.getenv('SUMMARY_BULK_CHUNK_SIZE', '500'))
+
+    # Per-deck cache of SlideSummary reads, invalidated on writes
+    SUMMARY_READ_CACHE_MAX_DECKS: int = int(os.getenv('SUMMARY_READ_CACHE_MAX_DECKS', '512'))
+    SUMMARY_READ_CACHE_TTL: float = float(os.getenv('SUMMARY_READ_CACHE_TTL', '300'))
+
+    # Per-deck cache of the last slides' images and summaries, so clients can
+    # reference the previous slide by number instead of uploading it again
+    SLIDE_CONTEXT_MAX_BYTES: int = int(os.getenv('SLIDE_CONTEXT_MAX_BYTES', str(64 * 1024 * 1024)))
+    SLIDE_CONTEXT_SLIDES_PER_DECK: int = int(os.getenv('SLIDE_CONTEXT_SLIDES_PER_DECK', '2'))
+    SLIDE_CONTEXT_TTL: float = float(os.getenv('SLIDE_CONTEXT_TTL', '900'))
+
+    # Background removal of deleted decks' PDFs
+    STORAGE_DELETE_ATTEMPTS: int = int(os.getenv('STORAGE_DELETE_ATTEMPTS', '3'))
+    STORAGE_DELETE_TIMEOUT: float = float(os.getenv('STORAGE_DELETE_TIMEOUT', '10'))
+
+    # Server-side summarization jobs: a durable SQLite queue run by worker
+    # processes started with `python -m app.worker`. JOB_WORKER_PROCESSES
+    # makes each web process start that many itself instead (single-process
+    # deployments only; with several web processes the workers multiply)
+    JOB_QUEUE_PATH: str = os.getenv('JOB_QUEUE_PATH', '.cache/jobs.sqlite3')
+    JOB_WORKER_PROCESSES: int = int(os.getenv('JOB_WORKER_PROCESSES', '0'))
+    SUMMARIZE_CONCURRENCY: int = int(os.getenv('SUMMARIZE_CONCURRENCY', '8'))  # Jobs per worker process
+    JOB_MAX_ATTEMPTS: int = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_BASE_DELAY: float = float(os.getenv('JOB_RETRY_BASE_DELAY', '5'))
+    JOB_LEASE_SECONDS: float = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+    JOB_POLL_INTERVAL: float = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+    JOB_RETENTION: float = float(os.getenv('JOB_RETENTION', str(7 * 24 * 3600)))
+    # How often the web process picks up summaries written by workers
+    JOB_WATCH_INTERVAL: float = float(os.getenv('JOB_WATCH_INTERVAL', '1'))
+    PDF_RENDER_SCALE: float = float(os.getenv('PDF_RENDER_SCALE', '2.0'))
+    PDF_RENDER_JPEG_QUALITY: int = int(os.getenv('PDF_RENDER_JPEG_QUALITY', '85'))
+
+    # Deck PDFs are only downloaded from the storage bucket, up to this size
+    PDF_MAX_BYTES: int = int(os.getenv('PDF_MAX_BYTES', str(50 * 1024 * 1024)))
+
+    # Largest slide image accepted by the binary upload endpoints
+    SLIDE_IMAGE_MAX_BYTES: int = int(os.getenv('SLIDE_IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+
+    # Slide images are downsampled and re-encoded before vision calls
+    IMAGE_MAX_DIMENSION: int = int(os.getenv('IMAGE_MAX_DIMENSION', '2048'))
+    IMAGE_FORMAT: str = os.getenv('IMAGE_FORMAT', 'JPEG')  # JPEG or WEBP
+    IMAGE_QUALITY: int = int(os.getenv('IMAGE_QUALITY', '80'))
+    IMAGE_DETAIL: str = os.getenv('IMAGE_DETAIL', 'auto')  # auto, low or high
+
+    # Chat history sent to the model is kept within a token budget; older
+    # turns are folded into a running summary cached per session
+    CHAT_HISTORY_TOKEN_BUDGET: int = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '1500'))
+    CHAT_SUMMARY_MAX_TOKENS: int = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '300'))
+    CHAT_SUMMARY_CACHE_SIZE: int = int(os.getenv('CHAT_SUMMARY_CACHE_SIZE', '1024'))
+
+    # Content-addressed cache of generated slide summaries
+    SUMMARY_CACHE_PATH: str = os.getenv('SUMMARY_CACHE_PATH', '.cache/summary_cache.sqlite3')
+    SUMMARY_CACHE_MAX_BYTES: int = int(os.getenv('SUMMARY_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+    # Text-layer-first summarization: slides whose PDF page is mostly
+    # selectable text are summarized from that text instead of the image;
+    # pages with little text or many images, charts or equations still go to vision
+    SUMMARY_TEXT_LAYER: bool = os.getenv('SUMMARY_TEXT_LAYER', 'true').lower() in ('1', 'true', 'yes')
+    TEXT_LAYER_MIN_CHARS: int = int(os.getenv('TEXT_LAYER_MIN_CHARS', '80'))
+    TEXT_LAYER_MAX_VISUAL_COVERAGE: float = float(os.getenv('TEXT_LAYER_MAX_VISUAL_COVERAGE', '0.25'))
+    TEXT_LAYER_MAX_SYMBOL_RATIO: float = float(os.getenv('TEXT_LAYER_MAX_SYMBOL_RATIO', '0.1'))
+    TEXT_LAYER_CACHE_MAX_DECKS: int = int(os.getenv('TEXT_LAYER_CACHE_MAX_DECKS', '64'))
+    TEXT_LAYER_WAIT_TIMEOUT: float = float(os.getenv('TEXT_LAYER_WAIT_TIMEOUT', '2'))
+
+    # Near-duplicate slides: a slide with exactly the previous one's pixels
+    # reuses its summary; a build slide that adds content to a blank region,
+    # changing at most SLIDE_DIFF_MAX_CHANGED_RATIO of its pixels, or any
+    # slide changing at most SLIDE_DIFF_MINOR_CHANGE_RATIO, is summarized
+    # from a crop of the changed region instead of both full slide images
+    SLIDE_DIFF: bool = os.getenv('SLIDE_DIFF', 'true').lower() in ('1', 'true', 'yes')
+    SLIDE_DIFF_MINOR_CHANGE_RATIO: float = float(os.getenv('SLIDE_DIFF_MINOR_CHANGE_RATIO', '0.002'))
+    SLIDE_DIFF_MAX_CHANGED_RATIO: float = float(os.getenv('SLIDE_DIFF_MAX_CHANGED_RATIO', '0.3'))
+    SLIDE_DIFF_MAX_HASH_DISTANCE: int = int(os.getenv('SLIDE_DIFF_MAX_HASH_DISTANCE', '24'))
+    SLIDE_DIFF_MAX_DECKS: int = int(os.getenv('SLIDE_DIFF_MAX_DECKS', '1024'))
+
+    # Speculative background summarization of the slides after the one being
+    # viewed, capped per user and overall so it never crowds out foreground calls
+    PREFETCH_SLIDES: int = int(os.getenv('PREFETCH_SLIDES', '2'))
+    PREFETCH_MAX_PER_USER: int = int(os.getenv('PREFETCH_MAX_PER_USER', '1'))
+    PREFETCH_CONCURRENCY: int = int(os.getenv('PREFETCH_CONCURRENCY', '4'))
+
+    # Deck-wide embedding index over slide summaries for chat retrieval
+    EMBEDDING_MODEL: str = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+    EMBEDDING_DIMENSIONS: int = int(os.getenv('EMBEDDING_DIMENSIONS', '256'))
+    RETRIEVAL_INDEX_DIR: str = os.getenv('RETRIEVAL_INDEX_DIR', '.cache/retrieval')
+    RETRIEVAL_MAX_DECKS: int = int(os.getenv('RETRIEVAL_MAX_DECKS', '256'))
+    RETRIEVAL_TOP_K: int = int(os.getenv('RETRIEVAL_TOP_K', '3'))
+    RETRIEVAL_TOKEN_BUDGET: int = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '800'))
+    RETRIEVAL_MIN_SCORE: float = float(os.getenv('RETRIEVAL_MIN_SCORE', '0.2'))
+
+    # Shared OpenAI gateway: request/token rate limits, concurrency and
+    # per-user fair queueing. The limits are the account's; each of the
+    # LLM_PROCESSES processes calling OpenAI (web and worker processes
+    # together) gets an equal share. A limit of 0 turns it off
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '500'))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv('LLM_TOKENS_PER_MINUTE', '200000'))
+    LLM_PROCESSES: int = int(os.getenv('LLM_PROCESSES', '1'))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+    LLM_MAX_QUEUE_DEPTH: int = int(os.getenv('LLM_MAX_QUEUE_DEPTH', '200'))
+    LLM_MAX_QUEUE_PER_USER: int = int(os.getenv('LLM_MAX_QUEUE_PER_USER', '20'))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))
+    LLM_MAX_RETRIES: int = int(os.getenv('LLM_MAX_RETRIES', '3'))
+    LLM_MAX_RETRY_DELAY: float = float(os.getenv('LLM_MAX_RETRY_DELAY', '20'))
+
+    # Bearer token required to scrape /metrics; unset leaves it open
+    METRICS_TOKEN: str = os.getenv('METRICS_TOKEN')
+
+    # Startup opens Supabase/OpenAI connections and local caches before serving
+    # so the first request after a cold start doesn't pay for them
+    STARTUP_WARM_UP: bool = os.getenv('STARTUP_WARM_UP', 'true').lower() in ('1', 'true', 'yes')
+    STARTUP_WARM_UP_TIMEOUT: float = float(os.getenv('STARTUP_WARM_UP_TIMEOUT', '3'))
+    SHUTDOWN_TIMEOUT: float = float(os.getenv('SHUTDOWN_TIMEOUT', '10'))
+
+settings = Settings()
@@ -1,8 +1,16 @@
+import time
+
+# Cold start time is logged from here, before the heavy imports
+_started_at = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import slide_deck, slide_summary, chat
+from app.resources import lifespan
+from app.routes import slide_deck, slide_summary, chat, monitoring
+from app.utils.metrics_middleware import MetricsMiddleware, TimedJSONResponse
 
-app = FastAPI()
+# Shared clients are warmed up on startup and closed on shutdown
+app = FastAPI(default_response_class=TimedJSONResponse, lifespan=lifespan(_started_at))
 
 origins = [
     "https://deck-study-buddy.vercel.app",  # e.g. https://myapp.vercel.app
@@ -16,14 +24,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Per-request latency breakdown, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(slide_deck.router, prefix="/api/slide-decks", tags=["slide-decks"])
 app.include_router(slide_summary.router, prefix="/api/slide-summaries", tags=["slide-summaries"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
-
-# Optional: Health check endpoint
-# @app.get("/health")
-# def health_check():
-#     return {"status": "healthy"}
\ No newline at end of file
+app.include_router(monitoring.router, tags=["monitoring"])
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from app.config import settings
+from app.services.auth_service import auth_service
+from app.services.job_queue import job_queue
+from app.services.job_watcher import job_watcher
+from app.services.llm_gateway import llm_gateway
+from app.services.pdf_service import pdf_service
+from app.services.prefetch_service import prefetch_service
+from app.services.retrieval_service import retrieval_service
+from app.services.summary_cache import summary_cache
+from app.services.supabase_service import supabase_service
+
+
+class Resources:
+    """
+    Connection pools, clients and local caches shared by the whole app
+
+    The services create their clients when imported, but nothing touches the
+    network or disk until startup(), which opens the Supabase and OpenAI
+    connections, the summary cache and the job queue concurrently so the first
+    request after a cold start finds them ready. shutdown() drains background
+    work and closes everything. The worker processes (app.worker) use the
+    same startup and shutdown.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.warm_up_results = {}
+
+    async def _warm_up(self, name: str, warm_up):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(warm_up(), settings.STARTUP_WARM_UP_TIMEOUT)
+            self.warm_up_results[name] = round((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            # Best effort: the connection is opened on first use instead
+            print(f"Warm-up of {name} failed: {e!r}")
+            self.warm_up_results[name] = None
+
+    async def startup(self):
+        await self._warm_up('summary_cache', summary_cache.open)
+        await self._warm_up('job_queue', job_queue.open)
+        if settings.STARTUP_WARM_UP:
+            await asyncio.gather(
+                self._warm_up('supabase', supabase_service.warm_up),
+                self._warm_up('auth', auth_service.warm_up),
+                self._warm_up('openai', llm_gateway.warm_up),
+            )
+        self.ready = True
+
+    async def shutdown(self):
+        self.ready = False
+        # Let background work finish first so it can still use the clients
+        await prefetch_service.close()
+        await retrieval_service.close(settings.SHUTDOWN_TIMEOUT)
+
+        for name, close in (
+            ('supabase', supabase_service.close),
+            ('auth', auth_service.close),
+            ('openai', llm_gateway.close),
+            ('pdf', pdf_service.close),
+        ):
+            try:
+                await close()
+            except Exception as e:
+                print(f"Error closing {name} clients: {e!r}")
+        summary_cache.close()
+        job_queue.close()
+
+
+resources = Resources()
+
+
+def lifespan(started_at: float):
+    """
+    Build the FastAPI lifespan handler
+
+    Besides the shared resources, it starts the job watcher, which picks up
+    summaries written by worker processes, and JOB_WORKER_PROCESSES workers
+    (0 by default; they normally run on their own), and stops them on shutdown.
+
+    :param started_at: time.perf_counter() when the app started importing
+    """
+    @asynccontextmanager
+    async def handler(app: FastAPI):
+        # Imported here since the worker module imports this one
+        from app.worker import start_worker_processes, stop_worker_processes
+
+        imported_at = time.perf_counter()
+        await resources.startup()
+        workers = await start_worker_processes(settings.JOB_WORKER_PROCESSES)
+        job_watcher.start()
+        ready_at = time.perf_counter()
+        print(
+            f"Startup took {(ready_at - started_at) * 1000:.0f} ms "
+            f"(imports {(imported_at - started_at) * 1000:.0f} ms, "
+            f"warm-up {(ready_at - imported_at) * 1000:.0f} ms: {resources.warm_up_results})"
+        )
+        try:
+            yield
+        finally:
+            await job_watcher.close()
+            await stop_worker_processes(workers, settings.SHUTDOWN_TIMEOUT)
+            await resources.shutdown()
+    return handler
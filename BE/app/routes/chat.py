@@ -1,20 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, List
-import os
-from dotenv import load_dotenv
-from openai import OpenAI
 
 from app.routes.slide_deck import get_current_user
+from app.services.context_service import context_service
+from app.services.llm_gateway import llm_gateway, LLMOverloadedError
+from app.services.retrieval_service import retrieval_service
+from app.services.supabase_service import supabase_service
+from app.utils.sse import format_sse, SSE_HEADERS
 
 router = APIRouter()
 security = HTTPBearer()
 
-# Initialize OpenAI client
-load_dotenv(override=True)
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
 class ChatRequest(BaseModel):
     """
     Request model for chat interactions
@@ -24,6 +23,81 @@ class ChatRequest(BaseModel):
     slideNumber: Optional[int] = None
     slideSummary: Optional[str] = None
     chatHistory: Optional[List[str]] = None
+    sessionId: Optional[str] = None  # Identifies the chat session for history compaction
+
+async def find_related_slides(chat_data: ChatRequest, user_data: dict):
+    """
+    Find other slides in the deck relevant to the user's question
+    
+    Retrieval is best effort: if it fails the chat carries on with the
+    current slide only.
+    
+    :param chat_data: Chat request data
+    :param user_data: Dictionary containing user ID and token
+    :return: Related SlideSummary rows, best first
+    """
+    if not chat_data.slideDeckId:
+        return []
+    try:
+        summaries = await supabase_service.get_slide_summaries_by_deck_id(
+            chat_data.slideDeckId,
+            user_data["token"],
+            user_data["refresh_token"]
+        )
+        return await retrieval_service.search(
+            chat_data.slideDeckId,
+            summaries,
+            chat_data.userMessage,
+            exclude_slide=chat_data.slideNumber,
+            user_id=user_data["user_id"]
+        )
+    except Exception as e:
+        print(f"Error retrieving related slides: {e}")
+        return []
+
+async def build_chat_messages(chat_data: ChatRequest, user_data: dict):
+    """
+    Construct the context-rich prompt for a chat message
+    
+    :param chat_data: Chat request data
+    :param user_data: Dictionary containing user ID and token
+    :return: Chat completion messages and stats on the context used
+    """
+    chat_history = await context_service.build_history(
+        context_service.session_key(user_data["user_id"], chat_data.sessionId, chat_data.slideDeckId),
+        chat_data.chatHistory,
+        user_id=user_data["user_id"]
+    )
+    related_slides = await find_related_slides(chat_data, user_data)
+    related_text = ' '.join(
+        f"Slide {slide['slide_number']}: {slide['summary_text']}" for slide in related_slides
+    )
+    
+    context_prompt = f"""
+    Current Slide ({chat_data.slideNumber}): {chat_data.slideSummary or "No summary available"}
+    Related Slides: {related_text or "None"}
+    Previous Conversation: {chat_history.text}
+    
+    User Question: {chat_data.userMessage}
+    
+    Please provide a helpful, concise, and academic response that directly addresses the user's question while referencing the slide context.
+    """
+    
+    messages = [
+        {
+            "role": "system",
+            "content": "You are an academic assistant helping a student understand slide content."
+        },
+        {
+            "role": "user",
+            "content": context_prompt
+        }
+    ]
+    context = {
+        **chat_history.stats(),
+        "related_slides": [slide['slide_number'] for slide in related_slides]
+    }
+    return messages, context
 
 @router.post("")
 async def process_chat(
@@ -38,37 +112,66 @@ async def process_chat(
     :return: AI response
     """
     try:
-        # Construct context-rich prompt
-        context_prompt = f"""
-        Current Slide ({chat_data.slideNumber}): {chat_data.slideSummary or "No summary available"}
-        Previous Conversation: {' '.join(chat_data.chatHistory) if chat_data.chatHistory else ''}
-        
-        User Question: {chat_data.userMessage}
-        
-        Please provide a helpful, concise, and academic response that directly addresses the user's question while referencing the slide context.
-        """
+        messages, context = await build_chat_messages(chat_data, user_id)
         
         # Call OpenAI API
-        response = openai_client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
+            user_id["user_id"],
             model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an academic assistant helping a student understand slide content."
-                },
-                {
-                    "role": "user",
-                    "content": context_prompt
-                }
-            ],
+            messages=messages,
             max_tokens=1000
         )
         
         ai_response = response.choices[0].message.content
         
         return {
-            "response": ai_response
+            "response": ai_response,
+            "context": context
         }
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def stream_chat(
+    chat_data: ChatRequest, 
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Process a chat message and stream the AI response as server-sent events
+    
+    Emits a "token" event per generated chunk, then a single "done" event
+    carrying the full response, or an "error" event if generation fails.
+    
+    :param chat_data: Chat request data
+    :param user_id: ID of the authenticated user
+    :return: text/event-stream response
+    """
+    async def event_stream():
+        chunks = []
+        try:
+            messages, context = await build_chat_messages(chat_data, user_id)
+            stream = llm_gateway.stream_chat_completion(
+                user_id["user_id"],
+                model="gpt-4o-mini",
+                messages=messages,
+                max_tokens=1000
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    chunks.append(content)
+                    yield format_sse("token", {"content": content})
+            
+            yield format_sse("done", {"response": ''.join(chunks), "context": context})
+        except LLMOverloadedError as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error streaming chat response: {e}")
+            yield format_sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
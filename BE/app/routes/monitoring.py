@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+
+from app.config import settings
+from app.services.metrics_service import metrics_service
+from app.services.summary_cache import summary_cache
+from app.services.summary_read_cache import summary_read_cache
+from app.services.supabase_service import supabase_service
+from app.services.single_flight import summary_flights
+from app.services.llm_gateway import llm_gateway
+from app.services.image_service import image_service
+from app.services.text_layer_service import text_layer_service
+from app.services.prefetch_service import prefetch_service
+from app.services.job_queue import job_queue
+from app.services.job_watcher import job_watcher
+from app.services.slide_diff_service import slide_diff_service
+from app.services.slide_context_cache import slide_context_cache
+
+router = APIRouter()
+
+metrics_service.register_collector('summary_cache', summary_cache.stats)
+metrics_service.register_collector('summary_read_cache', lambda: {
+    "hits": summary_read_cache.hits,
+    "misses": summary_read_cache.misses,
+})
+metrics_service.register_collector('client_pool', supabase_service.client_pool.stats)
+metrics_service.register_collector('summary_flights', summary_flights.stats)
+metrics_service.register_collector('llm_gateway', llm_gateway.stats)
+metrics_service.register_collector('text_layer', text_layer_service.stats)
+metrics_service.register_collector('prefetch', prefetch_service.stats)
+metrics_service.register_collector('job_queue', job_queue.stats)
+metrics_service.register_collector('job_watcher', job_watcher.stats)
+metrics_service.register_collector('slide_diff', slide_diff_service.stats)
+metrics_service.register_collector('slide_context_cache', slide_context_cache.stats)
+metrics_service.register_collector('image', lambda: {
+    "bytes_saved": image_service.total_bytes_saved,
+    "tokens_saved": image_service.total_tokens_saved,
+})
+
+@router.get("/health")
+async def health_check():
+    """
+    Liveness check
+    """
+    return {"status": "healthy"}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Prometheus metrics: request latency with its auth/db/storage/llm/serialization
+    breakdown, OpenAI token usage, image sizes and service counters
+    
+    :param authorization: "Bearer <METRICS_TOKEN>" when METRICS_TOKEN is set
+    :return: Metrics in the Prometheus text format
+    """
+    if settings.METRICS_TOKEN and authorization != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    
+    return PlainTextResponse(
+        metrics_service.render(),
+        media_type="text/plain; version=0.0.4"
+    )
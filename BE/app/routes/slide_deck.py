@@ -1,14 +1,32 @@
 from fastapi import (
     APIRouter, 
+    BackgroundTasks,
     Depends, 
-    HTTPException
+    Header,
+    HTTPException,
+    Query,
+    Response
 )
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.services.supabase_service import supabase_service
+from app.services.auth_service import auth_service
+from app.services.deck_summarization_service import deck_summarization_service
+from app.services.job_queue import job_queue
+from app.services.slide_diff_service import slide_diff_service
+from app.services.prefetch_service import prefetch_service
+from app.services.pdf_service import is_storage_url
+from app.utils.http_cache import (
+    check_timestamp,
+    check_uuid,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    list_version,
+    make_etag,
+    parse_columns
+)
 from pydantic import BaseModel
-from typing import Dict
-from app.config import settings
-from supabase import create_client
+from typing import Dict, Optional
 from urllib.parse import urlparse
 import os
 
@@ -16,6 +34,10 @@ import os
 router = APIRouter()
 security = HTTPBearer()
 
+# Columns clients may select when listing decks; id and created_at are always
+# returned since cursors and ETags are built from them
+SLIDE_DECK_COLUMNS = ('id', 'user_id', 'title', 'pdf_url', 'created_at')
+
 class SlideDeckUploadRequest(BaseModel):
     """
     Request model for uploading a slide deck
@@ -23,6 +45,12 @@ class SlideDeckUploadRequest(BaseModel):
     pdf_url: str
     title: str
 
+class SlideDeckSummarizeRequest(BaseModel):
+    """
+    Request model for summarizing a whole slide deck on the server
+    """
+    overwrite: bool = False  # Re-summarize slides that already have a summary
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Validate Supabase JWT token and return user ID
@@ -35,18 +63,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         # print(f"Credentials Type: {type(credentials)}")
         # print(f"Raw Token: {credentials.credentials}")
 
-        # Create Supabase client for verification
-        supabase = create_client(
-            settings.SUPABASE_URL, 
-            settings.SUPABASE_SERVICE_KEY
-        )
-        
-        # Verify the token
-        user = supabase.auth.get_user(credentials.credentials)
+        # Verify the token locally (cached until the token expires)
+        user_id = await auth_service.verify_token(credentials.credentials)
         
         # Return both user ID and token for database operations
         return {
-            "user_id": user.user.id, 
+            "user_id": user_id, 
             "token": credentials.credentials,
             "refresh_token": credentials.credentials  # Pass refresh token
         }
@@ -68,12 +90,14 @@ async def upload_slide_deck(
     :return: Created slide deck record
     """
     try:
-        # Validate PDF URL (optional)
+        # The server downloads the PDF later, so only accept the storage bucket
         if not slide_deck_data.pdf_url.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF URLs are allowed")
+        if not is_storage_url(slide_deck_data.pdf_url):
+            raise HTTPException(status_code=400, detail="PDF URL must point to the slide deck storage bucket")
 
         # Create SlideDeck record
-        slide_deck = supabase_service.create_slide_deck_record(
+        slide_deck = await supabase_service.create_slide_deck_record(
             user_id=user_data["user_id"], 
             title=slide_deck_data.title, 
             pdf_url=slide_deck_data.pdf_url,
@@ -85,92 +109,241 @@ async def upload_slide_deck(
             "message": "Slide deck record created successfully",
             "slide_deck": slide_deck
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))        
 
 @router.get("")
-async def get_user_slide_decks(user_data: Dict = Depends(get_current_user)):
+async def get_user_slide_decks(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    columns: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    user_data: Dict = Depends(get_current_user)
+):
     """
-    Get all slide decks for the authenticated user
+    Get slide decks for the authenticated user, newest first
     
+    Responses carry an ETag; a matching If-None-Match gets a 304 without the
+    decks being fetched.
+    
+    :param limit: Page size, or all decks if omitted
+    :param cursor: next_cursor from the previous page
+    :param columns: Comma-separated columns to return (e.g. "id,title")
+    :param if_none_match: ETag of a previously fetched response
     :param user_data: Dictionary containing user ID and token
-    :return: List of slide decks
+    :return: Page of slide decks and the cursor of the next page
     """
     try:
-        # Fetch slide decks for the user
-        slide_decks = supabase_service.get_slide_decks_by_user_id(
+        selected_columns = parse_columns(columns, SLIDE_DECK_COLUMNS, ('id', 'created_at'))
+        before = decode_cursor(cursor, {'created_at': check_timestamp, 'id': check_uuid})
+        
+        # A page's ETag needs the version of the whole list, read before the
+        # page so a concurrent change can only make the ETag stale, never wrong
+        version = None
+        if if_none_match or cursor or limit:
+            version = await supabase_service.get_slide_decks_version(
+                user_data["user_id"],
+                user_token=user_data["token"],
+                refresh_token=user_data["refresh_token"]
+            )
+            etag = make_etag(version, selected_columns, cursor, limit)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        
+        # Fetch one extra deck to know whether there is a next page
+        slide_decks = await supabase_service.get_slide_decks_by_user_id(
             user_id=user_data["user_id"],
             user_token=user_data["token"],
-            refresh_token=user_data["refresh_token"])
+            refresh_token=user_data["refresh_token"],
+            columns=selected_columns,
+            before=before,
+            limit=limit + 1 if limit else None
+        )
+        
+        next_cursor = None
+        if limit and len(slide_decks) > limit:
+            slide_decks = slide_decks[:limit]
+            next_cursor = encode_cursor({
+                "created_at": slide_decks[-1]['created_at'],
+                "id": slide_decks[-1]['id']
+            })
+        
+        if version is None:
+            # The whole list was fetched, so it is its own version
+            version = list_version(slide_decks, 'created_at')
+        response.headers["ETag"] = make_etag(version, selected_columns, cursor, limit)
+        response.headers["Cache-Control"] = "private, no-cache"
         
         return {
-            "slide_decks": slide_decks
+            "slide_decks": slide_decks,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def cleanup_pdf_storage(pdf_url: str):
+    """
+    Remove a deleted deck's PDF from storage, after the response has been sent
+    
+    :param pdf_url: Public URL of the uploaded PDF
+    """
+    # Extract PDF filename from the URL
+    parsed_url = urlparse(pdf_url).path
+    # pdf_filename = os.path.basename(parsed_url.path)
+    parts = parsed_url.strip('/').split('/')
+    pdf_filename = '/'.join(parts[-2:])
+    
+    try:
+        await supabase_service.remove_pdf_from_storage(pdf_filename)
+        print(f"Deleted PDF from storage: {pdf_filename}")
+    except Exception as storage_error:
+        # The deck is already gone; an orphaned PDF is only wasted storage
+        print(f"Giving up deleting PDF from storage: {pdf_filename}: {storage_error!r}")
+
 @router.delete("/{slide_deck_id}")
 async def delete_slide_deck(
     slide_deck_id: str, 
+    background_tasks: BackgroundTasks,
     user_data: Dict = Depends(get_current_user)
 ):
     """
     Delete a slide deck, its associated summaries, and the PDF from storage
     
+    The deck row is deleted only if it belongs to the user, in one round trip
+    that also cascades to its summaries. The PDF is removed in the background.
+    
     :param slide_deck_id: ID of the slide deck to delete
+    :param background_tasks: Tasks run after the response is sent
     :param user_data: Dictionary containing user ID and token
     :return: Deletion confirmation
     """
     try:
-        # First, verify the slide deck belongs to the user
-        slide_deck = supabase_service.get_slide_deck_by_id(
+        slide_deck = await supabase_service.delete_slide_deck(
             slide_deck_id,
+            user_id=user_data["user_id"],
             user_token=user_data["token"],
             refresh_token=user_data["refresh_token"])
         
-        if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+        if not slide_deck:
             raise HTTPException(status_code=403, detail="Not authorized to delete this slide deck")
         
-        # Extract PDF filename from the URL
-        pdf_url = slide_deck['pdf_url']
-        parsed_url = urlparse(pdf_url).path
-        # pdf_filename = os.path.basename(parsed_url.path)
-        parts = parsed_url.strip('/').split('/')
-        pdf_filename = '/'.join(parts[-2:])
-        
-        # Create Supabase client for storage operations
-        supabase_storage_client = create_client(
-            settings.SUPABASE_URL, 
-            settings.SUPABASE_SERVICE_KEY
-        )
-        
-        # Delete PDF from Supabase storage
-        try:
-            # Assuming PDFs are stored in a 'pdfs' bucket
-            storage_response = supabase_storage_client.storage.from_('slidedecks').remove([pdf_filename])
-            print(f"Deleted PDF from storage: {pdf_filename}")
-        except Exception as storage_error:
-            print(f"Error deleting PDF from storage: {storage_error}")
-            # Continue with deletion even if storage deletion fails
+        prefetch_service.cancel(user_data["user_id"], slide_deck_id)
+        await job_queue.cancel_deck(slide_deck_id)
+        background_tasks.add_task(cleanup_pdf_storage, slide_deck['pdf_url'])
         
-        # Delete slide summaries first
-        supabase_service.delete_slide_summaries_by_deck_id(
+        return {
+            "message": "Slide deck, associated summaries, and PDF deleted successfully"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{slide_deck_id}/summarize", status_code=202)
+async def summarize_slide_deck(
+    slide_deck_id: str,
+    summarize_data: Optional[SlideDeckSummarizeRequest] = None,
+    user_data: Dict = Depends(get_current_user)
+):
+    """
+    Start a background job that summarizes every slide of a deck
+    
+    :param slide_deck_id: ID of the slide deck to summarize
+    :param summarize_data: Summarization options
+    :param user_data: Dictionary containing user ID and token
+    :return: Job status
+    """
+    try:
+        slide_deck = await supabase_service.get_slide_deck_by_id(
             slide_deck_id,
             user_token=user_data["token"],
             refresh_token=user_data["refresh_token"])
         
-        # Delete the slide deck record
-        supabase_service.delete_slide_deck(
+        if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+            raise HTTPException(status_code=403, detail="Not authorized to summarize this slide deck")
+        
+        job = await deck_summarization_service.start_job(
+            slide_deck,
+            user_data,
+            overwrite=summarize_data.overwrite if summarize_data else False
+        )
+        
+        return {
+            "job": job.to_dict()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{slide_deck_id}/summarize/{job_id}")
+async def get_summarize_job(
+    slide_deck_id: str,
+    job_id: str,
+    user_data: Dict = Depends(get_current_user)
+):
+    """
+    Get the status and progress of a deck summarization job
+    
+    :param slide_deck_id: ID of the slide deck
+    :param job_id: ID of the summarization job
+    :param user_data: Dictionary containing user ID and token
+    :return: Job status
+    """
+    job = await deck_summarization_service.get_job(job_id)
+    if (
+        not job
+        or job.slide_deck_id != slide_deck_id
+        or job.user_id != user_data["user_id"]
+    ):
+        raise HTTPException(status_code=404, detail="Summarization job not found")
+    
+    return {
+        "job": job.to_dict()
+    }
+
+@router.get("/{slide_deck_id}/summary-stats")
+async def get_summary_stats(
+    slide_deck_id: str,
+    user_data: Dict = Depends(get_current_user)
+):
+    """
+    Get how many of a deck's slides repeated the previous slide
+    
+    Identical slides reused the previous summary without a model call; build
+    slides were summarized from the region that changed. Counts cover slides
+    summarized through this server process since it started; deck
+    summarization jobs report their own counts.
+    
+    :param slide_deck_id: ID of the slide deck
+    :param user_data: Dictionary containing user ID and token
+    :return: Near-duplicate slide counts
+    """
+    try:
+        slide_deck = await supabase_service.get_slide_deck_by_id(
             slide_deck_id,
             user_token=user_data["token"],
             refresh_token=user_data["refresh_token"])
         
+        if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+            raise HTTPException(status_code=403, detail="Not authorized to view this slide deck")
+        
         return {
-            "message": "Slide deck, associated summaries, and PDF deleted successfully"
+            "slide_deck_id": slide_deck_id,
+            **slide_diff_service.deck_stats(slide_deck_id)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,21 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, File, Form, Header, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import Optional, List
-import os
+from typing import AsyncIterator, Optional, List, Tuple, Union
 # import base64
-from dotenv import load_dotenv
-from openai import OpenAI
 
+from app.config import settings
 from app.services.supabase_service import supabase_service
+from app.services.summary_service import summary_service
+from app.services.context_service import context_service
+from app.services.single_flight import summary_flights
+from app.services.llm_gateway import LLMOverloadedError
+from app.services.summary_cache import summary_cache
+from app.services.text_layer_service import text_layer_service
+from app.services.prefetch_service import prefetch_service
+from app.services.deck_summarization_service import deck_summarization_service
+from app.services.job_queue import job_queue
+from app.services.slide_context_cache import slide_context_cache
+from app.services.image_service import to_data_url
 from app.routes.slide_deck import get_current_user
+from app.utils.sse import format_sse, SSE_HEADERS
+from app.utils.http_cache import (
+    check_int,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    list_version,
+    make_etag,
+    parse_columns
+)
 
 router = APIRouter()
 security = HTTPBearer()
 
-# Initialize OpenAI client
-load_dotenv(override=True)
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Columns clients may select when listing summaries; slide_number and
+# updated_at are always returned since cursors and ETags are built from them
+SLIDE_SUMMARY_COLUMNS = ('id', 'slide_deck_id', 'slide_number', 'summary_text', 'updated_at')
 
 class SlideSummaryRequest(BaseModel):
     """
@@ -24,12 +44,266 @@ class SlideSummaryRequest(BaseModel):
     slide_deck_id: str
     slide_number: int
     summary_text: Optional[str] = None
-    previous_slide_number: Optional[int] = None
+    previous_slide_number: Optional[int] = None  # Use the server's copy of this slide's image and summary
     previous_summary: Optional[str] = None
     slide_image: Optional[str] = None  # Base64 encoded image
     previous_slide_image: Optional[str] = None  # Base64 encoded image
     chat_context: Optional[List[str]] = None  # For regeneration with chat context
 
+class SlideSummaryPrefetchRequest(BaseModel):
+    """
+    Request model for prefetching the summaries after the slide being viewed
+    """
+    slide_deck_id: str
+    slide_number: int
+
+class SlideSummaryItem(BaseModel):
+    """
+    A single summary within a bulk upsert
+    """
+    slide_number: int
+    summary_text: Optional[str] = None
+
+class SlideSummaryBulkRequest(BaseModel):
+    """
+    Request model for creating or updating many slide summaries at once
+    """
+    slide_deck_id: str
+    summaries: List[SlideSummaryItem]
+
+async def get_existing_summary(summary_data: SlideSummaryRequest, user_data: dict) -> Optional[str]:
+    """
+    Get the summary to regenerate from, falling back to the stored one
+    
+    :param summary_data: Slide summary request data
+    :param user_data: Dictionary containing user ID and token
+    :return: Existing summary text or None
+    """
+    # Get existing summary if not provided
+    existing_summary = summary_data.summary_text
+    if not existing_summary:
+        summary = await supabase_service.get_slide_summary(
+            summary_data.slide_deck_id,
+            summary_data.slide_number,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if summary:
+            existing_summary = summary['summary_text']
+    
+    return existing_summary
+
+async def resolve_previous_slide(
+    user_data: dict,
+    slide_deck_id: str,
+    previous_slide_number: Optional[int],
+    previous_summary: Optional[str],
+    previous_slide_image: Union[str, bytes, None]
+) -> Tuple[Optional[str], Union[str, bytes, None]]:
+    """
+    Fill in the previous slide's image and summary when the client only sent its number
+    
+    Both come from the slides recently summarized through this server; if
+    the slide isn't cached the summary is read from the database and the
+    slide is summarized without the previous image.
+    
+    :param user_data: Dictionary containing user ID and token
+    :param slide_deck_id: ID of the slide deck
+    :param previous_slide_number: Slide number of the previous slide
+    :param previous_summary: Summary of the previous slide, if sent
+    :param previous_slide_image: Previous slide image, if sent
+    :return: (previous summary, previous slide image)
+    """
+    if previous_slide_number is None or (previous_summary and previous_slide_image):
+        return previous_summary, previous_slide_image
+
+    context = slide_context_cache.get(slide_deck_id, user_data["user_id"], previous_slide_number)
+    if context is not None:
+        previous_summary = previous_summary or context.summary_text
+        previous_slide_image = previous_slide_image or context.image
+
+    if not previous_summary:
+        summary = await supabase_service.get_slide_summary(
+            slide_deck_id,
+            previous_slide_number,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if summary:
+            previous_summary = summary['summary_text']
+
+    return previous_summary, previous_slide_image
+
+async def stream_summary_events(
+    chunks: Optional[AsyncIterator[str]],
+    summary_data: SlideSummaryRequest,
+    user_data: dict,
+    message: str,
+    prefetch: bool = False
+):
+    """
+    Stream a generated summary as server-sent events and save it once complete
+    
+    Emits a "token" event per generated chunk, then a single "done" event
+    carrying the saved record, or an "error" event if anything fails.
+    
+    :param chunks: Generated text chunks, or None to save summary_text as is
+    :param summary_data: Slide summary request data
+    :param user_data: Dictionary containing user ID and token
+    :param message: Message to include in the final event
+    :param prefetch: Prefetch the following slides once saved
+    """
+    try:
+        summary_text = summary_data.summary_text
+        if chunks is not None:
+            generated = []
+            async for content in chunks:
+                generated.append(content)
+                yield format_sse("token", {"content": content})
+            summary_text = ''.join(generated)
+        
+        # Upsert once, after the whole summary has been generated
+        slide_summary = await supabase_service.create_slide_summary_record(
+            slide_deck_id=summary_data.slide_deck_id,
+            slide_number=summary_data.slide_number,
+            summary_text=summary_text,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if summary_data.slide_image:
+            slide_context_cache.put(
+                summary_data.slide_deck_id, user_data["user_id"], summary_data.slide_number,
+                summary_data.slide_image, summary_text
+            )
+        if prefetch:
+            prefetch_service.schedule(user_data, summary_data.slide_deck_id, summary_data.slide_number)
+        
+        yield format_sse("done", {
+            "message": message,
+            "slide_summary": slide_summary,
+            "summary_text": summary_text
+        })
+    except LLMOverloadedError as e:
+        yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+    except ValueError as e:
+        # Invalid input, e.g. an unreadable slide image; retrying won't help
+        yield format_sse("error", {"detail": str(e), "status": 400})
+    except Exception as e:
+        print(f"Error streaming slide summary: {e}")
+        yield format_sse("error", {"detail": str(e)})
+
+async def generate_summary_record(
+    user_data: dict,
+    slide_deck_id: str,
+    slide_number: int,
+    summary_text: Optional[str] = None,
+    slide_image: Union[str, bytes, None] = None,
+    previous_summary: Optional[str] = None,
+    previous_slide_image: Union[str, bytes, None] = None,
+    previous_slide_number: Optional[int] = None
+) -> dict:
+    """
+    Generate a summary if needed and upsert it
+    
+    Identical requests for the same slide that arrive while one is still
+    running share its generation and write, and a slide that was prefetched,
+    or is being prefetched right now, gets that summary instead. Text-heavy slides are
+    summarized from the deck PDF's text layer instead of the image, and
+    slides that repeat the previous one reuse or build on its summary. Once
+    saved, the slide is kept for the request about the next slide and the
+    following slides are prefetched.
+    
+    :param user_data: Dictionary containing user ID and token
+    :param slide_deck_id: ID of the slide deck
+    :param slide_number: Slide number to summarize
+    :param summary_text: Summary to save as is, skipping generation
+    :param slide_image: Raw bytes or data URL of the slide image
+    :param previous_summary: Summary of the previous slide
+    :param previous_slide_image: Raw bytes or data URL of the previous slide image
+    :param previous_slide_number: Previous slide to take the image and summary from if not sent
+    :return: Created or updated slide summary record
+    """
+    if not summary_text and slide_image:
+        previous_summary, previous_slide_image = await resolve_previous_slide(
+            user_data, slide_deck_id, previous_slide_number, previous_summary, previous_slide_image
+        )
+
+    async def generate():
+        nonlocal summary_text
+        # Check if we need to generate a summary using OpenAI
+        if not summary_text and slide_image:
+            prefetched = await prefetch_service.join(user_data, slide_deck_id, slide_number)
+            if prefetched:
+                return prefetched
+
+            slide_text, previous_slide_text = await text_layer_service.route_slide(
+                user_data, slide_deck_id, slide_number
+            )
+            summary_text = await summary_service.summarize_slide(
+                slide_image=slide_image,
+                previous_summary=previous_summary,
+                previous_slide_image=previous_slide_image,
+                user_id=user_data["user_id"],
+                slide_text=slide_text,
+                previous_slide_text=previous_slide_text,
+                slide_deck_id=slide_deck_id
+            )
+
+        # Create or update the summary record in the database
+        return await supabase_service.create_slide_summary_record(
+            slide_deck_id=slide_deck_id,
+            slide_number=slide_number,
+            summary_text=summary_text,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+
+    input_hash = summary_cache.make_key(
+        user_data["user_id"], summary_text, previous_summary,
+        images=(slide_image, previous_slide_image)
+    )
+    slide_summary = await summary_flights.do(('generate', slide_deck_id, slide_number, input_hash), generate)
+    if slide_image:
+        slide_context_cache.put(
+            slide_deck_id, user_data["user_id"], slide_number, slide_image,
+            slide_summary['summary_text'] if slide_summary else summary_text
+        )
+    prefetch_service.schedule(user_data, slide_deck_id, slide_number)
+    return slide_summary
+
+async def read_upload(upload: Optional[UploadFile]) -> Optional[bytes]:
+    """
+    Read an uploaded slide image, enforcing the size limit
+    
+    :param upload: Uploaded file from a multipart form
+    :return: Image bytes or None
+    """
+    if upload is None:
+        return None
+    if upload.size is not None and upload.size > settings.SLIDE_IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Slide image too large")
+    return await upload.read()
+
+async def read_request_body(request: Request) -> bytes:
+    """
+    Read a raw request body in chunks, enforcing the size limit
+    
+    :param request: Incoming request
+    :return: Body bytes
+    """
+    content_length = request.headers.get('content-length')
+    if content_length and int(content_length) > settings.SLIDE_IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Slide image too large")
+    
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > settings.SLIDE_IMAGE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Slide image too large")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
 @router.post("/generate")
 async def generate_slide_summary(
     summary_data: SlideSummaryRequest, 
@@ -43,74 +317,169 @@ async def generate_slide_summary(
     :return: Created or updated slide summary record
     """
     try:
-        # Check if we need to generate a summary using OpenAI
-        if not summary_data.summary_text and summary_data.slide_image:
-            # Prepare messages array based on whether we have previous context
-            system_content = "You are an expert academic slide summarizer. Analyze the slide image and generate a concise, informative summary."
-            if summary_data.previous_summary:
-                system_content = "You are an expert academic slide summarizer. Analyze both the previous and current slides to generate a contextual, informative summary of the current slide. Focus exclusively on the content of the current slide."
-            
-            messages = [
-                {
-                    "role": "system",
-                    "content": system_content
-                }
-            ]
-            
-            user_text = "Please generate a precise, academic summary of this slide."
-            if summary_data.previous_summary:
-                user_text = f"Previous Slide Summary: {summary_data.previous_summary}\n\nPlease generate a precise, academic summary of the current slide. Do not include content from the previous slide in your summary."
-            
-            user_content = [
-                {
-                    "type": "text",
-                    "text": user_text
-                }
-            ]
-            
-            # Add previous slide image if available
-            if summary_data.previous_slide_image:
-                user_content.append({
-                    "type": "image_url",
-                    "image_url": {"url": summary_data.previous_slide_image}
-                })
-                
-            # Add current slide image
-            user_content.append({
-                "type": "image_url",
-                "image_url": {"url": summary_data.slide_image}
-            })
-            
-            messages.append({
-                "role": "user",
-                "content": user_content
-            })
-            
-            # Call OpenAI API
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                max_tokens=1000
-            )
-            
-            summary_data.summary_text = response.choices[0].message.content
-
-        # Create or update the summary record in the database
-        slide_summary = supabase_service.create_slide_summary_record(
+        slide_summary = await generate_summary_record(
+            user_data,
             slide_deck_id=summary_data.slide_deck_id,
             slide_number=summary_data.slide_number,
             summary_text=summary_data.summary_text,
-            user_token=user_data["token"],
-            refresh_token=user_data["refresh_token"]
+            slide_image=summary_data.slide_image,
+            previous_summary=summary_data.previous_summary,
+            previous_slide_image=summary_data.previous_slide_image,
+            previous_slide_number=summary_data.previous_slide_number
+        )
+
+        return {
+            "message": "Slide summary created/updated successfully",
+            "slide_summary": slide_summary
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate/upload")
+async def upload_generate_slide_summary(
+    slide_deck_id: str = Form(...),
+    slide_number: int = Form(...),
+    previous_summary: Optional[str] = Form(None),
+    previous_slide_number: Optional[int] = Form(None),
+    slide_image: UploadFile = File(...),
+    previous_slide_image: Optional[UploadFile] = File(None),
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Generate or upsert a summary from slide images sent as multipart/form-data
+    
+    Avoids the base64 inflation and JSON parsing copies of /generate.
+    
+    :param slide_deck_id: ID of the slide deck
+    :param slide_number: Slide number to summarize
+    :param previous_summary: Summary of the previous slide
+    :param previous_slide_number: Previous slide to take the image and summary from if not sent
+    :param slide_image: Current slide image file
+    :param previous_slide_image: Previous slide image file
+    :param user_data: Dictionary containing user ID and token
+    :return: Created or updated slide summary record
+    """
+    slide_image_bytes = await read_upload(slide_image)
+    previous_slide_image_bytes = await read_upload(previous_slide_image)
+    
+    try:
+        slide_summary = await generate_summary_record(
+            user_data,
+            slide_deck_id=slide_deck_id,
+            slide_number=slide_number,
+            slide_image=slide_image_bytes,
+            previous_summary=previous_summary,
+            previous_slide_image=previous_slide_image_bytes,
+            previous_slide_number=previous_slide_number
+        )
+
+        return {
+            "message": "Slide summary created/updated successfully",
+            "slide_summary": slide_summary
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate/raw")
+async def raw_generate_slide_summary(
+    request: Request,
+    slide_deck_id: str,
+    slide_number: int,
+    previous_summary: Optional[str] = None,
+    previous_slide_number: Optional[int] = None,
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Generate or upsert a summary from a slide image sent as the raw request body
+    
+    :param request: Request whose body is the image (e.g. Content-Type: image/png)
+    :param slide_deck_id: ID of the slide deck
+    :param slide_number: Slide number to summarize
+    :param previous_summary: Summary of the previous slide
+    :param previous_slide_number: Previous slide to take the image and summary from
+    :param user_data: Dictionary containing user ID and token
+    :return: Created or updated slide summary record
+    """
+    slide_image_bytes = await read_request_body(request)
+    if not slide_image_bytes:
+        raise HTTPException(status_code=400, detail="Slide image is required")
+    
+    try:
+        slide_summary = await generate_summary_record(
+            user_data,
+            slide_deck_id=slide_deck_id,
+            slide_number=slide_number,
+            slide_image=slide_image_bytes,
+            previous_summary=previous_summary,
+            previous_slide_number=previous_slide_number
         )
 
         return {
             "message": "Slide summary created/updated successfully",
             "slide_summary": slide_summary
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/generate/stream")
+async def stream_generate_slide_summary(
+    summary_data: SlideSummaryRequest, 
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Generate a summary for the specified slide, streaming it as server-sent events
+    
+    :param summary_data: Slide summary request data
+    :param user_data: Dictionary containing user ID and token
+    :return: text/event-stream response
+    """
+    chunks = None
+    if not summary_data.summary_text and summary_data.slide_image:
+        prefetched = await prefetch_service.join(
+            user_data, summary_data.slide_deck_id, summary_data.slide_number
+        )
+        if prefetched:
+            summary_data.summary_text = prefetched['summary_text']
+
+    if not summary_data.summary_text and summary_data.slide_image:
+        summary_data.previous_summary, summary_data.previous_slide_image = await resolve_previous_slide(
+            user_data,
+            summary_data.slide_deck_id,
+            summary_data.previous_slide_number,
+            summary_data.previous_summary,
+            summary_data.previous_slide_image
+        )
+        slide_text, previous_slide_text = await text_layer_service.route_slide(
+            user_data, summary_data.slide_deck_id, summary_data.slide_number
+        )
+        chunks = summary_service.stream_slide_summary(
+            slide_image=summary_data.slide_image,
+            previous_summary=summary_data.previous_summary,
+            previous_slide_image=summary_data.previous_slide_image,
+            user_id=user_data["user_id"],
+            slide_text=slide_text,
+            previous_slide_text=previous_slide_text,
+            slide_deck_id=summary_data.slide_deck_id
+        )
+    
+    return StreamingResponse(
+        stream_summary_events(chunks, summary_data, user_data, "Slide summary created/updated successfully", prefetch=True),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
 @router.post("/regenerate")
 async def regenerate_slide_summary(
     summary_data: SlideSummaryRequest, 
@@ -123,59 +492,25 @@ async def regenerate_slide_summary(
     :param user_data: Dictionary containing user ID and token
     :return: Updated slide summary record
     """
-    try:
-        # Get existing summary if not provided
-        existing_summary = summary_data.summary_text
-        if not existing_summary:
-            summaries = supabase_service.get_slide_summaries_by_deck_id(
-                summary_data.slide_deck_id,
-                user_token=user_data["token"],
-                refresh_token=user_data["refresh_token"]
-            )
-            for summary in summaries:
-                if summary['slide_number'] == summary_data.slide_number:
-                    existing_summary = summary['summary_text']
-                    break
-        
-        # Construct context-rich prompt for summary regeneration
-        chat_history_text = ""
-        if summary_data.chat_context:
-            chat_history_text = ' '.join(summary_data.chat_context)
-            
-        regeneration_prompt = f"""
-            Current Slide: {summary_data.slide_number}
-            Original Summary: {existing_summary or "No summary available"}
-            
-            Chat History Context: {chat_history_text}
-            
-            Please regenerate the slide summary, taking into account the conversation history. 
-            Incorporate any new insights or clarifications from the chat while maintaining the 
-            core content of the original summary. Be concise, academic, and precise.
-            
-            If the chat history provides additional context or reveals misunderstandings, 
-            adjust the summary accordingly to provide a more accurate and comprehensive explanation.
-        """
+    async def regenerate():
+        existing_summary = await get_existing_summary(summary_data, user_data)
         
         # Call OpenAI API
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an academic assistant who can regenerate slide summaries based on conversation context. Maintain academic rigor while adapting to new insights."
-                },
-                {
-                    "role": "user",
-                    "content": regeneration_prompt
-                }
-            ],
-            max_tokens=1000
+        chat_history = await context_service.build_history(
+            context_service.session_key(user_data["user_id"], slide_deck_id=summary_data.slide_deck_id),
+            summary_data.chat_context,
+            user_id=user_data["user_id"]
         )
         
-        new_summary = response.choices[0].message.content
+        new_summary = await summary_service.regenerate_summary(
+            slide_number=summary_data.slide_number,
+            existing_summary=existing_summary,
+            chat_history_text=chat_history.text,
+            user_id=user_data["user_id"]
+        )
         
         # Update the summary in the database
-        slide_summary = supabase_service.create_slide_summary_record(
+        slide_summary = await supabase_service.create_slide_summary_record(
             slide_deck_id=summary_data.slide_deck_id,
             slide_number=summary_data.slide_number,
             summary_text=new_summary,
@@ -186,34 +521,283 @@ async def regenerate_slide_summary(
         return {
             "message": "Slide summary regenerated successfully",
             "slide_summary": slide_summary,
-            "summary_text": new_summary
+            "summary_text": new_summary,
+            "context": chat_history.stats()
         }
+    
+    try:
+        # Identical regenerations already in flight share one result
+        input_hash = summary_cache.make_key(
+            user_data["user_id"], summary_data.summary_text, *(summary_data.chat_context or [])
+        )
+        return await summary_flights.do(
+            ('regenerate', summary_data.slide_deck_id, summary_data.slide_number, input_hash),
+            regenerate
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers)
     except Exception as e:
         print(f"Error regenerating slide summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/regenerate/stream")
+async def stream_regenerate_slide_summary(
+    summary_data: SlideSummaryRequest, 
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Regenerate a summary for the specified slide, streaming it as server-sent events
+    
+    :param summary_data: Slide summary request data
+    :param user_data: Dictionary containing user ID and token
+    :return: text/event-stream response
+    """
+    try:
+        existing_summary = await get_existing_summary(summary_data, user_data)
+        chat_history = await context_service.build_history(
+            context_service.session_key(user_data["user_id"], slide_deck_id=summary_data.slide_deck_id),
+            summary_data.chat_context,
+            user_id=user_data["user_id"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    messages = summary_service.build_regeneration_messages(
+        slide_number=summary_data.slide_number,
+        existing_summary=existing_summary,
+        chat_history_text=chat_history.text
+    )
+    
+    return StreamingResponse(
+        stream_summary_events(summary_service.stream(messages, user_id=user_data["user_id"]), summary_data, user_data, "Slide summary regenerated successfully"),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/prefetch", status_code=202)
+async def prefetch_slide_summaries(
+    prefetch_data: SlideSummaryPrefetchRequest,
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Summarize the slides after the one being viewed in the background
+    
+    Slides that already have a summary are skipped; prefetching for the same
+    deck again replaces the slides still to do.
+    
+    :param prefetch_data: Slide deck ID and the slide being viewed
+    :param user_data: Dictionary containing user ID and token
+    :return: Slides scheduled for prefetch
+    """
+    slides = prefetch_service.schedule(user_data, prefetch_data.slide_deck_id, prefetch_data.slide_number)
+    return {
+        "slide_deck_id": prefetch_data.slide_deck_id,
+        "slides": slides
+    }
+
+@router.delete("/prefetch/{slide_deck_id}")
+async def cancel_prefetch_slide_summaries(
+    slide_deck_id: str,
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Stop prefetching summaries for a deck
+    
+    :param slide_deck_id: ID of the slide deck
+    :param user_data: Dictionary containing user ID and token
+    :return: Whether a prefetch was cancelled
+    """
+    return {
+        "cancelled": prefetch_service.cancel(user_data["user_id"], slide_deck_id)
+    }
+
+def job_to_dict(job: dict) -> dict:
+    return {
+        "id": job['id'],
+        "status": job['status'],
+        "slide_deck_id": job['slide_deck_id'],
+        "slide_number": job['slide_number'],
+        "attempts": job['attempts'],
+        "error": job['error'],
+        "result": job['result'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    }
+
+@router.post("/jobs", status_code=202)
+async def enqueue_slide_summary_job(
+    summary_data: SlideSummaryRequest,
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Queue generating a slide summary on the worker pool
+
+    Unlike /generate the request returns right away; poll the job for the
+    result. Queueing the same slide and images again returns the existing job.
+
+    :param summary_data: Slide summary data with the slide images
+    :param user_data: Dictionary containing user ID and token
+    :return: Job status
+    """
+    if not summary_data.summary_text and not summary_data.slide_image:
+        raise HTTPException(status_code=400, detail="Either summary_text or slide_image is required")
+
+    try:
+        slide_deck = await supabase_service.get_slide_deck_by_id(
+            summary_data.slide_deck_id,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+            raise HTTPException(status_code=403, detail="Not authorized to summarize this slide deck")
+
+        previous_summary, previous_slide_image = summary_data.previous_summary, summary_data.previous_slide_image
+        if not summary_data.summary_text:
+            previous_summary, previous_slide_image = await resolve_previous_slide(
+                user_data,
+                summary_data.slide_deck_id,
+                summary_data.previous_slide_number,
+                previous_summary,
+                previous_slide_image
+            )
+
+        job = await deck_summarization_service.enqueue_slide(
+            user_data,
+            summary_data.slide_deck_id,
+            summary_data.slide_number,
+            summary_text=summary_data.summary_text,
+            slide_image=summary_data.slide_image,
+            previous_summary=previous_summary,
+            # Job payloads are JSON
+            previous_slide_image=to_data_url(previous_slide_image) if previous_slide_image else None
+        )
+        return {
+            "job": job_to_dict(job)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+async def get_slide_summary_job(
+    job_id: str,
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Get the status of a queued slide summary
+
+    :param job_id: ID of the job
+    :param user_data: Dictionary containing user ID and token
+    :return: Job status, with the saved summary once it succeeded
+    """
+    job = await job_queue.get(job_id)
+    if not job or job['kind'] != 'slide' or job['user_id'] != user_data["user_id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job": job_to_dict(job)
+    }
+
+@router.post("/bulk")
+async def bulk_upsert_slide_summaries(
+    bulk_data: SlideSummaryBulkRequest, 
+    user_data: dict = Depends(get_current_user)
+):
+    """
+    Create or update many summaries for a slide deck in as few writes as possible
+    
+    :param bulk_data: Slide deck ID and summaries to write
+    :param user_data: Dictionary containing user ID and token
+    :return: Created or updated slide summary records
+    """
+    try:
+        slide_summaries = await supabase_service.create_slide_summary_records(
+            bulk_data.slide_deck_id,
+            [(item.slide_number, item.summary_text) for item in bulk_data.summaries],
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        
+        return {
+            "message": "Slide summaries created/updated successfully",
+            "slide_summaries": slide_summaries
+        }
+    except Exception as e:
+        print(f"Error bulk upserting slide summaries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("")
 async def get_slide_summaries(
     slide_deck_id: str, 
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    columns: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     user_data: dict = Depends(get_current_user)
 ):
     """
-    Fetch all slide summaries for a given slide deck ordered by slide number
+    Fetch slide summaries for a given slide deck ordered by slide number
+    
+    Responses carry an ETag; a matching If-None-Match gets a 304 without the
+    summaries being fetched or serialized.
     
     :param slide_deck_id: ID of the slide deck
+    :param limit: Page size, or all summaries if omitted
+    :param cursor: next_cursor from the previous page
+    :param columns: Comma-separated columns to return (e.g. "slide_number,updated_at")
+    :param if_none_match: ETag of a previously fetched response
     :param user_data: Dictionary containing user ID and token
-    :return: List of slide summaries
+    :return: Page of slide summaries and the cursor of the next page
     """
     try:
-        # Fetch slide summaries for the specified deck in order
-        slide_summaries = supabase_service.get_slide_summaries_by_deck_id(
+        selected_columns = parse_columns(columns, SLIDE_SUMMARY_COLUMNS, ('slide_number', 'updated_at'))
+        after = decode_cursor(cursor, {'slide_number': check_int})
+        
+        # Cheap when the deck's summaries are in the read cache; read before the
+        # page so a concurrent change can only make the ETag stale, never wrong
+        version = None
+        if if_none_match or cursor or limit:
+            version = await supabase_service.get_slide_summaries_version(
+                slide_deck_id,
+                user_token=user_data["token"],
+                refresh_token=user_data["refresh_token"]
+            )
+            etag = make_etag(version, selected_columns, cursor, limit)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        
+        # Fetch slide summaries for the specified deck in order, plus one to
+        # know whether there is a next page
+        slide_summaries = await supabase_service.get_slide_summaries_by_deck_id(
             slide_deck_id,
             user_token=user_data["token"],
-            refresh_token=user_data["refresh_token"]
+            refresh_token=user_data["refresh_token"],
+            columns=selected_columns,
+            after_slide=after['slide_number'] if after else None,
+            limit=limit + 1 if limit else None
         )
         
+        next_cursor = None
+        if limit and len(slide_summaries) > limit:
+            slide_summaries = slide_summaries[:limit]
+            next_cursor = encode_cursor({"slide_number": slide_summaries[-1]['slide_number']})
+        
+        if version is None:
+            # The whole list was fetched, so it is its own version
+            version = list_version(slide_summaries, 'updated_at')
+        response.headers["ETag"] = make_etag(version, selected_columns, cursor, limit)
+        response.headers["Cache-Control"] = "private, no-cache"
+        
         return {
-            "slide_summaries": slide_summaries
+            "slide_summaries": slide_summaries,
+            "next_cursor": next_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import jwt
+from gotrue import AsyncGoTrueClient
+from jwt import PyJWKClient
+
+from app.config import settings
+from app.services.metrics_service import metrics_service
+
+# Tokens that could only be verified by the auth server are re-checked after
+# this many seconds so revoked sessions are picked up
+REMOTE_VERIFICATION_TTL = 60
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
+
+class AuthService:
+    def __init__(self, max_cache_size: int = settings.AUTH_CACHE_MAX_SIZE):
+        self.max_cache_size = max_cache_size
+        # token -> (user_id, expires_at), least recently used first
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._jwks_client = None
+        self._remote_client = None
+
+    def _get_jwks_client(self):
+        """
+        Lazily create the JWKS client for projects using asymmetric signing keys
+        """
+        if self._jwks_client is None:
+            self._jwks_client = PyJWKClient(
+                f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+                cache_keys=True
+            )
+        return self._jwks_client
+
+    def _get_cached(self, token: str):
+        entry = self._cache.get(token)
+        if entry is None:
+            return None
+
+        user_id, expires_at = entry
+        if expires_at <= time.time():
+            del self._cache[token]
+            return None
+
+        self._cache.move_to_end(token)
+        return user_id
+
+    def _store(self, token: str, user_id: str, expires_at: float):
+        self._cache[token] = (user_id, expires_at)
+        self._cache.move_to_end(token)
+        while len(self._cache) > self.max_cache_size:
+            self._cache.popitem(last=False)
+
+    async def _verify_locally(self, token: str):
+        """
+        Verify the token signature and claims without a network round trip
+
+        :param token: JWT access token
+        :return: Decoded claims, or None if the token cannot be checked locally
+        :raises jwt.InvalidTokenError: If the token is definitely invalid
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get('alg')
+
+        if algorithm == 'HS256':
+            if not settings.SUPABASE_JWT_SECRET:
+                return None
+            key = settings.SUPABASE_JWT_SECRET
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            try:
+                # The JWKS document is cached, so this only blocks on the first fetch
+                signing_key = await asyncio.to_thread(
+                    self._get_jwks_client().get_signing_key_from_jwt, token
+                )
+                key = signing_key.key
+            except jwt.PyJWKClientError as e:
+                print(f"JWKS lookup failed, falling back to remote verification: {e}")
+                return None
+        else:
+            return None
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]}
+        )
+
+    async def _verify_remotely(self, token: str):
+        """
+        Ask the Supabase auth server to validate the token
+
+        :param token: JWT access token
+        :return: User ID of the token owner
+        """
+        if self._remote_client is None:
+            self._remote_client = AsyncGoTrueClient(
+                url=f"{settings.SUPABASE_URL}/auth/v1",
+                headers={"apiKey": settings.SUPABASE_SERVICE_KEY},
+                auto_refresh_token=False,
+                persist_session=False
+            )
+        user = await self._remote_client.get_user(token)
+        return user.user.id
+
+    @metrics_service.timed('auth')
+    async def verify_token(self, token: str) -> str:
+        """
+        Validate a Supabase access token and return its user ID
+
+        Results are cached per token until the token's own expiry, so repeat
+        requests within a session skip verification entirely.
+
+        :param token: JWT access token
+        :return: User ID of the token owner
+        :raises Exception: If the token is invalid or expired
+        """
+        user_id = self._get_cached(token)
+        if user_id:
+            return user_id
+
+        claims = await self._verify_locally(token)
+        if claims is not None:
+            user_id = claims['sub']
+            expires_at = claims['exp']
+        else:
+            user_id = await self._verify_remotely(token)
+            unverified = jwt.decode(token, options={"verify_signature": False})
+            expires_at = min(
+                unverified.get('exp', 0),
+                time.time() + REMOTE_VERIFICATION_TTL
+            )
+
+        self._store(token, user_id, expires_at)
+        return user_id
+
+    async def warm_up(self):
+        """
+        Fetch the JWKS document ahead of the first request when tokens can't be
+        verified with the JWT secret
+        """
+        if not settings.SUPABASE_JWT_SECRET:
+            await asyncio.to_thread(self._get_jwks_client().get_jwk_set)
+
+    async def close(self):
+        if self._remote_client is not None:
+            await self._remote_client.close()
+            self._remote_client = None
+
+
+auth_service = AuthService()
@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+
+import httpx
+import jwt
+from postgrest import AsyncPostgrestClient
+from postgrest.utils import AsyncClient
+
+from app.config import settings
+
+# Clients for tokens without an `exp` claim are recycled after this many seconds
+DEFAULT_CLIENT_TTL = 300
+
+
+class _SharedTransportPostgrestClient(AsyncPostgrestClient):
+    """
+    PostgREST client whose HTTP session rides on a transport shared by the pool,
+    so TLS sessions and keep-alive connections are reused across users
+    """
+
+    def __init__(self, base_url: str, headers: dict, transport: httpx.AsyncHTTPTransport):
+        self._transport = transport
+        super().__init__(base_url, headers=headers)
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=self._transport,
+            follow_redirects=True,
+        )
+
+
+class SupabaseClientPool:
+    def __init__(
+        self,
+        max_size: int = settings.SUPABASE_CLIENT_POOL_SIZE,
+        max_connections: int = settings.SUPABASE_MAX_CONNECTIONS,
+        max_keepalive_connections: int = settings.SUPABASE_MAX_KEEPALIVE_CONNECTIONS
+    ):
+        self.max_size = max_size
+        self.rest_url = f"{settings.SUPABASE_URL}/rest/v1"
+        self._transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            )
+        )
+        # token -> (client, expires_at), least recently used first
+        self._clients: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _build_client(self, api_key: str, access_token: str):
+        return _SharedTransportPostgrestClient(
+            self.rest_url,
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                "apiKey": api_key,
+                "Authorization": f"Bearer {access_token}",
+            },
+            transport=self._transport
+        )
+
+    def build_service_client(self):
+        """
+        Build a PostgREST client authenticated with the service key
+
+        :return: PostgREST client sharing the pool's connections
+        """
+        return self._build_client(settings.SUPABASE_SERVICE_KEY, settings.SUPABASE_SERVICE_KEY)
+
+    def get(self, user_token: str):
+        """
+        Get a PostgREST client that acts as the owner of the given token
+
+        :param user_token: JWT token of the authenticated user
+        :return: Cached or newly created PostgREST client
+        """
+        now = time.time()
+        entry = self._clients.get(user_token)
+        if entry is not None:
+            client, expires_at = entry
+            if expires_at > now:
+                self.hits += 1
+                self._clients.move_to_end(user_token)
+                return client
+            del self._clients[user_token]
+            self.evictions += 1
+
+        self.misses += 1
+        claims = jwt.decode(user_token, options={"verify_signature": False})
+        expires_at = claims.get('exp', now + DEFAULT_CLIENT_TTL)
+
+        client = self._build_client(settings.SUPABASE_ANON_KEY, user_token)
+        self._clients[user_token] = (client, expires_at)
+        while len(self._clients) > self.max_size:
+            self._clients.popitem(last=False)
+            self.evictions += 1
+
+        return client
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._clients),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    async def close(self):
+        self._clients.clear()
+        await self._transport.aclose()
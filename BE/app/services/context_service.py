@@ -0,0 +1,149 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+from app.config import settings
+from app.services.summary_service import summary_service
+from app.utils.tokens import estimate_tokens
+
+
+def _hash_turns(turns: List[str]) -> str:
+    digest = hashlib.sha256()
+    for turn in turns:
+        digest.update(hashlib.sha256(turn.encode()).digest())
+    return digest.hexdigest()
+
+
+@dataclass
+class HistoryContext:
+    text: str
+    summary: str = ''
+    recent_turns: int = 0
+    summarized_turns: int = 0
+    dropped_turns: int = 0
+    history_tokens: int = 0
+    original_tokens: int = 0
+
+    def stats(self) -> dict:
+        stats = asdict(self)
+        del stats['text'], stats['summary']
+        return stats
+
+
+class ContextService:
+    """
+    Builds chat history context within a token budget
+
+    The most recent turns are kept verbatim. Older turns are folded into a
+    running summary that is cached per session, so each turn is summarized once
+    and the prompt stays roughly the same size however long the session runs.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = settings.CHAT_HISTORY_TOKEN_BUDGET,
+        summary_max_tokens: int = settings.CHAT_SUMMARY_MAX_TOKENS,
+        max_sessions: int = settings.CHAT_SUMMARY_CACHE_SIZE
+    ):
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.max_sessions = max_sessions
+        # session key -> (summarized turn count, hash of those turns, summary)
+        self._summaries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def session_key(self, user_id: str, session_id: Optional[str] = None, slide_deck_id: Optional[str] = None) -> str:
+        return f"{user_id}:{session_id or slide_deck_id or 'default'}"
+
+    def _get_summary(self, session_key: str, history: List[str]):
+        entry = self._summaries.get(session_key)
+        if entry is None:
+            return 0, ''
+
+        summarized_turns, turns_hash, summary = entry
+        # Only reuse the summary if the client's history still starts with the
+        # turns it was built from
+        if summarized_turns > len(history) or _hash_turns(history[:summarized_turns]) != turns_hash:
+            return 0, ''
+
+        self._summaries.move_to_end(session_key)
+        return summarized_turns, summary
+
+    def _set_summary(self, session_key: str, history: List[str], summarized_turns: int, summary: str):
+        self._summaries[session_key] = (summarized_turns, _hash_turns(history[:summarized_turns]), summary)
+        self._summaries.move_to_end(session_key)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    async def _fold_turns(self, summary: str, turns: List[str], user_id: Optional[str] = None) -> str:
+        messages = [
+            {
+                "role": "system",
+                "content": "You maintain a running summary of a study conversation between a student and an academic assistant. Keep key questions, explanations, and any misunderstandings that were corrected."
+            },
+            {
+                "role": "user",
+                "content": f"Current summary: {summary or 'None'}\n\nNew conversation turns: {' '.join(turns)}\n\nReturn the updated summary in at most {self.summary_max_tokens * 3 // 4} words."
+            }
+        ]
+        return await summary_service.complete(messages, max_tokens=self.summary_max_tokens, user_id=user_id)
+
+    async def build_history(
+        self,
+        session_key: str,
+        history: Optional[List[str]],
+        user_id: Optional[str] = None
+    ) -> HistoryContext:
+        """
+        Build the chat history text for a prompt within the token budget
+
+        :param session_key: Key identifying the chat session (see session_key)
+        :param history: Full chat history sent by the client, oldest first
+        :param user_id: User the summarization call is made for, used for fair queueing
+        :return: History text and token accounting
+        """
+        history = history or []
+        original_tokens = estimate_tokens(' '.join(history))
+
+        summarized_turns, summary = self._get_summary(session_key, history)
+        turn_tokens = [estimate_tokens(turn) for turn in history]
+
+        if sum(turn_tokens[summarized_turns:]) > self.token_budget:
+            # Fold the oldest unsummarized turns until the recent window is at
+            # half the budget, leaving room for several turns before the next fold
+            fold_until = summarized_turns
+            recent_tokens = sum(turn_tokens[summarized_turns:])
+            while recent_tokens > self.token_budget // 2 and fold_until < len(history) - 1:
+                recent_tokens -= turn_tokens[fold_until]
+                fold_until += 1
+
+            if fold_until > summarized_turns:
+                try:
+                    summary = await self._fold_turns(summary, history[summarized_turns:fold_until], user_id)
+                    summarized_turns = fold_until
+                    self._set_summary(session_key, history, summarized_turns, summary)
+                except Exception as e:
+                    print(f"Error summarizing chat history, dropping older turns: {e}")
+
+        # Whatever still doesn't fit (e.g. summarization failed) is dropped, oldest first
+        first_recent = summarized_turns
+        while sum(turn_tokens[first_recent:]) > self.token_budget and first_recent < len(history) - 1:
+            first_recent += 1
+
+        recent = history[first_recent:]
+        text = ' '.join(recent)
+        if summary:
+            text = f"(Summary of earlier conversation: {summary}) {text}"
+
+        return HistoryContext(
+            text=text,
+            summary=summary,
+            recent_turns=len(recent),
+            summarized_turns=summarized_turns,
+            dropped_turns=first_recent - summarized_turns,
+            history_tokens=estimate_tokens(text),
+            original_tokens=original_tokens
+        )
+
+
+context_service = ContextService()
@@ -0,0 +1,294 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from app.config import settings
+from app.services.job_queue import job_queue, ACTIVE_STATES, CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED
+from app.services.pdf_service import pdf_service
+from app.services.single_flight import SingleFlight
+from app.services.summary_cache import summary_cache
+from app.services.summary_service import summary_service
+from app.services.supabase_service import supabase_service
+from app.services.text_layer_service import text_layer_service
+
+# Downloaded PDFs kept per worker process, so a deck's slide jobs share one download
+PDF_CACHE_SIZE = 4
+
+
+@dataclass
+class DeckSummarizationJob:
+    id: str
+    slide_deck_id: str
+    user_id: str
+    status: str = 'pending'
+    total_slides: int = 0
+    completed_slides: int = 0
+    skipped_slides: int = 0
+    # Slides summarized from the PDF text layer vs. the rendered image
+    text_slides: int = 0
+    vision_slides: int = 0
+    # Slides that repeat the previous one: summary reused, or summarized from the changed region
+    reused_slides: int = 0
+    diff_slides: int = 0
+    failed_slides: List[int] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def slide_job_key(slide_deck_id: str, slide_number: int, input_hash: str) -> str:
+    return f"slide:{slide_deck_id}:{slide_number}:{input_hash}"
+
+
+class DeckSummarizationService:
+    """
+    Summarization jobs on the durable job queue
+
+    A deck job downloads the deck's PDF and enqueues a slide job for each
+    slide still missing a summary; slide jobs are keyed by the deck job, so a
+    deck job that is interrupted and run again doesn't redo finished slides.
+    Slide jobs can also be enqueued directly with client-rendered images.
+    Both run in the worker processes (app.worker), which write summaries with
+    the service key; callers check deck ownership before enqueueing.
+    """
+
+    def __init__(self):
+        self._pdfs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._downloads = SingleFlight()
+
+    async def start_job(self, slide_deck: dict, user_data: dict, overwrite: bool = False) -> DeckSummarizationJob:
+        """
+        Queue summarizing every slide of a deck
+
+        A deck only ever has one active job; starting again returns the running one.
+
+        :param slide_deck: Slide deck record
+        :param user_data: Dictionary containing user ID and token
+        :param overwrite: Re-summarize slides that already have a summary
+        :return: The new or already running job
+        """
+        key = f"deck:{slide_deck['id']}"
+        existing = await job_queue.get_by_key(key)
+        if existing is not None:
+            job = await self._to_job(existing)
+            if job.status in ('pending', 'rendering', 'summarizing'):
+                return job
+
+        row = await job_queue.enqueue(
+            'deck',
+            {"pdf_url": slide_deck['pdf_url'], "overwrite": overwrite},
+            idempotency_key=key,
+            slide_deck_id=slide_deck['id'],
+            user_id=user_data["user_id"],
+            rerun_finished=True
+        )
+        return await self._to_job(row)
+
+    async def get_job(self, job_id: str) -> Optional[DeckSummarizationJob]:
+        row = await job_queue.get(job_id)
+        if row is None or row['kind'] != 'deck':
+            return None
+        return await self._to_job(row)
+
+    async def _to_job(self, row: dict) -> DeckSummarizationJob:
+        job = DeckSummarizationJob(
+            id=row['id'],
+            slide_deck_id=row['slide_deck_id'],
+            user_id=row['user_id'],
+            error=row['error'],
+            created_at=row['created_at']
+        )
+        if row['status'] == QUEUED:
+            job.status = 'pending'
+            return job
+        if row['status'] != SUCCEEDED:
+            job.status = {FAILED: 'failed', CANCELLED: 'cancelled'}.get(row['status'], 'rendering')
+            job.finished_at = row['updated_at'] if row['status'] != RUNNING else None
+            return job
+
+        result = row['result'] or {}
+        job.total_slides = result.get('total_slides', 0)
+        job.skipped_slides = result.get('skipped_slides', 0)
+        children = await job_queue.children(row['id'])
+        for child in children:
+            if child['status'] == SUCCEEDED:
+                job.completed_slides += 1
+                route = (child['result'] or {}).get('route')
+                if route == 'text':
+                    job.text_slides += 1
+                elif route == 'reused':
+                    job.reused_slides += 1
+                elif route == 'diff':
+                    job.diff_slides += 1
+                else:
+                    job.vision_slides += 1
+            elif child['status'] in (FAILED, CANCELLED):
+                job.failed_slides.append(child['slide_number'])
+
+        if any(child['status'] in ACTIVE_STATES for child in children):
+            job.status = 'summarizing'
+        else:
+            job.status = 'failed' if job.failed_slides and not job.completed_slides else 'completed'
+            job.finished_at = max((child['updated_at'] for child in children), default=row['updated_at'])
+        return job
+
+    async def enqueue_slide(
+        self,
+        user_data: dict,
+        slide_deck_id: str,
+        slide_number: int,
+        summary_text: Optional[str] = None,
+        slide_image: Optional[str] = None,
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Optional[str] = None
+    ) -> dict:
+        """
+        Queue summarizing (or saving) a single slide from client-rendered images
+
+        Enqueueing the same inputs for a slide again returns the existing job.
+
+        :param user_data: Dictionary containing user ID and token
+        :param slide_deck_id: ID of the slide deck
+        :param slide_number: Slide number to summarize
+        :param summary_text: Summary to save as is, skipping generation
+        :param slide_image: Data URL of the slide image
+        :param previous_summary: Summary of the previous slide
+        :param previous_slide_image: Data URL of the previous slide image
+        :return: Job row
+        """
+        input_hash = summary_cache.make_key(
+            user_data["user_id"], summary_text, previous_summary,
+            images=(slide_image, previous_slide_image)
+        )
+        return await job_queue.enqueue(
+            'slide',
+            {
+                "summary_text": summary_text,
+                "slide_image": slide_image,
+                "previous_summary": previous_summary,
+                "previous_slide_image": previous_slide_image,
+            },
+            idempotency_key=slide_job_key(slide_deck_id, slide_number, input_hash),
+            slide_deck_id=slide_deck_id,
+            slide_number=slide_number,
+            user_id=user_data["user_id"]
+        )
+
+    async def _download(self, pdf_url: str) -> bytes:
+        pdf_bytes = self._pdfs.get(pdf_url)
+        if pdf_bytes is None:
+            pdf_bytes = await self._downloads.do(pdf_url, lambda: pdf_service.download_pdf(pdf_url))
+            self._pdfs[pdf_url] = pdf_bytes
+            while len(self._pdfs) > PDF_CACHE_SIZE:
+                self._pdfs.popitem(last=False)
+        self._pdfs.move_to_end(pdf_url)
+        return pdf_bytes
+
+    async def run_deck_job(self, job: dict) -> dict:
+        """
+        Enqueue a slide job for each slide of the deck that still needs a summary
+
+        :param job: Claimed deck job
+        :return: Job result (total and skipped slides)
+        """
+        pdf_bytes = await self._download(job['payload']['pdf_url'])
+        total_slides = await pdf_service.page_count(pdf_bytes)
+
+        existing_slides = set()
+        if not job['payload']['overwrite']:
+            summaries = await supabase_service.get_slide_summaries_by_deck_id(job['slide_deck_id'])
+            existing_slides = {
+                summary['slide_number'] for summary in summaries if summary.get('summary_text')
+            }
+
+        for slide_number in range(1, total_slides + 1):
+            if slide_number in existing_slides:
+                continue
+            await job_queue.enqueue(
+                'slide',
+                {"pdf_url": job['payload']['pdf_url']},
+                idempotency_key=slide_job_key(job['slide_deck_id'], slide_number, job['id']),
+                slide_deck_id=job['slide_deck_id'],
+                slide_number=slide_number,
+                user_id=job['user_id'],
+                parent_id=job['id']
+            )
+
+        return {
+            "total_slides": total_slides,
+            "skipped_slides": len(existing_slides & set(range(1, total_slides + 1))),
+        }
+
+    async def run_slide_job(self, job: dict) -> dict:
+        """
+        Summarize a slide and save the summary
+
+        Slides of deck jobs are rendered from the deck's PDF (or summarized
+        from its text layer); the previous slide is passed as an image or text
+        since slides run concurrently, along with its summary if it has
+        already been saved, so near-duplicate slides can build on it.
+
+        :param job: Claimed slide job
+        :return: Job result (summary text, saved record and how it was summarized)
+        """
+        payload = job['payload']
+        slide_deck_id = job['slide_deck_id']
+        slide_number = job['slide_number']
+        previous_summary = payload.get('previous_summary')
+        route = None
+
+        summary_text = payload.get('summary_text')
+        if not summary_text:
+            # Ownership was checked when the job was enqueued
+            user_data = {"user_id": job['user_id'], "token": None, "refresh_token": None}
+            slide_image = payload.get('slide_image')
+            previous_slide_image = payload.get('previous_slide_image')
+
+            if payload.get('pdf_url'):
+                pdf_bytes = await self._download(payload['pdf_url'])
+                slide_text, previous_slide_text = None, None
+                if settings.SUMMARY_TEXT_LAYER:
+                    page_texts = await text_layer_service.get_pages(
+                        {"id": slide_deck_id, "user_id": job['user_id']}, pdf_bytes
+                    )
+                    slide_text, previous_slide_text = text_layer_service.route(page_texts, slide_number)
+                if not slide_text:
+                    page_images = await pdf_service.render_pages(pdf_bytes, pages={slide_number - 1, slide_number})
+                    slide_image = page_images[slide_number - 1]
+                    previous_slide_image = page_images[slide_number - 2] if slide_number > 1 else None
+                    if previous_slide_image:
+                        previous = await supabase_service.get_slide_summary(slide_deck_id, slide_number - 1)
+                        previous_summary = previous.get('summary_text') if previous else None
+            else:
+                slide_text, previous_slide_text = await text_layer_service.route_slide(
+                    user_data, slide_deck_id, slide_number
+                )
+
+            summary_text, route = await summary_service.summarize_slide_with_route(
+                slide_image=slide_image,
+                previous_summary=previous_summary,
+                previous_slide_image=previous_slide_image,
+                user_id=job['user_id'],
+                slide_text=slide_text,
+                previous_slide_text=previous_slide_text,
+                slide_deck_id=slide_deck_id
+            )
+            if route == 'cached':
+                route = 'text' if slide_text else 'vision'
+
+        slide_summary = await supabase_service.create_slide_summary_record(
+            slide_deck_id=slide_deck_id,
+            slide_number=slide_number,
+            summary_text=summary_text
+        )
+        return {
+            "summary_text": summary_text,
+            "slide_summary": slide_summary,
+            "route": route,
+        }
+
+
+deck_summarization_service = DeckSummarizationService()
@@ -0,0 +1,185 @@
+import asyncio
+import base64
+import io
+import math
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from PIL import Image
+
+from app.config import settings
+from app.services.metrics_service import metrics_service
+
+# Vision token accounting for the gpt-4o model family
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIZE = 512
+
+
+def vision_size(width: int, height: int) -> tuple:
+    """
+    Size a high detail image is scaled to by the model before tiling
+
+    Fits within 2048x2048, then scales the shortest side down to 768, so any
+    pixels beyond that are uploaded for nothing.
+
+    :param width: Image width in pixels
+    :param height: Image height in pixels
+    :return: (width, height) seen by the model
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    return round(width * scale), round(height * scale)
+
+
+def estimate_image_tokens(width: int, height: int, detail: str) -> int:
+    """
+    Estimate the input tokens a vision model charges for an image
+
+    :param width: Image width in pixels
+    :param height: Image height in pixels
+    :param detail: "low" or "high"
+    :return: Estimated token count
+    """
+    if detail == 'low':
+        return LOW_DETAIL_TOKENS
+
+    width, height = vision_size(width, height)
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * tiles
+
+
+def to_data_url(image: Union[str, bytes]) -> str:
+    """
+    Data URL for raw image bytes; data URLs and URLs are returned as is
+
+    :param image: Raw image bytes, data URL or URL of a slide image
+    :return: Data URL or URL
+    """
+    if isinstance(image, str):
+        return image
+    mime_type = Image.MIME.get(Image.open(io.BytesIO(image)).format, 'image/png')
+    return f"data:{mime_type};base64,{base64.b64encode(image).decode('ascii')}"
+
+
+@dataclass
+class NormalizedImage:
+    url: str
+    detail: Optional[str] = None
+    original_bytes: int = 0
+    normalized_bytes: int = 0
+    original_tokens: int = 0
+    normalized_tokens: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.normalized_bytes
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.normalized_tokens
+
+
+class ImageService:
+    def __init__(
+        self,
+        max_dimension: int = settings.IMAGE_MAX_DIMENSION,
+        image_format: str = settings.IMAGE_FORMAT,
+        quality: int = settings.IMAGE_QUALITY,
+        detail: str = settings.IMAGE_DETAIL
+    ):
+        self.max_dimension = max_dimension
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.detail = detail
+        self.total_bytes_saved = 0
+        self.total_tokens_saved = 0
+
+    def pipeline_key(self) -> str:
+        """
+        Settings that change the images sent to the model, for cache keys
+        """
+        return f"{self.max_dimension}:{self.image_format}:{self.quality}:{self.detail}"
+
+    def _choose_detail(self, width: int, height: int) -> str:
+        if self.detail != 'auto':
+            return self.detail
+        # Small images gain nothing from tiling
+        return 'low' if max(width, height) <= TILE_SIZE else 'high'
+
+    def _normalize(self, image: Union[str, bytes]) -> NormalizedImage:
+        if isinstance(image, bytes):
+            raw = image
+        else:
+            encoded = image.split(',', 1)[1]
+            raw = base64.b64decode(''.join(encoded.split()))
+
+        source = Image.open(io.BytesIO(raw))
+        original_size = source.size
+        original_mime_type = Image.MIME.get(source.format, 'image/png')
+        image_url = image if isinstance(image, str) else None
+        image = source
+        image = image.convert('RGB')
+        target_width, target_height = vision_size(*original_size)
+        image.thumbnail(
+            (min(target_width, self.max_dimension), min(target_height, self.max_dimension)),
+            Image.LANCZOS
+        )
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.image_format, quality=self.quality)
+        normalized = buffer.getvalue()
+
+        # Keep the original if re-encoding didn't make it smaller; the model
+        # rescales it to the same size server-side anyway
+        if len(normalized) >= len(raw):
+            url = image_url or f"data:{original_mime_type};base64,{base64.b64encode(raw).decode('ascii')}"
+            size = original_size
+        else:
+            mime_type = f"image/{self.image_format.lower()}"
+            url = f"data:{mime_type};base64,{base64.b64encode(normalized).decode('ascii')}"
+            size = image.size
+
+        detail = self._choose_detail(*size)
+        return NormalizedImage(
+            url=url,
+            detail=detail,
+            # Compare against the data URL the original would have been sent as
+            original_bytes=len(image_url) if image_url else (
+                len(f"data:{original_mime_type};base64,") + 4 * math.ceil(len(raw) / 3)
+            ),
+            normalized_bytes=len(url),
+            original_tokens=estimate_image_tokens(*original_size, 'high'),
+            normalized_tokens=estimate_image_tokens(*size, detail)
+        )
+
+    async def normalize(self, image: Union[str, bytes, None]) -> Optional[NormalizedImage]:
+        """
+        Downsample and re-encode a slide image before it is sent to a vision model
+
+        Raw image bytes and base64 data URLs are processed; other URLs are passed through.
+
+        :param image: Raw image bytes, data URL or URL of a slide image
+        :return: Normalized image with size and token savings, or None
+        :raises ValueError: If raw bytes or a data URL are not a readable image
+        """
+        if not image:
+            return None
+        if isinstance(image, str) and not image.startswith('data:'):
+            return NormalizedImage(url=image)
+        if isinstance(image, str) and (not image.startswith('data:image/') or ';base64,' not in image):
+            raise ValueError("Invalid slide image: expected a base64 image data URL")
+
+        try:
+            normalized = await asyncio.to_thread(self._normalize, image)
+        except Exception as e:
+            raise ValueError(f"Invalid slide image: {e}")
+
+        self.total_bytes_saved += normalized.bytes_saved
+        self.total_tokens_saved += normalized.tokens_saved
+        metrics_service.record_image(normalized.original_bytes, normalized.normalized_bytes)
+        return normalized
+
+
+image_service = ImageService()
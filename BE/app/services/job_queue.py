@@ -0,0 +1,396 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+JOB_COLUMNS = (
+    'id', 'kind', 'idempotency_key', 'parent_id', 'slide_deck_id', 'slide_number', 'user_id',
+    'status', 'payload', 'result', 'error', 'attempts', 'max_attempts', 'run_after',
+    'locked_by', 'locked_until', 'created_at', 'updated_at'
+)
+
+
+def _row_to_job(row) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    job['payload'] = json.loads(job['payload']) if job['payload'] else None
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+class JobQueue:
+    """
+    Durable summarization job queue in a local SQLite file, shared by the web
+    process (which enqueues) and the worker processes (which run jobs)
+
+    Jobs move from queued to running to succeeded, or back to queued with a
+    backoff when an attempt fails, until max_attempts is reached. A worker
+    holds a lease on its job and renews it while working; jobs whose lease
+    ran out (the worker crashed or was redeployed) are claimed again, so work
+    picks up where it left off. Enqueueing with an idempotency key that's
+    already queued, running or succeeded returns that job instead of a new one.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.JOB_QUEUE_PATH,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        lease: float = settings.JOB_LEASE_SECONDS
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._connection = None
+        # Status counts as of the last refresh_stats()
+        self._counts_snapshot: Dict[str, int] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Autocommit; writes that must be atomic use explicit BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' kind TEXT NOT NULL,'
+                ' idempotency_key TEXT UNIQUE,'
+                ' parent_id TEXT,'
+                ' slide_deck_id TEXT,'
+                ' slide_number INTEGER,'
+                ' user_id TEXT,'
+                ' status TEXT NOT NULL,'
+                ' payload TEXT,'
+                ' result TEXT,'
+                ' error TEXT,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' max_attempts INTEGER NOT NULL,'
+                ' run_after REAL NOT NULL,'
+                ' locked_by TEXT,'
+                ' locked_until REAL,'
+                ' created_at REAL NOT NULL,'
+                ' updated_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_status_run_after ON jobs (status, run_after)')
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_parent_id ON jobs (parent_id)')
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_slide_deck_id ON jobs (slide_deck_id)')
+            connection.execute('CREATE INDEX IF NOT EXISTS jobs_status_updated_at ON jobs (status, updated_at)')
+            self._connection = connection
+        return self._connection
+
+    def _select(self, connection: sqlite3.Connection, where: str, params: tuple) -> Optional[dict]:
+        row = connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE {where}", params).fetchone()
+        return _row_to_job(row)
+
+    def _enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        idempotency_key: Optional[str],
+        slide_deck_id: Optional[str],
+        slide_number: Optional[int],
+        user_id: Optional[str],
+        parent_id: Optional[str],
+        rerun_finished: bool
+    ) -> dict:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if idempotency_key:
+                    existing = self._select(connection, 'idempotency_key = ?', (idempotency_key,))
+                    if existing is not None:
+                        if existing['status'] in ACTIVE_STATES or (existing['status'] == SUCCEEDED and not rerun_finished):
+                            connection.execute('COMMIT')
+                            return existing
+                        # Finished: hand the key over to a fresh job
+                        connection.execute(
+                            'UPDATE jobs SET idempotency_key = NULL WHERE id = ?', (existing['id'],)
+                        )
+
+                job_id = str(uuid.uuid4())
+                connection.execute(
+                    'INSERT INTO jobs (id, kind, idempotency_key, parent_id, slide_deck_id, slide_number,'
+                    ' user_id, status, payload, max_attempts, run_after, created_at, updated_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, kind, idempotency_key, parent_id, slide_deck_id, slide_number, user_id,
+                     QUEUED, json.dumps(payload), self.max_attempts, now, now, now)
+                )
+                job = self._select(connection, 'id = ?', (job_id,))
+                connection.execute('COMMIT')
+                return job
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    def _claim(self, worker_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                # Jobs whose worker keeps dying on them aren't retried forever
+                connection.execute(
+                    'UPDATE jobs SET status = ?, error = ?, payload = NULL, locked_by = NULL, locked_until = NULL,'
+                    ' updated_at = ? WHERE status = ? AND locked_until < ? AND attempts >= max_attempts',
+                    (FAILED, 'Worker stopped while running the job', now, RUNNING, now)
+                )
+                # Oldest runnable job, or one whose worker stopped renewing its lease
+                row = connection.execute(
+                    'SELECT id FROM jobs'
+                    ' WHERE (status = ? AND run_after <= ?) OR (status = ? AND locked_until < ?)'
+                    ' ORDER BY run_after LIMIT 1',
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    connection.execute('COMMIT')
+                    return None
+                connection.execute(
+                    'UPDATE jobs SET status = ?, attempts = attempts + 1, locked_by = ?, locked_until = ?,'
+                    ' updated_at = ? WHERE id = ?',
+                    (RUNNING, worker_id, now + self.lease, now, row[0])
+                )
+                job = self._select(connection, 'id = ?', (row[0],))
+                connection.execute('COMMIT')
+                return job
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    def _update_lease(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                'UPDATE jobs SET locked_until = ?, updated_at = ? WHERE id = ? AND locked_by = ? AND status = ?',
+                (now + self.lease, now, job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, worker_id: str, status: str, result=None, error: Optional[str] = None,
+                retry_after: Optional[float] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            if retry_after is not None:
+                cursor = connection.execute(
+                    'UPDATE jobs SET status = ?, error = ?, run_after = ?, locked_by = NULL, locked_until = NULL,'
+                    ' updated_at = ? WHERE id = ? AND locked_by = ? AND status = ?',
+                    (QUEUED, error, now + retry_after, now, job_id, worker_id, RUNNING)
+                )
+            else:
+                # Inputs (slide images) aren't needed once the job is done
+                cursor = connection.execute(
+                    'UPDATE jobs SET status = ?, result = ?, error = ?, payload = NULL, locked_by = NULL,'
+                    ' locked_until = NULL, updated_at = ? WHERE id = ? AND locked_by = ? AND status = ?',
+                    (status, json.dumps(result) if result is not None else None, error, now,
+                     job_id, worker_id, RUNNING)
+                )
+            return cursor.rowcount == 1
+
+    def _release(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._connect().execute(
+                'UPDATE jobs SET status = ?, attempts = attempts - 1, run_after = ?, locked_by = NULL,'
+                ' locked_until = NULL, updated_at = ? WHERE id = ? AND locked_by = ? AND status = ?',
+                (QUEUED, now, now, job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def _get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._select(self._connect(), 'id = ?', (job_id,))
+
+    def _get_by_key(self, idempotency_key: str) -> Optional[dict]:
+        with self._lock:
+            return self._select(self._connect(), 'idempotency_key = ?', (idempotency_key,))
+
+    def _children(self, parent_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE parent_id = ? ORDER BY slide_number",
+                (parent_id,)
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def _cancel_deck(self, slide_deck_id: str) -> int:
+        with self._lock:
+            cursor = self._connect().execute(
+                'UPDATE jobs SET status = ?, payload = NULL, updated_at = ? WHERE slide_deck_id = ? AND status = ?',
+                (CANCELLED, time.time(), slide_deck_id, QUEUED)
+            )
+            return cursor.rowcount
+
+    def _prune(self, older_than: float) -> int:
+        with self._lock:
+            cursor = self._connect().execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATES))}) AND updated_at < ?",
+                (*FINISHED_STATES, time.time() - older_than)
+            )
+            return cursor.rowcount
+
+    def _succeeded_since(self, since: float) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE status = ? AND updated_at >= ? ORDER BY updated_at",
+                (SUCCEEDED, since)
+            ).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def _counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        idempotency_key: Optional[str] = None,
+        slide_deck_id: Optional[str] = None,
+        slide_number: Optional[int] = None,
+        user_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        rerun_finished: bool = False
+    ) -> dict:
+        """
+        Add a job to the queue
+
+        :param kind: Job handler name (e.g. "slide", "deck")
+        :param payload: JSON-serializable job inputs
+        :param idempotency_key: Returns the existing job with this key if it's
+                                queued, running or succeeded
+        :param slide_deck_id: ID of the slide deck the job works on
+        :param slide_number: Slide the job works on
+        :param user_id: User the job runs for
+        :param parent_id: Job that enqueued this one
+        :param rerun_finished: Start a new job even if the key's job succeeded
+        :return: New or existing job
+        """
+        return await asyncio.to_thread(
+            self._enqueue, kind, payload, idempotency_key, slide_deck_id, slide_number,
+            user_id, parent_id, rerun_finished
+        )
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Take the next runnable job, leasing it to the worker
+
+        :param worker_id: ID of the claiming worker
+        :return: Claimed job, or None if nothing is runnable
+        """
+        return await asyncio.to_thread(self._claim, worker_id)
+
+    async def renew(self, job_id: str, worker_id: str) -> bool:
+        """
+        Extend a job's lease
+
+        :return: False if the worker no longer holds the job
+        """
+        return await asyncio.to_thread(self._update_lease, job_id, worker_id)
+
+    async def succeed(self, job_id: str, worker_id: str, result=None) -> bool:
+        return await asyncio.to_thread(self._finish, job_id, worker_id, SUCCEEDED, result)
+
+    async def fail(self, job: dict, worker_id: str, error: str, retry_after: Optional[float] = None) -> bool:
+        """
+        Record a failed attempt, retrying after a backoff while attempts remain
+
+        :param job: Job as claimed
+        :param worker_id: ID of the worker running it
+        :param error: Error message
+        :param retry_after: Seconds to wait before retrying, or None for the default backoff
+        """
+        if job['attempts'] >= job['max_attempts']:
+            return await asyncio.to_thread(self._finish, job['id'], worker_id, FAILED, None, error)
+        if retry_after is None:
+            retry_after = settings.JOB_RETRY_BASE_DELAY * 2 ** (job['attempts'] - 1)
+        return await asyncio.to_thread(self._finish, job['id'], worker_id, QUEUED, None, error, retry_after)
+
+    async def release(self, job_id: str, worker_id: str) -> bool:
+        """
+        Put an interrupted job back in the queue without counting the attempt,
+        e.g. when its worker shuts down
+        """
+        return await asyncio.to_thread(self._release, job_id, worker_id)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def get_by_key(self, idempotency_key: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._get_by_key, idempotency_key)
+
+    async def children(self, parent_id: str) -> List[dict]:
+        return await asyncio.to_thread(self._children, parent_id)
+
+    async def cancel_deck(self, slide_deck_id: str) -> int:
+        """
+        Cancel a deck's queued jobs, e.g. after the deck is deleted
+
+        :return: Number of jobs cancelled
+        """
+        return await asyncio.to_thread(self._cancel_deck, slide_deck_id)
+
+    async def prune(self, older_than: float = settings.JOB_RETENTION) -> int:
+        """
+        Delete jobs that finished more than older_than seconds ago
+        """
+        return await asyncio.to_thread(self._prune, older_than)
+
+    async def succeeded_since(self, since: float) -> List[dict]:
+        """
+        Jobs that succeeded at or after a time, oldest first
+
+        :param since: Unix timestamp
+        """
+        return await asyncio.to_thread(self._succeeded_since, since)
+
+    async def refresh_stats(self):
+        """
+        Count jobs by status for stats(), off the event loop
+        """
+        try:
+            self._counts_snapshot = await asyncio.to_thread(self._counts)
+        except sqlite3.Error as e:
+            print(f"Job queue stats error: {e}")
+
+    async def open(self):
+        def connect():
+            with self._lock:
+                self._connect()
+        await asyncio.to_thread(connect)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> dict:
+        # Counting takes the queue lock, which a busy database can hold for
+        # seconds; report the counts from the last refresh_stats() instead
+        counts = self._counts_snapshot
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED)}
+
+
+job_queue = JobQueue()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.job_queue import job_queue
+from app.services.slide_context_cache import slide_context_cache
+from app.services.summary_read_cache import summary_read_cache
+
+# Jobs are looked up this far before the newest one seen, since a worker can
+# commit a job stamped earlier than one another worker already committed
+OVERLAP = 60
+
+
+class JobWatcher:
+    """
+    Keeps the web process's caches in step with summaries written by workers
+
+    Worker processes write SlideSummary rows themselves, so the summary read
+    cache and slide context cache of the web process never see those writes.
+    Every JOB_WATCH_INTERVAL the watcher looks up the jobs that succeeded
+    since its last poll, drops the affected decks from the read cache and
+    updates the cached slide summaries. It also refreshes the job queue
+    counts reported on /metrics.
+    """
+
+    def __init__(self, interval: float = settings.JOB_WATCH_INTERVAL):
+        self.interval = interval
+        self._since = time.time()
+        # Job ID -> updated_at of jobs already applied within the overlap
+        self._seen: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.applied = 0
+
+    def _apply(self, job: dict):
+        slide_deck_id = job['slide_deck_id']
+        if not slide_deck_id:
+            return
+        summary_read_cache.invalidate(slide_deck_id)
+        result = job['result'] or {}
+        if job['slide_number'] is not None and 'summary_text' in result:
+            slide_context_cache.update_summary(slide_deck_id, job['slide_number'], result['summary_text'])
+        self.applied += 1
+
+    async def poll(self):
+        """
+        Apply the jobs that succeeded since the last poll
+        """
+        jobs = await job_queue.succeeded_since(self._since - OVERLAP)
+        for job in jobs:
+            if self._seen.get(job['id']) == job['updated_at']:
+                continue
+            self._seen[job['id']] = job['updated_at']
+            self._apply(job)
+        if jobs:
+            self._since = max(self._since, jobs[-1]['updated_at'])
+        self._seen = {
+            job_id: updated_at for job_id, updated_at in self._seen.items()
+            if updated_at >= self._since - OVERLAP
+        }
+        await job_queue.refresh_stats()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Error watching finished jobs: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"applied_jobs": self.applied}
+
+
+job_watcher = JobWatcher()
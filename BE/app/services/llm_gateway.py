@@ -0,0 +1,411 @@
+import asyncio
+import math
+import random
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, List, Optional
+
+import openai
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.services.image_service import LOW_DETAIL_TOKENS, estimate_image_tokens
+from app.services.metrics_service import metrics_service
+from app.utils.tokens import estimate_tokens
+
+# Budgeted cost of a high detail slide image; its real size isn't known here
+IMAGE_TOKEN_ESTIMATE = estimate_image_tokens(1024, 768, 'high')
+
+# Queue for calls not made on behalf of a user (e.g. background indexing)
+SYSTEM_USER = 'system'
+
+
+def estimate_request_tokens(messages: List[dict], max_tokens: int = 0) -> int:
+    """
+    Estimate the tokens a chat completion counts against the TPM limit
+
+    :param messages: Chat completion messages
+    :param max_tokens: Maximum completion tokens
+    :return: Estimated prompt plus completion tokens
+    """
+    total = max_tokens
+    for message in messages:
+        content = message['content']
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+            continue
+        for part in content:
+            if part['type'] == 'text':
+                total += estimate_tokens(part['text'])
+            elif part['type'] == 'image_url':
+                low = part['image_url'].get('detail') == 'low'
+                total += LOW_DETAIL_TOKENS if low else IMAGE_TOKEN_ESTIMATE
+    return total
+
+
+class LLMOverloadedError(Exception):
+    """
+    Raised when a call is rejected because the LLM queue is full or the wait
+    for a slot timed out
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBucket:
+    """
+    Allowance refilled continuously up to a per-minute limit; a limit of 0
+    never makes callers wait
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        # A negative amount charges usage beyond the original estimate
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMGateway:
+    """
+    Shared OpenAI client that keeps the app within its rate limits
+
+    Calls wait in per-user queues served round robin, so a burst from one user
+    can't starve the others. A call is admitted once a concurrency slot and
+    enough request and token allowance (RPM/TPM buckets) are available. When
+    the queue is full, calls are rejected immediately with LLMOverloadedError.
+    429s and transient errors are retried after the server's Retry-After, and
+    a 429 pauses all admissions until then. A retry keeps its concurrency
+    slot but waits for and is charged request and token allowance again,
+    since every attempt is a request OpenAI counts. Each process has its own
+    gateway, so the RPM/TPM limits are split evenly between `processes`.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = settings.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = settings.LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        max_queue_depth: int = settings.LLM_MAX_QUEUE_DEPTH,
+        max_queue_per_user: int = settings.LLM_MAX_QUEUE_PER_USER,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        max_retry_delay: float = settings.LLM_MAX_RETRY_DELAY,
+        processes: int = settings.LLM_PROCESSES
+    ):
+        # Retries are handled here so each attempt is charged to the RPM/TPM buckets
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.max_retry_delay = max_retry_delay
+
+        processes = max(1, processes)
+        self._requests = TokenBucket(requests_per_minute / processes)
+        self._tokens = TokenBucket(tokens_per_minute / processes)
+        # user_id -> deque of (waiter, tokens), next user to serve first
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._depth = 0
+        self._active = 0
+        self._paused_until = 0.0
+        self._timer = None
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queues and self._active < self.max_concurrency:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter, tokens = queue[0]
+            if waiter.done():
+                # Cancelled or timed out, and about to remove itself
+                queue.popleft()
+                self._depth -= 1
+                if not queue:
+                    del self._queues[user_id]
+                continue
+
+            wait = max(
+                self._paused_until - time.monotonic(),
+                self._requests.wait_time(1),
+                self._tokens.wait_time(tokens)
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            queue.popleft()
+            self._depth -= 1
+            if queue:
+                # Round robin: this user goes to the back of the line
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._active += 1
+            self.admitted += 1
+            waiter.set_result(None)
+
+    def _remove(self, user_id: str, entry: tuple):
+        queue = self._queues.get(user_id)
+        if queue and entry in queue:
+            queue.remove(entry)
+            self._depth -= 1
+            if not queue:
+                del self._queues[user_id]
+        self._dispatch()
+
+    def _estimated_wait(self) -> float:
+        return max(
+            self._paused_until - time.monotonic(),
+            # A zero limit disables the bucket (see TokenBucket.wait_time)
+            self._depth / self._requests.rate if self._requests.rate > 0 else 0.0,
+            1.0
+        )
+
+    async def _acquire(self, user_id: str, tokens: int):
+        queue = self._queues.get(user_id)
+        if self._depth >= self.max_queue_depth or (queue and len(queue) >= self.max_queue_per_user):
+            self.rejected += 1
+            raise LLMOverloadedError("Too many requests waiting for the model, please retry shortly", self._estimated_wait())
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, tokens)
+        self._queues.setdefault(user_id, deque()).append(entry)
+        self._depth += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(user_id, entry)
+            self.timed_out += 1
+            raise LLMOverloadedError("Timed out waiting for the model, please retry shortly", self._estimated_wait())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller went away
+                self._release(tokens)
+            else:
+                self._remove(user_id, entry)
+            raise
+
+    def _release(self, tokens: int, used_tokens: Optional[int] = None):
+        self._active -= 1
+        if used_tokens is not None:
+            self._tokens.give(tokens - used_tokens)
+        self._dispatch()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        How long to wait before retrying a failed call, or None if it shouldn't be retried
+        """
+        if isinstance(error, openai.RateLimitError) and error.code == 'insufficient_quota':
+            return None
+        if not isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+            return None
+        if attempt >= self.max_retries:
+            return None
+
+        response = getattr(error, 'response', None)
+        headers = response.headers if response is not None else {}
+        delay = None
+        try:
+            if headers.get('retry-after-ms'):
+                delay = float(headers['retry-after-ms']) / 1000
+            elif headers.get('retry-after'):
+                delay = float(headers['retry-after'])
+        except ValueError:
+            pass
+        if delay is None:
+            # Exponential backoff with jitter
+            delay = 0.5 * 2 ** attempt * random.uniform(0.5, 1.0)
+        return min(delay, self.max_retry_delay)
+
+    async def _charge_retry(self, tokens: int):
+        """
+        Wait for request and token allowance for another attempt of an admitted call, and take it
+        """
+        while True:
+            wait = max(
+                self._paused_until - time.monotonic(),
+                self._requests.wait_time(1),
+                self._tokens.wait_time(tokens)
+            )
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self._requests.take(1)
+        self._tokens.take(tokens)
+
+    async def _create(self, tokens: int, create, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await create(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                if isinstance(e, openai.RateLimitError):
+                    self.rate_limited += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                await self._charge_retry(tokens)
+
+    async def chat_completion(self, user_id: Optional[str], messages: List[dict], max_tokens: int, **kwargs):
+        """
+        Create a chat completion within the rate limits
+
+        :param user_id: User the call is made for, used for fair queueing
+        :param messages: Chat completion messages
+        :param max_tokens: Maximum completion tokens
+        :param kwargs: Other chat completion arguments (model, ...)
+        :return: Chat completion response
+        :raises LLMOverloadedError: If the call couldn't be admitted in time
+        """
+        tokens = estimate_request_tokens(messages, max_tokens)
+        with metrics_service.phase('llm_queue'):
+            await self._acquire(user_id or SYSTEM_USER, tokens)
+        used_tokens = None
+        try:
+            with metrics_service.phase('llm', 'chat.completions'):
+                response = await self._create(
+                    tokens,
+                    self.client.chat.completions.create,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+            if response.usage:
+                used_tokens = response.usage.total_tokens
+                metrics_service.record_llm_usage(kwargs.get('model'), response.usage)
+            return response
+        finally:
+            self._release(tokens, used_tokens)
+
+    async def stream_chat_completion(self, user_id: Optional[str], messages: List[dict], max_tokens: int, **kwargs) -> AsyncIterator:
+        """
+        Stream a chat completion within the rate limits
+
+        The concurrency slot is held until the stream ends. The final chunk
+        carries usage and no choices.
+
+        :param user_id: User the call is made for, used for fair queueing
+        :param messages: Chat completion messages
+        :param max_tokens: Maximum completion tokens
+        :param kwargs: Other chat completion arguments (model, ...)
+        :return: Async iterator of chat completion chunks
+        :raises LLMOverloadedError: If the call couldn't be admitted in time
+        """
+        tokens = estimate_request_tokens(messages, max_tokens)
+        with metrics_service.phase('llm_queue'):
+            await self._acquire(user_id or SYSTEM_USER, tokens)
+        used_tokens = None
+        try:
+            with metrics_service.phase('llm', 'chat.completions.stream'):
+                stream = await self._create(
+                    tokens,
+                    self.client.chat.completions.create,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **kwargs
+                )
+                async for chunk in stream:
+                    if chunk.usage:
+                        used_tokens = chunk.usage.total_tokens
+                        metrics_service.record_llm_usage(kwargs.get('model'), chunk.usage)
+                    yield chunk
+        finally:
+            self._release(tokens, used_tokens)
+
+    async def embeddings(self, user_id: Optional[str], input: List[str], **kwargs):
+        """
+        Create embeddings within the rate limits
+
+        :param user_id: User the call is made for, used for fair queueing
+        :param input: Texts to embed
+        :param kwargs: Other embedding arguments (model, dimensions, ...)
+        :return: Embedding response
+        :raises LLMOverloadedError: If the call couldn't be admitted in time
+        """
+        tokens = sum(estimate_tokens(text) for text in input)
+        with metrics_service.phase('llm_queue'):
+            await self._acquire(user_id or SYSTEM_USER, tokens)
+        used_tokens = None
+        try:
+            with metrics_service.phase('llm', 'embeddings'):
+                response = await self._create(tokens, self.client.embeddings.create, input=input, **kwargs)
+            if response.usage:
+                used_tokens = response.usage.total_tokens
+                metrics_service.record_llm_usage(kwargs.get('model'), response.usage)
+            return response
+        finally:
+            self._release(tokens, used_tokens)
+
+    async def warm_up(self):
+        """
+        Open a connection to the OpenAI API ahead of the first call
+
+        Listing models is free and doesn't count against the rate limits.
+        """
+        await self.client.models.list()
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.client.close()
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._depth,
+            "queued_users": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+        }
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,243 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Callable, Dict, Optional, Tuple
+
+# Latency buckets in seconds, stretched past the usual defaults for LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 500 * 1024, 1024 ** 2, 5 * 1024 ** 2, 20 * 1024 ** 2)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PHASES = ('auth', 'db', 'storage', 'llm_queue', 'llm', 'serialization')
+
+# Phase durations of the request being handled, shared with the tasks it
+# spawns; background tasks run in background_context() instead
+_request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_phases', default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', f'{bound:g}'),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return '\n'.join(lines)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._series: Dict[tuple, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._series[key] = self._series.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self._series.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return '\n'.join(lines)
+
+
+class MetricsService:
+    """
+    In-process request, dependency and usage metrics in the Prometheus text format
+
+    Each request's time is broken down into phases (auth, db, storage,
+    llm_queue, llm, serialization); whatever is left is our own code ("app").
+    Services report their counters (cache hits, queue depth, ...) through
+    registered collectors, read when /metrics is scraped.
+    """
+
+    def __init__(self, namespace: str = 'deck_study_buddy'):
+        self.namespace = namespace
+        self.request_duration = Histogram(
+            f'{namespace}_request_duration_seconds',
+            'Request latency by route, method and status'
+        )
+        self.request_phase = Histogram(
+            f'{namespace}_request_phase_seconds',
+            'Time spent per request in auth, db, storage, llm_queue, llm, serialization and app code'
+        )
+        self.dependency_duration = Histogram(
+            f'{namespace}_dependency_duration_seconds',
+            'Latency of individual calls to Supabase and OpenAI'
+        )
+        self.llm_tokens = Histogram(
+            f'{namespace}_llm_tokens',
+            'Prompt and completion tokens per OpenAI call',
+            TOKEN_BUCKETS
+        )
+        self.llm_tokens_total = Counter(
+            f'{namespace}_llm_tokens_total',
+            'Prompt and completion tokens used'
+        )
+        self.image_bytes = Histogram(
+            f'{namespace}_image_bytes',
+            'Slide image size before and after normalization',
+            SIZE_BUCKETS
+        )
+        self.errors_total = Counter(
+            f'{namespace}_errors_total',
+            'Failed dependency calls'
+        )
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def register_collector(self, name: str, collect: Callable[[], dict]):
+        """
+        Export a service's stats() as gauges
+
+        :param name: Metric name prefix (e.g. "summary_cache")
+        :param collect: Returns a dict of numeric stats
+        """
+        self._collectors[name] = collect
+
+    def start_request(self) -> Dict[str, float]:
+        phases = dict.fromkeys(PHASES, 0.0)
+        _request_phases.set(phases)
+        return phases
+
+    def finish_request(self, phases: Dict[str, float], duration: float, route: str, method: str, status: int):
+        self.request_duration.observe(duration, route=route, method=method, status=str(status))
+        for phase, seconds in phases.items():
+            self.request_phase.observe(seconds, route=route, phase=phase)
+        self.request_phase.observe(max(0.0, duration - sum(phases.values())), route=route, phase='app')
+
+    def background_context(self, phases: Optional[Dict[str, float]] = None) -> Context:
+        """
+        Context to run a background task in, so its time isn't added to the
+        phases of the request that happened to start it
+
+        :param phases: Dict collecting the task's own phase durations, if wanted
+        :return: Context for asyncio.create_task(..., context=...)
+        """
+        context = copy_context()
+        context.run(_request_phases.set, phases)
+        return context
+
+    def add_phases(self, phases: Dict[str, float]):
+        """
+        Add phase durations collected elsewhere (see background_context) to the current request
+        """
+        current = _request_phases.get()
+        if current is not None:
+            for phase, seconds in phases.items():
+                current[phase] = current.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase: str, operation: Optional[str] = None):
+        """
+        Time a block as part of the current request's phase
+
+        :param phase: One of PHASES
+        :param operation: Dependency call being made, recorded per call if given
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if operation:
+                self.errors_total.inc(phase=phase, operation=operation)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            phases = _request_phases.get()
+            if phases is not None:
+                phases[phase] = phases.get(phase, 0.0) + elapsed
+            if operation:
+                self.dependency_duration.observe(elapsed, phase=phase, operation=operation)
+
+    def timed(self, phase: str):
+        """
+        Decorator timing every call of an async function as a phase
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.phase(phase, fn.__name__):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_llm_usage(self, model: str, usage):
+        """
+        Record token usage reported by an OpenAI call
+
+        :param model: Model name
+        :param usage: Usage object from the response
+        """
+        if usage is None:
+            return
+        for kind, tokens in (('prompt', usage.prompt_tokens), ('completion', getattr(usage, 'completion_tokens', None))):
+            if tokens is None:
+                continue
+            self.llm_tokens.observe(tokens, model=model, kind=kind)
+            self.llm_tokens_total.inc(tokens, model=model, kind=kind)
+
+    def record_image(self, original_bytes: int, normalized_bytes: int):
+        self.image_bytes.observe(original_bytes, stage='original')
+        self.image_bytes.observe(normalized_bytes, stage='normalized')
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+        """
+        sections = [
+            metric.render() for metric in (
+                self.request_duration,
+                self.request_phase,
+                self.dependency_duration,
+                self.llm_tokens,
+                self.llm_tokens_total,
+                self.image_bytes,
+                self.errors_total,
+            )
+        ]
+        for name, collect in self._collectors.items():
+            try:
+                stats = collect()
+            except Exception as e:
+                print(f"Error collecting {name} metrics: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    metric = f"{self.namespace}_{name}_{key}"
+                    sections.append(f"# TYPE {metric} gauge\n{metric} {value}")
+        return '\n'.join(sections) + '\n'
+
+
+metrics_service = MetricsService()
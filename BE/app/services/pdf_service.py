@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import ctypes
+import io
+import posixpath
+import unicodedata
+from dataclasses import dataclass
+from typing import Collection, List, Optional
+from urllib.parse import unquote, urlparse
+
+import httpx
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+from app.config import settings
+
+# Page objects that carry pictures, charts and diagrams rather than text
+VISUAL_OBJECT_TYPES = (pdfium_c.FPDF_PAGEOBJ_IMAGE, pdfium_c.FPDF_PAGEOBJ_PATH, pdfium_c.FPDF_PAGEOBJ_SHADING)
+
+# Vector shapes covering at least this much of the page are backgrounds or frames
+BACKGROUND_COVERAGE = 0.8
+
+# Unicode categories of math and other symbols, unmapped glyphs and private use
+# code points; equations tend to extract as a mix of these
+SYMBOL_CATEGORIES = ('Sm', 'Sk', 'So', 'Co')
+
+
+@dataclass
+class PageText:
+    """
+    Text layer of a PDF page and how visual the page is
+    """
+    text: str
+    # Fraction of the page covered by images and vector graphics
+    visual_coverage: float
+    # Fraction of non-space characters that are symbols, e.g. from equations
+    symbol_ratio: float
+
+
+def _object_area(page_object) -> float:
+    left, bottom, right, top = (ctypes.c_float() for _ in range(4))
+    if not pdfium_c.FPDFPageObj_GetBounds(page_object.raw, left, bottom, right, top):
+        return 0.0
+    return max(0.0, right.value - left.value) * max(0.0, top.value - bottom.value)
+
+
+def _symbol_ratio(text: str) -> float:
+    characters = [ch for ch in text if not ch.isspace()]
+    if not characters:
+        return 0.0
+    symbols = sum(1 for ch in characters if ch == '\ufffd' or unicodedata.category(ch) in SYMBOL_CATEGORIES)
+    return symbols / len(characters)
+
+
+def storage_url_prefix() -> str:
+    """
+    Prefix of the public URLs of PDFs in the slide deck storage bucket
+    """
+    return f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{settings.SUPABASE_BUCKET_NAME}/"
+
+
+def is_storage_url(pdf_url: str) -> bool:
+    """
+    Whether a URL points into the slide deck storage bucket
+
+    The server downloads deck PDFs by URL, so anything else (internal hosts,
+    other buckets, paths escaping the bucket) is refused.
+
+    :param pdf_url: URL sent by the client
+    """
+    url = urlparse(pdf_url)
+    prefix = urlparse(storage_url_prefix())
+    if (url.scheme, url.netloc) != (prefix.scheme, prefix.netloc) or url.query or url.fragment:
+        return False
+    path = unquote(url.path)
+    return (
+        path.startswith(prefix.path)
+        and posixpath.normpath(path).startswith(prefix.path)
+        and '\\' not in path
+    )
+
+
+class PDFService:
+    def __init__(self, max_bytes: int = settings.PDF_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.http_client = httpx.AsyncClient(follow_redirects=False, timeout=60)
+
+    async def download_pdf(self, pdf_url: str) -> bytes:
+        """
+        Download a slide deck PDF from the storage bucket
+
+        :param pdf_url: Public URL of the uploaded PDF
+        :return: Raw PDF bytes
+        :raises ValueError: If the URL is outside the bucket or the PDF exceeds PDF_MAX_BYTES
+        """
+        if not is_storage_url(pdf_url):
+            raise ValueError("PDF URL is not in the slide deck storage bucket")
+
+        async with self.http_client.stream('GET', pdf_url) as response:
+            response.raise_for_status()
+            content_length = response.headers.get('content-length')
+            if content_length and int(content_length) > self.max_bytes:
+                raise ValueError("PDF too large")
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_bytes:
+                    raise ValueError("PDF too large")
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _render_pages(self, pdf_bytes: bytes, scale: float, pages: Optional[Collection[int]]) -> List[Optional[str]]:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            page_images = []
+            for page_number, page in enumerate(pdf, start=1):
+                if pages is not None and page_number not in pages:
+                    page_images.append(None)
+                    page.close()
+                    continue
+                image = page.render(scale=scale).to_pil().convert('RGB')
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=settings.PDF_RENDER_JPEG_QUALITY)
+                encoded = base64.b64encode(buffer.getvalue()).decode('ascii')
+                page_images.append(f"data:image/jpeg;base64,{encoded}")
+                page.close()
+            return page_images
+        finally:
+            pdf.close()
+
+    async def render_pages(
+        self,
+        pdf_bytes: bytes,
+        scale: float = settings.PDF_RENDER_SCALE,
+        pages: Optional[Collection[int]] = None
+    ) -> List[Optional[str]]:
+        """
+        Rasterize the pages of a PDF into JPEG data URLs
+
+        Rendering runs in a worker thread so it doesn't block the event loop.
+
+        :param pdf_bytes: Raw PDF bytes
+        :param scale: Render scale (1.0 = 72 DPI)
+        :param pages: Page numbers (1-based) to render, or None for all
+        :return: One data URL per page, in page order; None for pages not rendered
+        """
+        return await asyncio.to_thread(self._render_pages, pdf_bytes, scale, pages)
+
+    def _page_count(self, pdf_bytes: bytes) -> int:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    async def page_count(self, pdf_bytes: bytes) -> int:
+        return await asyncio.to_thread(self._page_count, pdf_bytes)
+
+    def _extract_text(self, pdf_bytes: bytes) -> List[PageText]:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            page_texts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                text = textpage.get_text_range().strip()
+                textpage.close()
+
+                width, height = page.get_size()
+                page_area = max(width * height, 1.0)
+                visual_area = 0.0
+                for page_object in page.get_objects(filter=VISUAL_OBJECT_TYPES):
+                    area = _object_area(page_object) / page_area
+                    if page_object.type == pdfium_c.FPDF_PAGEOBJ_PATH and area >= BACKGROUND_COVERAGE:
+                        continue
+                    visual_area += area
+
+                page_texts.append(PageText(text, min(visual_area, 1.0), _symbol_ratio(text)))
+                page.close()
+            return page_texts
+        finally:
+            pdf.close()
+
+    async def extract_text(self, pdf_bytes: bytes) -> List[PageText]:
+        """
+        Read the text layer of every page of a PDF
+
+        :param pdf_bytes: Raw PDF bytes
+        :return: One PageText per page, in page order
+        """
+        return await asyncio.to_thread(self._extract_text, pdf_bytes)
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+pdf_service = PDFService()
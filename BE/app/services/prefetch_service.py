@@ -0,0 +1,288 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.services.llm_gateway import llm_gateway
+from app.services.metrics_service import metrics_service
+from app.services.pdf_service import pdf_service
+from app.services.slide_context_cache import slide_context_cache
+from app.services.summary_service import summary_service
+from app.services.supabase_service import supabase_service
+from app.services.text_layer_service import text_layer_service
+
+# Prefetched slides remembered for the foreground request that asks for them
+MAX_FINISHED_SLIDES = 4096
+
+
+@dataclass
+class Prefetch:
+    user_data: dict
+    slide_deck_id: str
+    # Slides still to summarize, nearest first; replaced when the student moves on
+    slides: List[int]
+    task: Optional[asyncio.Task] = None
+    # (slide number, task) of the slide being summarized right now
+    running: Optional[Tuple[int, asyncio.Task]] = None
+    pdf_bytes: Optional[bytes] = None
+    completed: List[int] = field(default_factory=list)
+
+
+class PrefetchService:
+    """
+    Summarizes the next few slides in the background while a student reads
+    the current one, so turning the page usually finds its summary saved
+
+    Each (user, deck) has at most one prefetch, working through its slides one
+    at a time; viewing another slide replaces the slides still to do. Slides
+    are rendered from the deck PDF on the server (or summarized from its text
+    layer). Prefetch never competes with foreground work: it stops as soon as
+    requests are queued at the LLM gateway, users are capped at
+    PREFETCH_MAX_PER_USER decks and all users share PREFETCH_CONCURRENCY slots.
+
+    Prefetch owns the slides it has started or finished: a request for such a
+    slide gets the prefetched summary instead of summarizing the slide from
+    the client's image again. Slides are rendered in pairs with the previous
+    page, so prefetched build slides take the same near-duplicate paths as
+    slides summarized from client images, and are kept in the slide context
+    cache for the request about the next slide.
+    """
+
+    def __init__(
+        self,
+        slides_ahead: int = settings.PREFETCH_SLIDES,
+        max_per_user: int = settings.PREFETCH_MAX_PER_USER,
+        concurrency: int = settings.PREFETCH_CONCURRENCY
+    ):
+        self.slides_ahead = slides_ahead
+        self.max_per_user = max_per_user
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # (user_id, slide_deck_id) -> Prefetch, oldest first
+        self._prefetches: "OrderedDict[Tuple[str, str], Prefetch]" = OrderedDict()
+        # (user_id, slide_deck_id, slide_number) of prefetched slides no request has asked for yet
+        self._finished: "OrderedDict[Tuple[str, str, int], None]" = OrderedDict()
+        self.scheduled = 0
+        self.completed = 0
+        self.joined = 0
+        self.yielded = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def schedule(self, user_data: dict, slide_deck_id: str, slide_number: int) -> List[int]:
+        """
+        Prefetch the slides after the one just viewed or summarized
+
+        :param user_data: Dictionary containing user ID and token
+        :param slide_deck_id: ID of the slide deck
+        :param slide_number: Slide the student is on
+        :return: Slides that will be prefetched unless already summarized
+        """
+        if self.slides_ahead <= 0:
+            return []
+
+        slides = list(range(slide_number + 1, slide_number + 1 + self.slides_ahead))
+        key = (user_data["user_id"], slide_deck_id)
+        prefetch = self._prefetches.get(key)
+        if prefetch is not None and not prefetch.task.done():
+            prefetch.user_data = user_data
+            prefetch.slides = [n for n in slides if n not in prefetch.completed]
+            self._prefetches.move_to_end(key)
+            return prefetch.slides
+
+        user_keys = [k for k in self._prefetches if k[0] == user_data["user_id"]]
+        for oldest in user_keys[:max(0, len(user_keys) - self.max_per_user + 1)]:
+            self.cancel(*oldest)
+
+        prefetch = Prefetch(user_data, slide_deck_id, slides)
+        prefetch.task = asyncio.create_task(self._run(prefetch), context=metrics_service.background_context())
+        self._prefetches[key] = prefetch
+        prefetch.task.add_done_callback(lambda _: self._forget(key, prefetch))
+        self.scheduled += 1
+        return slides
+
+    def _forget(self, key: Tuple[str, str], prefetch: Prefetch):
+        if self._prefetches.get(key) is prefetch:
+            del self._prefetches[key]
+
+    def cancel(self, user_id: str, slide_deck_id: str) -> bool:
+        """
+        Stop prefetching a deck for a user
+
+        :return: Whether a prefetch was running
+        """
+        prefetch = self._prefetches.pop((user_id, slide_deck_id), None)
+        if prefetch is None or prefetch.task.done():
+            return False
+        prefetch.task.cancel()
+        self.cancelled += 1
+        return True
+
+    def claim(self, user_id: str, slide_deck_id: str, slide_number: int) -> Optional[asyncio.Task]:
+        """
+        Take a slide out of prefetch because a foreground request is summarizing it
+
+        :return: The prefetch task summarizing the slide right now, whose saved
+                 record the caller can wait for instead, or None
+        """
+        prefetch = self._prefetches.get((user_id, slide_deck_id))
+        if prefetch is None:
+            return None
+        if prefetch.running and prefetch.running[0] == slide_number:
+            return prefetch.running[1]
+        if slide_number in prefetch.slides:
+            prefetch.slides.remove(slide_number)
+        return None
+
+    async def join(self, user_data: dict, slide_deck_id: str, slide_number: int) -> Optional[dict]:
+        """
+        Get the slide's summary if it was prefetched, waiting for it if it's
+        being prefetched right now
+
+        :param user_data: Dictionary containing user ID and token
+        :param slide_deck_id: ID of the slide deck
+        :param slide_number: Slide number
+        :return: Saved slide summary record, or None if the caller should
+                 summarize the slide itself
+        """
+        user_id = user_data["user_id"]
+        key = (user_id, slide_deck_id, slide_number)
+        if key in self._finished:
+            del self._finished[key]
+            record = await supabase_service.get_slide_summary(
+                slide_deck_id,
+                slide_number,
+                user_token=user_data["token"],
+                refresh_token=user_data["refresh_token"]
+            )
+            if record and record.get('summary_text'):
+                self.joined += 1
+                return record
+
+        task = self.claim(user_id, slide_deck_id, slide_number)
+        if task is None:
+            return None
+        try:
+            record = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            return None
+        except Exception:
+            return None
+        self.joined += 1
+        return record
+
+    async def _run(self, prefetch: Prefetch):
+        try:
+            slide_deck = None
+            while prefetch.slides:
+                slide_number = prefetch.slides.pop(0)
+                user_data = prefetch.user_data
+
+                existing = await supabase_service.get_slide_summary(
+                    prefetch.slide_deck_id,
+                    slide_number,
+                    user_token=user_data["token"],
+                    refresh_token=user_data["refresh_token"]
+                )
+                if existing and existing.get('summary_text'):
+                    continue
+
+                if slide_deck is None:
+                    slide_deck = await supabase_service.get_slide_deck_by_id(
+                        prefetch.slide_deck_id,
+                        user_token=user_data["token"],
+                        refresh_token=user_data["refresh_token"]
+                    )
+                    if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+                        return
+
+                if llm_gateway.stats()["queued"]:
+                    # Foreground requests are waiting for the model
+                    self.yielded += 1
+                    return
+
+                async with self._semaphore:
+                    task = asyncio.create_task(self._prefetch_slide(prefetch, slide_deck, slide_number))
+                    prefetch.running = (slide_number, task)
+                    try:
+                        record = await task
+                    finally:
+                        prefetch.running = None
+                if record is None:
+                    # Past the last slide
+                    return
+                prefetch.completed.append(slide_number)
+                self._finished[(user_data["user_id"], prefetch.slide_deck_id, slide_number)] = None
+                while len(self._finished) > MAX_FINISHED_SLIDES:
+                    self._finished.popitem(last=False)
+                self.completed += 1
+        except Exception as e:
+            print(f"Error prefetching summaries for deck {prefetch.slide_deck_id}: {e}")
+            self.failed += 1
+
+    async def _prefetch_slide(self, prefetch: Prefetch, slide_deck: dict, slide_number: int) -> Optional[dict]:
+        user_data = prefetch.user_data
+        slide_text, previous_slide_text = await text_layer_service.route_slide(
+            user_data, prefetch.slide_deck_id, slide_number
+        )
+
+        slide_image = previous_slide_image = None
+        if not slide_text:
+            if prefetch.pdf_bytes is None:
+                prefetch.pdf_bytes = await pdf_service.download_pdf(slide_deck['pdf_url'])
+            page_images = await pdf_service.render_pages(
+                prefetch.pdf_bytes, pages={slide_number - 1, slide_number}
+            )
+            if slide_number > len(page_images):
+                return None
+            slide_image = page_images[slide_number - 1]
+            previous_slide_image = page_images[slide_number - 2] if slide_number > 1 else None
+
+        previous = await supabase_service.get_slide_summary(
+            prefetch.slide_deck_id,
+            slide_number - 1,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        ) if slide_number > 1 else None
+
+        summary_text = await summary_service.summarize_slide(
+            slide_image=slide_image,
+            previous_summary=previous.get('summary_text') if previous else None,
+            previous_slide_image=previous_slide_image,
+            user_id=user_data["user_id"],
+            slide_text=slide_text,
+            previous_slide_text=previous_slide_text,
+            slide_deck_id=prefetch.slide_deck_id
+        )
+        record = await supabase_service.create_slide_summary_record(
+            slide_deck_id=prefetch.slide_deck_id,
+            slide_number=slide_number,
+            summary_text=summary_text,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if slide_image:
+            slide_context_cache.put(prefetch.slide_deck_id, user_data["user_id"], slide_number, slide_image, summary_text)
+        return record
+
+    async def close(self):
+        tasks = [prefetch.task for prefetch in self._prefetches.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._prefetches),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "joined": self.joined,
+            "yielded": self.yielded,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
+
+
+prefetch_service = PrefetchService()
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from app.config import settings
+from app.services.llm_gateway import llm_gateway
+from app.services.metrics_service import metrics_service
+from app.utils.tokens import estimate_tokens
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class DeckIndex:
+    """
+    Embeddings of one deck's slide summaries as a single row-normalized matrix
+    """
+
+    def __init__(self, slide_numbers: np.ndarray, hashes: np.ndarray, matrix: np.ndarray):
+        self.slide_numbers = slide_numbers
+        self.hashes = hashes
+        self.matrix = matrix
+
+    @classmethod
+    def empty(cls, dimensions: int) -> "DeckIndex":
+        return cls(
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype='<U40'),
+            np.empty((0, dimensions), dtype=np.float32)
+        )
+
+    def stale_rows(self, summaries: Dict[int, str]) -> List[int]:
+        """
+        Slide numbers whose summary is missing from the index or has changed
+        """
+        indexed = dict(zip(self.slide_numbers.tolist(), self.hashes.tolist()))
+        return [
+            slide_number for slide_number, text in summaries.items()
+            if indexed.get(slide_number) != _text_hash(text)
+        ]
+
+    def upsert(self, slide_numbers: List[int], texts: List[str], vectors: np.ndarray):
+        keep = ~np.isin(self.slide_numbers, slide_numbers)
+        self.slide_numbers = np.concatenate([self.slide_numbers[keep], np.asarray(slide_numbers, dtype=np.int32)])
+        self.hashes = np.concatenate([self.hashes[keep], np.asarray([_text_hash(t) for t in texts], dtype='<U40')])
+        self.matrix = np.concatenate([self.matrix[keep], vectors])
+
+    def retain(self, slide_numbers: List[int]):
+        keep = np.isin(self.slide_numbers, slide_numbers)
+        if not keep.all():
+            self.slide_numbers = self.slide_numbers[keep]
+            self.hashes = self.hashes[keep]
+            self.matrix = self.matrix[keep]
+
+    def top_k(self, query: np.ndarray, k: int) -> List[tuple]:
+        """
+        Cosine top-k over the deck; rows and query are unit length, so this is one matrix-vector product
+
+        :return: (slide_number, score) pairs, best first
+        """
+        if not len(self.slide_numbers) or k <= 0:
+            return []
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        best = candidates[np.argsort(-scores[candidates])]
+        return [(int(self.slide_numbers[i]), float(scores[i])) for i in best]
+
+
+@dataclass
+class DeckLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Updates holding or waiting for the lock; it's removed when none are left
+    users: int = 0
+    # Bumped by drop() so updates already under way don't bring the deck back
+    generation: int = 0
+
+
+class RetrievalService:
+    """
+    Deck-wide embedding index over slide summaries, used to pull relevant
+    slides into chat prompts
+
+    Indexes are updated incrementally as summaries are written, kept in memory
+    per deck (LRU) and persisted as compact float16 .npz files.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = settings.RETRIEVAL_INDEX_DIR,
+        max_decks: int = settings.RETRIEVAL_MAX_DECKS,
+        model: str = settings.EMBEDDING_MODEL,
+        dimensions: int = settings.EMBEDDING_DIMENSIONS
+    ):
+        self.index_dir = index_dir
+        self.max_decks = max_decks
+        self.model = model
+        self.dimensions = dimensions
+        self._indexes: "OrderedDict[str, DeckIndex]" = OrderedDict()
+        # Only decks with an update in flight have a lock
+        self._locks: Dict[str, DeckLock] = {}
+        # Keep references so scheduled updates aren't garbage collected
+        self._tasks = set()
+
+    def _path(self, slide_deck_id: str) -> str:
+        return os.path.join(self.index_dir, f"{slide_deck_id}.npz")
+
+    def _load(self, slide_deck_id: str) -> Optional[DeckIndex]:
+        try:
+            with np.load(self._path(slide_deck_id), allow_pickle=False) as data:
+                return DeckIndex(
+                    data['slide_numbers'],
+                    data['hashes'],
+                    data['matrix'].astype(np.float32)
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _save(self, slide_deck_id: str, index: DeckIndex):
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._path(slide_deck_id)
+        with open(f"{path}.tmp", 'wb') as f:
+            np.savez(
+                f,
+                slide_numbers=index.slide_numbers,
+                hashes=index.hashes,
+                matrix=index.matrix.astype(np.float16)
+            )
+        os.replace(f"{path}.tmp", path)
+
+    async def _get_index(self, slide_deck_id: str) -> DeckIndex:
+        index = self._indexes.get(slide_deck_id)
+        if index is None:
+            index = await asyncio.to_thread(self._load, slide_deck_id) or DeckIndex.empty(self.dimensions)
+            self._indexes[slide_deck_id] = index
+            while len(self._indexes) > self.max_decks:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(slide_deck_id)
+        return index
+
+    async def embed(self, texts: List[str], user_id: Optional[str] = None) -> np.ndarray:
+        """
+        Embed texts into unit-length float32 vectors
+
+        :param texts: Texts to embed
+        :param user_id: User the call is made for, used for fair queueing
+        :return: Matrix with one row per text
+        """
+        response = await llm_gateway.embeddings(
+            user_id,
+            model=self.model,
+            input=texts,
+            dimensions=self.dimensions
+        )
+        vectors = np.asarray([item.embedding for item in response.data], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    async def update(
+        self,
+        slide_deck_id: str,
+        summaries: List[dict],
+        complete: bool = False,
+        user_id: Optional[str] = None
+    ):
+        """
+        Embed new or changed summaries into a deck's index
+
+        :param slide_deck_id: ID of the slide deck
+        :param summaries: SlideSummary rows (slide_number, summary_text)
+        :param complete: The rows are the whole deck, so drop anything not in them
+        :param user_id: User the embedding call is made for, used for fair queueing
+        :return: The up to date deck index
+        """
+        texts = {
+            summary['slide_number']: summary['summary_text']
+            for summary in summaries if summary.get('summary_text')
+        }
+
+        deck_lock = self._locks.get(slide_deck_id)
+        if deck_lock is None:
+            deck_lock = self._locks[slide_deck_id] = DeckLock()
+        deck_lock.users += 1
+        generation = deck_lock.generation
+        try:
+            async with deck_lock.lock:
+                index = await self._get_index(slide_deck_id)
+                changed = index.stale_rows(texts)
+                if complete:
+                    index.retain(list(texts))
+                if changed:
+                    vectors = await self.embed([texts[slide_number] for slide_number in changed], user_id)
+                    index.upsert(changed, [texts[slide_number] for slide_number in changed], vectors)
+                if (changed or complete) and deck_lock.generation == generation:
+                    await asyncio.to_thread(self._save, slide_deck_id, index)
+                if deck_lock.generation != generation:
+                    # Dropped meanwhile (e.g. the deck was deleted): forget it again
+                    if self._indexes.get(slide_deck_id) is index:
+                        del self._indexes[slide_deck_id]
+                    self._remove_file(slide_deck_id)
+                return index
+        finally:
+            deck_lock.users -= 1
+            if not deck_lock.users:
+                del self._locks[slide_deck_id]
+
+    def schedule_update(self, slide_deck_id: str, summaries: List[dict]):
+        """
+        Update a deck's index in the background after summaries are written
+
+        :param slide_deck_id: ID of the slide deck
+        :param summaries: Written SlideSummary rows
+        """
+        async def run():
+            try:
+                await self.update(slide_deck_id, summaries)
+            except Exception as e:
+                print(f"Error updating retrieval index for deck {slide_deck_id}: {e}")
+
+        task = asyncio.create_task(run(), context=metrics_service.background_context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout: float):
+        """
+        Let scheduled index updates finish so their embeddings aren't lost
+
+        :param timeout: Seconds to wait before cancelling the rest
+        """
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def drop(self, slide_deck_id: str):
+        """
+        Forget a deck's index, e.g. after the deck is deleted
+
+        :param slide_deck_id: ID of the slide deck
+        """
+        self._indexes.pop(slide_deck_id, None)
+        deck_lock = self._locks.get(slide_deck_id)
+        if deck_lock is not None:
+            deck_lock.generation += 1
+        self._remove_file(slide_deck_id)
+
+    def _remove_file(self, slide_deck_id: str):
+        try:
+            os.remove(self._path(slide_deck_id))
+        except OSError:
+            pass
+
+    async def search(
+        self,
+        slide_deck_id: str,
+        summaries: List[dict],
+        query: str,
+        k: int = settings.RETRIEVAL_TOP_K,
+        token_budget: int = settings.RETRIEVAL_TOKEN_BUDGET,
+        min_score: float = settings.RETRIEVAL_MIN_SCORE,
+        exclude_slide: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Find the slide summaries most relevant to a question
+
+        :param slide_deck_id: ID of the slide deck
+        :param summaries: The deck's SlideSummary rows, as visible to the caller
+        :param query: Question to search for
+        :param k: Maximum number of slides to return
+        :param token_budget: Maximum total tokens of returned summaries
+        :param min_score: Minimum cosine similarity for a slide to count as related
+        :param exclude_slide: Slide already in the prompt (e.g. the current one)
+        :param user_id: User searching, used for fair queueing
+        :return: Matching SlideSummary rows with a "score", best first
+        """
+        if not summaries:
+            return []
+
+        index = await self.update(slide_deck_id, summaries, complete=True, user_id=user_id)
+        query_vector = (await self.embed([query], user_id))[0]
+
+        rows = {summary['slide_number']: summary for summary in summaries}
+        results = []
+        used_tokens = 0
+        for slide_number, score in index.top_k(query_vector, k + 1):
+            if score < min_score:
+                break
+            if slide_number == exclude_slide or slide_number not in rows:
+                continue
+            tokens = estimate_tokens(rows[slide_number]['summary_text'])
+            if used_tokens + tokens > token_budget:
+                break
+            used_tokens += tokens
+            results.append({**rows[slide_number], "score": score})
+            if len(results) == k:
+                break
+        return results
+
+
+retrieval_service = RetrievalService()
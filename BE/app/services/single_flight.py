@@ -0,0 +1,60 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.services.metrics_service import metrics_service
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight wait for and share its result (or exception). The work runs as its
+    own task, so a caller disconnecting doesn't cancel it for the others. Its
+    request phases are added to the caller that started it once it finishes,
+    and never to a request that has already ended.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn once per key at a time
+
+        :param key: Identifies identical work
+        :param fn: Coroutine function doing the work
+        :return: Result of the in-flight or new execution
+        """
+        self.calls += 1
+        phases: Optional[Dict[str, float]] = None
+        task = self._flights.get(key)
+        if task is None:
+            self.executions += 1
+            phases = {}
+            task = asyncio.create_task(fn(), context=metrics_service.background_context(phases))
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.coalesced += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if phases is not None and task.done():
+                metrics_service.add_phases(phases)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+        }
+
+
+summary_flights = SingleFlight()
@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Union
+
+from app.config import settings
+
+
+@dataclass
+class SlideContext:
+    image: Union[str, bytes]
+    summary_text: Optional[str]
+    expires_at: float
+
+
+class SlideContextCache:
+    """
+    In-process cache of the most recently summarized slides of each deck
+
+    Clients summarizing a deck slide by slide can reference the previous
+    slide by number instead of uploading its image and summary again. Only
+    the last SLIDE_CONTEXT_SLIDES_PER_DECK slides of a deck are kept, entries
+    expire after SLIDE_CONTEXT_TTL and the least recently used decks are
+    dropped once the images exceed SLIDE_CONTEXT_MAX_BYTES. Summaries are
+    kept in step with writes to the SlideSummary table.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = settings.SLIDE_CONTEXT_MAX_BYTES,
+        slides_per_deck: int = settings.SLIDE_CONTEXT_SLIDES_PER_DECK,
+        ttl: float = settings.SLIDE_CONTEXT_TTL
+    ):
+        self.max_bytes = max_bytes
+        self.slides_per_deck = slides_per_deck
+        self.ttl = ttl
+        # slide_deck_id -> (owner user ID, {slide_number: SlideContext}), least recently used first
+        self._decks: "OrderedDict[str, tuple]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, slide_deck_id: str):
+        entry = self._decks.pop(slide_deck_id, None)
+        if entry is not None:
+            self.size -= sum(len(context.image) for context in entry[1].values())
+
+    def get(self, slide_deck_id: str, user_id: str, slide_number: int) -> Optional[SlideContext]:
+        """
+        Get a recently summarized slide
+
+        :param slide_deck_id: ID of the slide deck
+        :param user_id: User asking, who must be the one who summarized it
+        :param slide_number: Slide number
+        :return: The slide's image and summary, or None
+        """
+        entry = self._decks.get(slide_deck_id)
+        context = entry[1].get(slide_number) if entry and entry[0] == user_id else None
+        if context is None or context.expires_at <= time.time():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._decks.move_to_end(slide_deck_id)
+        return context
+
+    def put(self, slide_deck_id: str, user_id: str, slide_number: int, image: Union[str, bytes], summary_text: Optional[str]):
+        """
+        Remember a slide's image and summary for the request about the next slide
+
+        :param slide_deck_id: ID of the slide deck
+        :param user_id: User who summarized the slide
+        :param slide_number: Slide number
+        :param image: Raw bytes, data URL or URL of the slide image
+        :param summary_text: The slide's summary
+        """
+        if len(image) > self.max_bytes:
+            return
+        entry = self._decks.get(slide_deck_id)
+        if entry is None or entry[0] != user_id:
+            self._drop(slide_deck_id)
+            entry = (user_id, OrderedDict())
+            self._decks[slide_deck_id] = entry
+        slides = entry[1]
+
+        previous = slides.pop(slide_number, None)
+        if previous is not None:
+            self.size -= len(previous.image)
+        slides[slide_number] = SlideContext(image, summary_text, time.time() + self.ttl)
+        self.size += len(image)
+        while len(slides) > self.slides_per_deck:
+            _, evicted = slides.popitem(last=False)
+            self.size -= len(evicted.image)
+
+        self._decks.move_to_end(slide_deck_id)
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self._decks)))
+
+    def update_summary(self, slide_deck_id: str, slide_number: int, summary_text: Optional[str]):
+        """
+        Keep a cached slide's summary in step with a write to the database
+        """
+        entry = self._decks.get(slide_deck_id)
+        context = entry[1].get(slide_number) if entry else None
+        if context is not None:
+            context.summary_text = summary_text
+
+    def invalidate(self, slide_deck_id: str):
+        self._drop(slide_deck_id)
+
+    def stats(self) -> dict:
+        return {
+            "decks": len(self._decks),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+slide_context_cache = SlideContextCache()
@@ -0,0 +1,216 @@
+import asyncio
+import io
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+from app.services.summary_cache import image_bytes
+
+IDENTICAL = 'identical'
+INCREMENTAL = 'incremental'
+DIFFERENT = 'different'
+
+# Width slides are downsampled to before comparing pixels
+COMPARE_WIDTH = 256
+# Grey level difference below which a pixel counts as unchanged (absorbs JPEG noise)
+PIXEL_THRESHOLD = 24
+# Margin kept around the changed region, as a fraction of the slide size
+CROP_MARGIN = 0.02
+# Share of the slide above which a crop is no diff and the full prompt is used
+MAX_CROP_AREA = 0.5
+# Share of the previous slide's pixels in the changed region that may differ
+# from its background for the change to count as added content
+MAX_BACKGROUND_NOISE = 0.02
+
+
+@dataclass
+class SlideDiff:
+    kind: str
+    # Fraction of the slide's pixels that changed
+    changed_ratio: float
+    hash_distance: int
+    # PNG of the changed region of the current slide, for incremental slides
+    changed_region: Optional[bytes] = None
+
+
+def difference_hash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: whether each pixel is brighter than its right neighbour
+    on a 9x8 greyscale thumbnail
+    """
+    pixels = np.asarray(image.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+class SlideDiffService:
+    """
+    Detects slides that are identical or nearly identical to the previous one
+
+    Lecture decks are full of build slides that each add a bullet to the
+    previous slide. Comparing a slide with its predecessor lets a slide whose
+    decoded pixels are exactly the previous slide's reuse the previous
+    summary. Otherwise a perceptual hash rejects unrelated slides and a
+    downsampled pixel diff finds what changed: a build slide, whose changes
+    fill a region that was blank on the previous slide, or a slide with only
+    a minor edit is summarized from the previous summary and a crop of the
+    changed region instead of two full slide images.
+    Outcomes are counted per deck.
+    """
+
+    def __init__(
+        self,
+        minor_change_ratio: float = settings.SLIDE_DIFF_MINOR_CHANGE_RATIO,
+        max_changed_ratio: float = settings.SLIDE_DIFF_MAX_CHANGED_RATIO,
+        max_hash_distance: int = settings.SLIDE_DIFF_MAX_HASH_DISTANCE,
+        max_decks: int = settings.SLIDE_DIFF_MAX_DECKS
+    ):
+        self.minor_change_ratio = minor_change_ratio
+        self.max_changed_ratio = max_changed_ratio
+        self.max_hash_distance = max_hash_distance
+        self.max_decks = max_decks
+        # slide_deck_id -> outcome counts, least recently used first
+        self._decks: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.totals = {IDENTICAL: 0, INCREMENTAL: 0, DIFFERENT: 0}
+
+    def pipeline_key(self) -> str:
+        """
+        Settings that decide how a slide is compared and cropped, for cache keys
+        """
+        if not settings.SLIDE_DIFF:
+            return 'off'
+        return f"{self.minor_change_ratio}:{self.max_changed_ratio}:{self.max_hash_distance}"
+
+    def _compare(self, slide_image: bytes, previous_slide_image: bytes) -> SlideDiff:
+        current = Image.open(io.BytesIO(slide_image))
+        previous = Image.open(io.BytesIO(previous_slide_image))
+        # Only an exact match reuses the previous summary
+        if slide_image == previous_slide_image or (
+            current.size == previous.size
+            and np.array_equal(np.asarray(current.convert('RGBA')), np.asarray(previous.convert('RGBA')))
+        ):
+            return SlideDiff(IDENTICAL, 0.0, 0)
+
+        current_aspect = current.width / current.height
+        if abs(current_aspect - previous.width / previous.height) > 0.01:
+            return SlideDiff(DIFFERENT, 1.0, 64)
+
+        size = (COMPARE_WIDTH, max(1, round(COMPARE_WIDTH / current_aspect)))
+        current_grey = current.convert('L').resize(size, Image.BILINEAR)
+        previous_grey = previous.convert('L').resize(size, Image.BILINEAR)
+
+        hash_distance = bin(difference_hash(current_grey) ^ difference_hash(previous_grey)).count('1')
+        if hash_distance > self.max_hash_distance:
+            return SlideDiff(DIFFERENT, 1.0, hash_distance)
+
+        changed = np.abs(
+            np.asarray(current_grey, dtype=np.int16) - np.asarray(previous_grey, dtype=np.int16)
+        ) > PIXEL_THRESHOLD
+        changed_ratio = float(changed.mean())
+        if changed_ratio > self.max_changed_ratio:
+            return SlideDiff(DIFFERENT, changed_ratio, hash_distance)
+
+        if changed_ratio > self.minor_change_ratio:
+            # A build slide adds content where the previous slide was blank;
+            # content that was replaced needs the full prompt
+            rows = np.flatnonzero(changed.any(axis=1))
+            columns = np.flatnonzero(changed.any(axis=0))
+            region = np.asarray(previous_grey, dtype=np.int16)[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+            if (np.abs(region - np.median(region)) > PIXEL_THRESHOLD).mean() > MAX_BACKGROUND_NOISE:
+                return SlideDiff(DIFFERENT, changed_ratio, hash_distance)
+        elif current.size == previous.size:
+            # Minor edits can vanish in the downsampled slide; find them at full size
+            size = current.size
+            changed = np.abs(
+                np.asarray(current.convert('L'), dtype=np.int16) - np.asarray(previous.convert('L'), dtype=np.int16)
+            ) > PIXEL_THRESHOLD
+
+        # Not identical, but no pixel changed by more than noise (e.g. the same
+        # slide re-encoded): there's no region to describe as a diff
+        if not changed.any():
+            return SlideDiff(DIFFERENT, changed_ratio, hash_distance)
+
+        # Bounding box of the changed pixels, scaled back to the full-size slide
+        rows = np.flatnonzero(changed.any(axis=1))
+        columns = np.flatnonzero(changed.any(axis=0))
+        scale_x, scale_y = current.width / size[0], current.height / size[1]
+        margin_x, margin_y = current.width * CROP_MARGIN, current.height * CROP_MARGIN
+        box = (
+            max(0, int(columns[0] * scale_x - margin_x)),
+            max(0, int(rows[0] * scale_y - margin_y)),
+            min(current.width, int((columns[-1] + 1) * scale_x + margin_x)),
+            min(current.height, int((rows[-1] + 1) * scale_y + margin_y)),
+        )
+        if (box[2] - box[0]) * (box[3] - box[1]) > MAX_CROP_AREA * current.width * current.height:
+            return SlideDiff(DIFFERENT, changed_ratio, hash_distance)
+        buffer = io.BytesIO()
+        current.convert('RGB').crop(box).save(buffer, format='PNG')
+        return SlideDiff(INCREMENTAL, changed_ratio, hash_distance, buffer.getvalue())
+
+    async def compare(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_slide_image: Union[str, bytes, None],
+        slide_deck_id: Optional[str] = None
+    ) -> Optional[SlideDiff]:
+        """
+        Compare a slide with the previous slide and count the outcome
+
+        :param slide_image: Raw bytes or data URL of the current slide image
+        :param previous_slide_image: Raw bytes or data URL of the previous slide image
+        :param slide_deck_id: Deck to count the outcome for
+        :return: How the slides differ, or None if they couldn't be compared
+                 (missing images, plain URLs or unreadable data)
+        """
+        if not settings.SLIDE_DIFF:
+            return None
+        images = (slide_image, previous_slide_image)
+        if not all(isinstance(image, bytes) or (image and image.startswith('data:image/')) for image in images):
+            return None
+
+        try:
+            diff = await asyncio.to_thread(self._compare, image_bytes(slide_image), image_bytes(previous_slide_image))
+        except Exception as e:
+            print(f"Slide comparison error: {e}")
+            return None
+
+        self.totals[diff.kind] += 1
+        if slide_deck_id:
+            counts = self._decks.setdefault(slide_deck_id, {IDENTICAL: 0, INCREMENTAL: 0, DIFFERENT: 0})
+            counts[diff.kind] += 1
+            self._decks.move_to_end(slide_deck_id)
+            while len(self._decks) > self.max_decks:
+                self._decks.popitem(last=False)
+        return diff
+
+    def deck_stats(self, slide_deck_id: str) -> dict:
+        """
+        Comparison outcomes for a deck's slides summarized by this process
+
+        :param slide_deck_id: ID of the slide deck
+        :return: Counts of identical (summary reused, no model call),
+                 incremental (cheaper diff prompt) and different slides
+        """
+        counts = self._decks.get(slide_deck_id, {})
+        return {
+            "compared_slides": sum(counts.values()),
+            "identical_slides": counts.get(IDENTICAL, 0),
+            "incremental_slides": counts.get(INCREMENTAL, 0),
+            "different_slides": counts.get(DIFFERENT, 0),
+            "calls_skipped": counts.get(IDENTICAL, 0),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "decks": len(self._decks),
+            "identical_slides": self.totals[IDENTICAL],
+            "incremental_slides": self.totals[INCREMENTAL],
+            "different_slides": self.totals[DIFFERENT],
+        }
+
+
+slide_diff_service = SlideDiffService()
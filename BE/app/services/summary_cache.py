@@ -0,0 +1,188 @@
+import asyncio
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+from app.config import settings
+
+
+def image_bytes(image: Union[str, bytes]) -> bytes:
+    """
+    Decode a slide image for hashing
+
+    Data URLs are decoded so the same image hashes the same regardless of the
+    data URL header, base64 line wrapping or whether it was uploaded as raw
+    bytes; plain URLs are hashed as is.
+
+    :param image: Raw image bytes, data URL or URL of a slide image
+    :return: Raw bytes identifying the image
+    """
+    if isinstance(image, bytes):
+        return image
+    if image.startswith('data:') and ',' in image:
+        header, encoded = image.split(',', 1)
+        if header.endswith(';base64'):
+            return base64.b64decode(''.join(encoded.split()))
+        return encoded.encode()
+    return image.encode()
+
+
+class SummaryCache:
+    """
+    Content-addressed cache of generated slide summaries, shared across users
+    and decks and stored in a local SQLite file with size-based LRU eviction
+    """
+
+    def __init__(
+        self,
+        path: str = settings.SUMMARY_CACHE_PATH,
+        max_bytes: int = settings.SUMMARY_CACHE_MAX_BYTES
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._total_bytes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS summary_cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' summary_text TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' last_accessed REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS summary_cache_last_accessed'
+                ' ON summary_cache (last_accessed)'
+            )
+            self._total_bytes = connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM summary_cache'
+            ).fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def make_key(self, *parts: Optional[str], images=()) -> str:
+        """
+        Build a cache key from prompt inputs
+
+        :param parts: Text inputs (previous summary, prompt version, model, ...)
+        :param images: Slide images, hashed by their decoded bytes
+        :return: Hex digest identifying the inputs
+        """
+        digest = hashlib.sha256()
+        for image in images:
+            digest.update(hashlib.sha256(image_bytes(image) if image else b'').digest())
+        for part in parts:
+            digest.update(hashlib.sha256((part or '').encode()).digest())
+        return digest.hexdigest()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT summary_text FROM summary_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                'UPDATE summary_cache SET last_accessed = ? WHERE key = ?', (time.time(), key)
+            )
+            connection.commit()
+            return row[0]
+
+    def _put(self, key: str, summary_text: str):
+        size = len(summary_text.encode())
+        with self._lock:
+            connection = self._connect()
+            previous = connection.execute(
+                'SELECT size FROM summary_cache WHERE key = ?', (key,)
+            ).fetchone()
+            connection.execute(
+                'INSERT OR REPLACE INTO summary_cache (key, summary_text, size, last_accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, summary_text, size, time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+
+            # Evict least recently used entries until we're back under the limit
+            while self._total_bytes > self.max_bytes:
+                oldest = connection.execute(
+                    'SELECT key, size FROM summary_cache ORDER BY last_accessed LIMIT 1'
+                ).fetchone()
+                if oldest is None:
+                    break
+                connection.execute('DELETE FROM summary_cache WHERE key = ?', (oldest[0],))
+                self._total_bytes -= oldest[1]
+            connection.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached summary
+
+        :param key: Cache key from make_key
+        :return: Cached summary text or None
+        """
+        try:
+            summary_text = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            print(f"Summary cache read error: {e}")
+            summary_text = None
+
+        if summary_text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return summary_text
+
+    async def put(self, key: str, summary_text: str):
+        """
+        Store a generated summary
+
+        :param key: Cache key from make_key
+        :param summary_text: Generated summary text
+        """
+        if not summary_text:
+            return
+        try:
+            await asyncio.to_thread(self._put, key, summary_text)
+        except sqlite3.Error as e:
+            print(f"Summary cache write error: {e}")
+
+    async def open(self):
+        """
+        Open the SQLite file, creating it if needed, ahead of the first lookup
+        """
+        def connect():
+            with self._lock:
+                self._connect()
+        await asyncio.to_thread(connect)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+summary_cache = SummaryCache()
@@ -0,0 +1,70 @@
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import jwt
+
+from app.config import settings
+
+
+def token_owner(user_token: Optional[str]) -> str:
+    """
+    Identify whose view of the data a token grants
+
+    Tokens reaching the service were already verified by get_current_user, so
+    the subject is read without checking the signature again.
+
+    :param user_token: JWT token of the authenticated user
+    :return: User ID, or "service" for service-key access
+    """
+    if not user_token:
+        return 'service'
+    try:
+        return jwt.decode(user_token, options={"verify_signature": False}).get('sub') or user_token
+    except jwt.InvalidTokenError:
+        return user_token
+
+
+class SummaryReadCache:
+    """
+    In-process cache of each deck's SlideSummary rows
+
+    Entries are kept per (deck, user) so one user's cached rows are never served
+    to another, and a deck's entries are dropped whenever its summaries change.
+    """
+
+    def __init__(
+        self,
+        max_decks: int = settings.SUMMARY_READ_CACHE_MAX_DECKS,
+        ttl: float = settings.SUMMARY_READ_CACHE_TTL
+    ):
+        self.max_decks = max_decks
+        self.ttl = ttl
+        # slide_deck_id -> {owner: (rows, expires_at)}, least recently used first
+        self._decks: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, slide_deck_id: str, user_token: Optional[str]) -> Optional[List[dict]]:
+        entries = self._decks.get(slide_deck_id)
+        entry = entries.get(token_owner(user_token)) if entries else None
+        if entry is None or entry[1] <= time.time():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._decks.move_to_end(slide_deck_id)
+        return entry[0]
+
+    def set(self, slide_deck_id: str, user_token: Optional[str], rows: List[dict]):
+        entries = self._decks.setdefault(slide_deck_id, {})
+        entries[token_owner(user_token)] = (rows, time.time() + self.ttl)
+        self._decks.move_to_end(slide_deck_id)
+        while len(self._decks) > self.max_decks:
+            self._decks.popitem(last=False)
+
+    def invalidate(self, slide_deck_id: str):
+        self._decks.pop(slide_deck_id, None)
+
+
+summary_read_cache = SummaryReadCache()
@@ -0,0 +1,443 @@
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from app.services.summary_cache import summary_cache
+from app.services.image_service import image_service
+from app.services.llm_gateway import llm_gateway
+from app.services.slide_diff_service import slide_diff_service, IDENTICAL, INCREMENTAL
+
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_TOKENS = 1000
+
+# Bump whenever the slide summary prompt changes so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+
+
+class SummaryService:
+    def build_summary_messages(
+        self,
+        slide_image: str,
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Optional[str] = None,
+        detail: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Build the vision prompt for summarizing a single slide
+
+        :param slide_image: Data URL or URL of the current slide image
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_image: Data URL or URL of the previous slide image
+        :param detail: Vision detail level ("low" or "high"), or None for the API default
+        :return: Chat completion messages
+        """
+        image_options = {"detail": detail} if detail else {}
+
+        system_content = "You are an expert academic slide summarizer. Analyze the slide image and generate a concise, informative summary."
+        if previous_summary or previous_slide_image:
+            system_content = "You are an expert academic slide summarizer. Analyze both the previous and current slides to generate a contextual, informative summary of the current slide. Focus exclusively on the content of the current slide."
+
+        user_text = "Please generate a precise, academic summary of this slide."
+        if previous_summary:
+            user_text = f"Previous Slide Summary: {previous_summary}\n\nPlease generate a precise, academic summary of the current slide. Do not include content from the previous slide in your summary."
+        elif previous_slide_image:
+            user_text = "The first image is the previous slide, the second is the current slide.\n\nPlease generate a precise, academic summary of the current slide. Do not include content from the previous slide in your summary."
+
+        user_content = [
+            {
+                "type": "text",
+                "text": user_text
+            }
+        ]
+
+        # Add previous slide image if available
+        if previous_slide_image:
+            user_content.append({
+                "type": "image_url",
+                "image_url": {"url": previous_slide_image, **image_options}
+            })
+
+        # Add current slide image
+        user_content.append({
+            "type": "image_url",
+            "image_url": {"url": slide_image, **image_options}
+        })
+
+        return [
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {
+                "role": "user",
+                "content": user_content
+            }
+        ]
+
+    def build_text_summary_messages(
+        self,
+        slide_text: str,
+        previous_summary: Optional[str] = None,
+        previous_slide_text: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Build the text-only prompt for summarizing a slide from its PDF text layer
+
+        :param slide_text: Text extracted from the current slide
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_text: Text extracted from the previous slide
+        :return: Chat completion messages
+        """
+        system_content = "You are an expert academic slide summarizer. Analyze the text extracted from the slide and generate a concise, informative summary."
+
+        user_text = f"Current Slide Text:\n{slide_text}\n\nPlease generate a precise, academic summary of this slide."
+        if previous_summary or previous_slide_text:
+            system_content = "You are an expert academic slide summarizer. Analyze the text extracted from both the previous and current slides to generate a contextual, informative summary of the current slide. Focus exclusively on the content of the current slide."
+            previous = f"Previous Slide Summary: {previous_summary}" if previous_summary else f"Previous Slide Text:\n{previous_slide_text}"
+            user_text = f"{previous}\n\nCurrent Slide Text:\n{slide_text}\n\nPlease generate a precise, academic summary of the current slide. Do not include content from the previous slide in your summary."
+
+        return [
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {
+                "role": "user",
+                "content": user_text
+            }
+        ]
+
+    def build_diff_summary_messages(
+        self,
+        changed_region: str,
+        previous_summary: str,
+        detail: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Build the prompt for a build slide that only adds to the previous slide
+
+        :param changed_region: Data URL of the region of the current slide that changed
+        :param previous_summary: Summary of the previous slide
+        :param detail: Vision detail level ("low" or "high"), or None for the API default
+        :return: Chat completion messages
+        """
+        image_options = {"detail": detail} if detail else {}
+
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert academic slide summarizer. The current slide repeats the previous slide with some content added or changed. Analyze the changed region of the current slide to generate a contextual, informative summary of the current slide. Focus exclusively on the new content."
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Previous Slide Summary: {previous_summary}\n\nThe image shows the region of the current slide that changed from the previous slide.\n\nPlease generate a precise, academic summary of the current slide. Do not include content from the previous slide in your summary."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": changed_region, **image_options}
+                    }
+                ]
+            }
+        ]
+
+    def build_regeneration_messages(
+        self,
+        slide_number: int,
+        existing_summary: Optional[str] = None,
+        chat_history_text: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Build the prompt for regenerating a summary with chat context
+
+        :param slide_number: Slide number being regenerated
+        :param existing_summary: Current summary of the slide
+        :param chat_history_text: Chat history to take into account
+        :return: Chat completion messages
+        """
+
+        regeneration_prompt = f"""
+            Current Slide: {slide_number}
+            Original Summary: {existing_summary or "No summary available"}
+
+            Chat History Context: {chat_history_text or ""}
+
+            Please regenerate the slide summary, taking into account the conversation history.
+            Incorporate any new insights or clarifications from the chat while maintaining the
+            core content of the original summary. Be concise, academic, and precise.
+
+            If the chat history provides additional context or reveals misunderstandings,
+            adjust the summary accordingly to provide a more accurate and comprehensive explanation.
+        """
+
+        return [
+            {
+                "role": "system",
+                "content": "You are an academic assistant who can regenerate slide summaries based on conversation context. Maintain academic rigor while adapting to new insights."
+            },
+            {
+                "role": "user",
+                "content": regeneration_prompt
+            }
+        ]
+
+    async def complete(
+        self,
+        messages: List[dict],
+        max_tokens: int = SUMMARY_MAX_TOKENS,
+        user_id: Optional[str] = None
+    ) -> str:
+        """
+        Run a summary prompt and return the generated text
+
+        :param messages: Chat completion messages
+        :param max_tokens: Maximum completion tokens
+        :param user_id: User the call is made for, used for fair queueing
+        :return: Generated summary text
+        """
+        response = await llm_gateway.chat_completion(
+            user_id,
+            model=SUMMARY_MODEL,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+
+    async def stream(self, messages: List[dict], user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Run a summary prompt and yield the generated text as it arrives
+
+        :param messages: Chat completion messages
+        :param user_id: User the call is made for, used for fair queueing
+        :return: Async iterator of text chunks
+        """
+        stream = llm_gateway.stream_chat_completion(
+            user_id,
+            model=SUMMARY_MODEL,
+            messages=messages,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def prepare_summary_messages(
+        self,
+        slide_image: Union[str, bytes],
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Union[str, bytes, None] = None
+    ) -> List[dict]:
+        """
+        Normalize the slide images and build the vision prompt
+
+        :param slide_image: Raw bytes, data URL or URL of the current slide image
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_image: Raw bytes, data URL or URL of the previous slide image
+        :return: Chat completion messages
+        """
+        current = await image_service.normalize(slide_image)
+        previous = await image_service.normalize(previous_slide_image)
+
+        # Savings are counted in image_service and exported on /metrics
+        return self.build_summary_messages(
+            current.url,
+            previous_summary,
+            previous.url if previous else None,
+            detail=current.detail
+        )
+
+    def summary_cache_key(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Union[str, bytes, None] = None,
+        slide_text: Optional[str] = None,
+        previous_slide_text: Optional[str] = None
+    ) -> str:
+        """
+        Build the content-addressed cache key for a slide summary prompt
+
+        :param slide_image: Raw bytes, data URL or URL of the current slide image
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_image: Raw bytes, data URL or URL of the previous slide image
+        :param slide_text: Text layer of the slide, when summarizing from text
+        :param previous_slide_text: Text layer of the previous slide
+        :return: Cache key
+        """
+        if slide_text:
+            return summary_cache.make_key(
+                'text',
+                slide_text,
+                previous_summary,
+                previous_slide_text,
+                SUMMARY_PROMPT_VERSION,
+                SUMMARY_MODEL
+            )
+        # The images sent depend on normalization and the diff route, not just the input
+        return summary_cache.make_key(
+            previous_summary,
+            SUMMARY_PROMPT_VERSION,
+            SUMMARY_MODEL,
+            image_service.pipeline_key(),
+            slide_diff_service.pipeline_key(),
+            images=(slide_image, previous_slide_image)
+        )
+
+    async def _prepare(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_summary: Optional[str],
+        previous_slide_image: Union[str, bytes, None],
+        slide_text: Optional[str],
+        previous_slide_text: Optional[str],
+        slide_deck_id: Optional[str]
+    ) -> Tuple[Optional[List[dict]], str]:
+        """
+        Pick the prompt for a slide
+
+        :return: (messages, route) where route is "text", "vision", "diff" or
+                 "reused"; messages is None when the previous summary is reused
+        """
+        if slide_text:
+            return self.build_text_summary_messages(slide_text, previous_summary, previous_slide_text), 'text'
+
+        if previous_summary and previous_slide_image:
+            diff = await slide_diff_service.compare(slide_image, previous_slide_image, slide_deck_id)
+            if diff and diff.kind == IDENTICAL:
+                return None, 'reused'
+            if diff and diff.kind == INCREMENTAL:
+                region = await image_service.normalize(diff.changed_region)
+                return self.build_diff_summary_messages(region.url, previous_summary, detail=region.detail), 'diff'
+
+        return await self.prepare_summary_messages(slide_image, previous_summary, previous_slide_image), 'vision'
+
+    async def summarize_slide_with_route(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Union[str, bytes, None] = None,
+        user_id: Optional[str] = None,
+        slide_text: Optional[str] = None,
+        previous_slide_text: Optional[str] = None,
+        slide_deck_id: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """
+        Like summarize_slide, but also tells how the summary was produced
+
+        :return: (summary text, route) where route is "cached", "text",
+                 "vision", "diff" or "reused"
+        """
+        cache_key = self.summary_cache_key(
+            slide_image, previous_summary, previous_slide_image, slide_text, previous_slide_text
+        )
+        cached_summary = await summary_cache.get(cache_key)
+        if cached_summary is not None:
+            return cached_summary, 'cached'
+
+        messages, route = await self._prepare(
+            slide_image, previous_summary, previous_slide_image, slide_text, previous_slide_text, slide_deck_id
+        )
+        if messages is None:
+            return previous_summary, route
+        summary_text = await self.complete(messages, user_id=user_id)
+        await summary_cache.put(cache_key, summary_text)
+        return summary_text, route
+
+    async def summarize_slide(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Union[str, bytes, None] = None,
+        user_id: Optional[str] = None,
+        slide_text: Optional[str] = None,
+        previous_slide_text: Optional[str] = None,
+        slide_deck_id: Optional[str] = None
+    ) -> str:
+        """
+        Generate a summary for a slide, reusing a cached one when the same
+        slide has been summarized with the same context before
+
+        Given the slide's text layer, a text-only prompt is used and the
+        images are ignored. Given the previous slide's image and summary, a
+        slide identical to the previous one reuses its summary, and a build
+        slide is summarized from the region that changed.
+
+        :param slide_image: Raw bytes, data URL or URL of the current slide image
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_image: Raw bytes, data URL or URL of the previous slide image
+        :param user_id: User the call is made for, used for fair queueing
+        :param slide_text: Text layer of the slide, to summarize from text instead
+        :param previous_slide_text: Text layer of the previous slide
+        :param slide_deck_id: Deck the slide belongs to, for near-duplicate counts
+        :return: Generated summary text
+        """
+        summary_text, _ = await self.summarize_slide_with_route(
+            slide_image, previous_summary, previous_slide_image, user_id,
+            slide_text, previous_slide_text, slide_deck_id
+        )
+        return summary_text
+
+    async def stream_slide_summary(
+        self,
+        slide_image: Union[str, bytes, None],
+        previous_summary: Optional[str] = None,
+        previous_slide_image: Union[str, bytes, None] = None,
+        user_id: Optional[str] = None,
+        slide_text: Optional[str] = None,
+        previous_slide_text: Optional[str] = None,
+        slide_deck_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a summary for a slide; cached and reused summaries are yielded in one chunk
+
+        :param slide_image: Raw bytes, data URL or URL of the current slide image
+        :param previous_summary: Summary of the previous slide, if known
+        :param previous_slide_image: Raw bytes, data URL or URL of the previous slide image
+        :param user_id: User the call is made for, used for fair queueing
+        :param slide_text: Text layer of the slide, to summarize from text instead
+        :param previous_slide_text: Text layer of the previous slide
+        :param slide_deck_id: Deck the slide belongs to, for near-duplicate counts
+        :return: Async iterator of text chunks
+        """
+        cache_key = self.summary_cache_key(
+            slide_image, previous_summary, previous_slide_image, slide_text, previous_slide_text
+        )
+        cached_summary = await summary_cache.get(cache_key)
+        if cached_summary is not None:
+            yield cached_summary
+            return
+
+        messages, _ = await self._prepare(
+            slide_image, previous_summary, previous_slide_image, slide_text, previous_slide_text, slide_deck_id
+        )
+        if messages is None:
+            yield previous_summary
+            return
+
+        chunks = []
+        async for content in self.stream(messages, user_id=user_id):
+            chunks.append(content)
+            yield content
+        await summary_cache.put(cache_key, ''.join(chunks))
+
+    async def regenerate_summary(
+        self,
+        slide_number: int,
+        existing_summary: Optional[str] = None,
+        chat_history_text: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """
+        Regenerate a slide summary taking chat context into account
+
+        :param slide_number: Slide number being regenerated
+        :param existing_summary: Current summary of the slide
+        :param chat_history_text: Chat history to take into account
+        :param user_id: User the call is made for, used for fair queueing
+        :return: Regenerated summary text
+        """
+        messages = self.build_regeneration_messages(slide_number, existing_summary, chat_history_text)
+        return await self.complete(messages, user_id=user_id)
+
+
+summary_service = SummaryService()
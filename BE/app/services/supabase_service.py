@@ -1,40 +1,52 @@
-from supabase import create_client, Client
+from postgrest.types import CountMethod
+from storage3 import AsyncStorageClient
 from app.config import settings
+from app.services.client_pool import SupabaseClientPool
+from app.services.summary_read_cache import summary_read_cache
+from app.services.slide_context_cache import slide_context_cache
+from app.services.retrieval_service import retrieval_service
+from app.services.metrics_service import metrics_service
+from app.utils.http_cache import list_version
+import asyncio
 import uuid
 from datetime import datetime
+from typing import List, Optional, Tuple
 
 class SupabaseService:
     def __init__(self):
-        self.supabase: Client = create_client(
-            settings.SUPABASE_URL, 
-            settings.SUPABASE_SERVICE_KEY
+        self.storage = AsyncStorageClient(
+            f"{settings.SUPABASE_URL}/storage/v1",
+            {
+                "apiKey": settings.SUPABASE_SERVICE_KEY,
+                "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+            }
         )
+        self.client_pool = SupabaseClientPool()
+        self.service_client = self.client_pool.build_service_client()
         # print("Service key prefix:", settings.SUPABASE_SERVICE_KEY)
         
     def _get_client_with_auth(self, user_token=None, refresh_token=None):
         """
-        Get a Supabase client with user authentication if token is provided
+        Get a PostgREST client with user authentication if token is provided
+        
+        Clients are pooled per token and share one HTTP connection pool, so
+        repeat requests from the same session skip client and session setup.
         
         :param user_token: JWT token of the authenticated user
-        :return: Supabase client
+        :return: PostgREST client
         """
         if not user_token:
             # Return the service client for admin operations
-            return self.supabase
+            return self.service_client
             
         try:
-            # Create a client with the service key
-            client = create_client(
-                settings.SUPABASE_URL,  
-                settings.SUPABASE_ANON_KEY
-            )
-            client.auth.set_session(access_token=user_token, refresh_token=refresh_token or '')
-            return client
+            return self.client_pool.get(user_token)
         except Exception as e:
             print(f"Error authenticating with user token: {e}")
-            return self.supabase
+            return self.service_client
 
-    def create_slide_deck_record(self, user_id: str, title: str, pdf_url: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def create_slide_deck_record(self, user_id: str, title: str, pdf_url: str, user_token=None, refresh_token=None):
         """
         Create a new SlideDeck record in the database
         
@@ -54,14 +66,15 @@ class SupabaseService:
             print(slide_deck_data)
             
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = client.table('SlideDeck').insert(slide_deck_data).execute()
+            response = await client.table('SlideDeck').insert(slide_deck_data).execute()
             
             return response.data[0] if response.data else None
         except Exception as e:
             print(f"Database insert error: {e}")
             raise
 
-    def create_slide_summary_record(
+    @metrics_service.timed('db')
+    async def create_slide_summary_record(
         self, 
         slide_deck_id: str, 
         slide_number: int, 
@@ -88,64 +101,266 @@ class SupabaseService:
             
             # Upsert to handle both insert and update scenarios
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
+            response = await (
                 client.table('SlideSummary')
                 .upsert(slide_summary_data, on_conflict='slide_deck_id,slide_number')
                 .execute()
             )
+            summary_read_cache.invalidate(slide_deck_id)
+            slide_context_cache.update_summary(slide_deck_id, slide_number, summary_text)
+            if response.data:
+                retrieval_service.schedule_update(slide_deck_id, response.data)
             
             return response.data[0] if response.data else None
         except Exception as e:
             print(f"Slide summary creation error: {e}")
             raise
             
-    def get_slide_summaries_by_deck_id(self, slide_deck_id: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def create_slide_summary_records(
+        self,
+        slide_deck_id: str,
+        summaries: List[Tuple[int, str]],
+        user_token=None,
+        refresh_token=None
+    ):
         """
-        Get all slide summaries for a slide deck ordered by slide number
+        Create or update many slide summary records for a deck
+        
+        Rows are written in one upsert per chunk of SUMMARY_BULK_CHUNK_SIZE.
+        A slide number given more than once is written once, with its last
+        summary, since an upsert can't touch the same row twice.
         
         :param slide_deck_id: ID of the slide deck
+        :param summaries: (slide_number, summary_text) pairs
         :param user_token: JWT token of the authenticated user
+        :return: Created or updated slide summary records
+        """
+        try:
+            summaries = list(dict(summaries).items())
+            updated_at = datetime.utcnow().isoformat()
+            slide_summary_data = [
+                {
+                    'slide_deck_id': slide_deck_id,
+                    'slide_number': slide_number,
+                    'summary_text': summary_text,
+                    'updated_at': updated_at
+                }
+                for slide_number, summary_text in summaries
+            ]
+            
+            client = self._get_client_with_auth(user_token, refresh_token)
+            records = []
+            chunk_size = settings.SUMMARY_BULK_CHUNK_SIZE
+            for start in range(0, len(slide_summary_data), chunk_size):
+                response = await (
+                    client.table('SlideSummary')
+                    .upsert(slide_summary_data[start:start + chunk_size], on_conflict='slide_deck_id,slide_number')
+                    .execute()
+                )
+                records.extend(response.data)
+            summary_read_cache.invalidate(slide_deck_id)
+            for slide_number, summary_text in summaries:
+                slide_context_cache.update_summary(slide_deck_id, slide_number, summary_text)
+            if records:
+                retrieval_service.schedule_update(slide_deck_id, records)
+            
+            return records
+        except Exception as e:
+            print(f"Bulk slide summary creation error: {e}")
+            raise
+            
+    @metrics_service.timed('db')
+    async def get_slide_summaries_by_deck_id(
+        self,
+        slide_deck_id: str,
+        user_token=None,
+        refresh_token=None,
+        columns: Optional[List[str]] = None,
+        after_slide: Optional[int] = None,
+        limit: Optional[int] = None
+    ):
+        """
+        Get slide summaries for a slide deck ordered by slide number
+        
+        Results are served from the per-deck read cache until the deck's
+        summaries change; only full, unprojected reads populate it.
+        
+        :param slide_deck_id: ID of the slide deck
+        :param user_token: JWT token of the authenticated user
+        :param columns: Columns to select, or None for all
+        :param after_slide: Only return slides after this slide number
+        :param limit: Maximum number of summaries, or None for all
         :return: List of slide summaries
         """
+        cached_summaries = summary_read_cache.get(slide_deck_id, user_token)
+        if cached_summaries is not None:
+            summaries = [
+                summary for summary in cached_summaries
+                if after_slide is None or summary['slide_number'] > after_slide
+            ][:limit]
+            if columns:
+                summaries = [{column: summary.get(column) for column in columns} for summary in summaries]
+            return summaries
+        
         try:
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
+            query = (
                 client.table('SlideSummary')
-                .select('*')
+                .select(','.join(columns) if columns else '*')
                 .eq('slide_deck_id', slide_deck_id)
-                .order('slide_number')
-                .execute()
             )
+            if after_slide is not None:
+                query = query.gt('slide_number', after_slide)
+            query = query.order('slide_number')
+            if limit:
+                query = query.limit(limit)
+            response = await query.execute()
             
+            if not columns and after_slide is None and not limit:
+                summary_read_cache.set(slide_deck_id, user_token, response.data)
             return response.data
         except Exception as e:
             print(f"Error fetching slide summaries: {e}")
             raise
+
+    @metrics_service.timed('db')
+    async def get_slide_summaries_version(self, slide_deck_id: str, user_token=None, refresh_token=None) -> dict:
+        """
+        Get the version of a deck's summary list without fetching it
+        
+        :param slide_deck_id: ID of the slide deck
+        :param user_token: JWT token of the authenticated user
+        :return: Summary count and newest updated_at (see list_version)
+        """
+        cached_summaries = summary_read_cache.get(slide_deck_id, user_token)
+        if cached_summaries is not None:
+            return list_version(cached_summaries, 'updated_at')
+        
+        try:
+            client = self._get_client_with_auth(user_token, refresh_token)
+            response = await (
+                client.table('SlideSummary')
+                .select('updated_at', count=CountMethod.exact)
+                .eq('slide_deck_id', slide_deck_id)
+                .order('updated_at', desc=True, nullsfirst=False)
+                .limit(1)
+                .execute()
+            )
+            
+            return {
+                "count": response.count or 0,
+                "newest": response.data[0]['updated_at'] if response.data else None
+            }
+        except Exception as e:
+            print(f"Error fetching slide summaries version: {e}")
+            raise
+
+    @metrics_service.timed('db')
+    async def get_slide_summary(self, slide_deck_id: str, slide_number: int, user_token=None, refresh_token=None):
+        """
+        Get a single slide summary by deck and slide number
+        
+        :param slide_deck_id: ID of the slide deck
+        :param slide_number: Slide number of the summary
+        :param user_token: JWT token of the authenticated user
+        :return: Slide summary record or None
+        """
+        cached_summaries = summary_read_cache.get(slide_deck_id, user_token)
+        if cached_summaries is not None:
+            return next(
+                (summary for summary in cached_summaries if summary['slide_number'] == slide_number),
+                None
+            )
+        
+        try:
+            client = self._get_client_with_auth(user_token, refresh_token)
+            response = await (
+                client.table('SlideSummary')
+                .select('*')
+                .eq('slide_deck_id', slide_deck_id)
+                .eq('slide_number', slide_number)
+                .limit(1)
+                .execute()
+            )
+            
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error fetching slide summary: {e}")
+            raise
             
-    def get_slide_decks_by_user_id(self, user_id: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def get_slide_decks_by_user_id(
+        self,
+        user_id: str,
+        user_token=None,
+        refresh_token=None,
+        columns: Optional[List[str]] = None,
+        before: Optional[dict] = None,
+        limit: Optional[int] = None
+    ):
         """
-        Get all slide decks for a user ordered by creation date (newest first)
+        Get slide decks for a user ordered by creation date (newest first)
         
         :param user_id: ID of the user
         :param user_token: JWT token of the authenticated user
+        :param columns: Columns to select, or None for all
+        :param before: Keyset cursor ({"created_at", "id"} of the last deck seen)
+        :param limit: Maximum number of decks, or None for all
         :return: List of slide decks
         """
         try:
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
+            query = (
                 client.table('SlideDeck')
-                .select('*')
+                .select(','.join(columns) if columns else '*')
                 .eq('user_id', user_id)
-                .order('created_at', desc=True)
-                .execute()
             )
+            if before:
+                created_at, deck_id = before['created_at'], before['id']
+                query = query.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{deck_id}")'
+                )
+            query = query.order('created_at', desc=True).order('id', desc=True)
+            if limit:
+                query = query.limit(limit)
+            response = await query.execute()
             
             return response.data
         except Exception as e:
             print(f"Error fetching slide decks: {e}")
             raise
 
-    def get_slide_deck_by_id(self, slide_deck_id: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def get_slide_decks_version(self, user_id: str, user_token=None, refresh_token=None) -> dict:
+        """
+        Get the version of a user's deck list without fetching it
+        
+        :param user_id: ID of the user
+        :param user_token: JWT token of the authenticated user
+        :return: Deck count and newest created_at (see list_version)
+        """
+        try:
+            client = self._get_client_with_auth(user_token, refresh_token)
+            response = await (
+                client.table('SlideDeck')
+                .select('created_at', count=CountMethod.exact)
+                .eq('user_id', user_id)
+                .order('created_at', desc=True)
+                .limit(1)
+                .execute()
+            )
+            
+            return {
+                "count": response.count or 0,
+                "newest": response.data[0]['created_at'] if response.data else None
+            }
+        except Exception as e:
+            print(f"Error fetching slide decks version: {e}")
+            raise
+
+    @metrics_service.timed('db')
+    async def get_slide_deck_by_id(self, slide_deck_id: str, user_token=None, refresh_token=None):
         """
         Get a slide deck by its ID
         
@@ -155,7 +370,7 @@ class SupabaseService:
         """
         try:
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
+            response = await (
                 client.table('SlideDeck')
                 .select('*')
                 .eq('id', slide_deck_id)
@@ -167,7 +382,8 @@ class SupabaseService:
             print(f"Error fetching slide deck: {e}")
             raise
 
-    def delete_slide_summaries_by_deck_id(self, slide_deck_id: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def delete_slide_summaries_by_deck_id(self, slide_deck_id: str, user_token=None, refresh_token=None):
         """
         Delete all slide summaries for a given slide deck
         
@@ -176,37 +392,82 @@ class SupabaseService:
         """
         try:
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
+            response = await (
                 client.table('SlideSummary')
                 .delete()
                 .eq('slide_deck_id', slide_deck_id)
                 .execute()
             )
+            summary_read_cache.invalidate(slide_deck_id)
+            slide_context_cache.invalidate(slide_deck_id)
+            retrieval_service.drop(slide_deck_id)
             
             return response
         except Exception as e:
             print(f"Error deleting slide summaries: {e}")
             raise
 
-    def delete_slide_deck(self, slide_deck_id: str, user_token=None, refresh_token=None):
+    @metrics_service.timed('db')
+    async def delete_slide_deck(self, slide_deck_id: str, user_id: str = None, user_token=None, refresh_token=None):
         """
         Delete a slide deck record
         
+        Its slide summaries are removed by the ON DELETE CASCADE on
+        SlideSummary.slide_deck_id, so this is a single round trip (see
+        supabase/migrations/20261016000000_slide_summary_delete_cascade.sql).
+        
         :param slide_deck_id: ID of the slide deck to delete
+        :param user_id: Only delete the deck if it belongs to this user
         :param user_token: JWT token of the authenticated user
+        :return: Deleted slide deck record, or None if nothing matched
         """
         try:
             client = self._get_client_with_auth(user_token, refresh_token)
-            response = (
-                client.table('SlideDeck')
-                .delete()
-                .eq('id', slide_deck_id)
-                .execute()
-            )
+            query = client.table('SlideDeck').delete().eq('id', slide_deck_id)
+            if user_id:
+                query = query.eq('user_id', user_id)
+            response = await query.execute()
+            summary_read_cache.invalidate(slide_deck_id)
+            slide_context_cache.invalidate(slide_deck_id)
+            if response.data:
+                retrieval_service.drop(slide_deck_id)
             
-            return response
+            return response.data[0] if response.data else None
         except Exception as e:
             print(f"Error deleting slide deck: {e}")
             raise
 
+    @metrics_service.timed('storage')
+    async def remove_pdf_from_storage(self, pdf_path: str):
+        """
+        Remove an uploaded PDF from the slide deck storage bucket
+        
+        Each attempt is bounded by STORAGE_DELETE_TIMEOUT and failed attempts
+        are retried with exponential backoff.
+        
+        :param pdf_path: Path of the PDF inside the bucket
+        """
+        attempts = settings.STORAGE_DELETE_ATTEMPTS
+        for attempt in range(1, attempts + 1):
+            try:
+                return await asyncio.wait_for(
+                    self.storage.from_(settings.SUPABASE_BUCKET_NAME).remove([pdf_path]),
+                    timeout=settings.STORAGE_DELETE_TIMEOUT
+                )
+            except Exception as e:
+                print(f"Error deleting PDF from storage (attempt {attempt}/{attempts}): {e!r}")
+                if attempt == attempts:
+                    raise
+                await asyncio.sleep(2 ** (attempt - 1))
+
+    async def warm_up(self):
+        """
+        Open a connection to PostgREST ahead of the first request
+        """
+        await self.service_client.session.head('/')
+
+    async def close(self):
+        await self.client_pool.close()
+        await self.storage.aclose()
+
 supabase_service = SupabaseService()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import asyncio
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.config import settings
+from app.services.pdf_service import PageText, pdf_service
+from app.services.single_flight import SingleFlight
+from app.services.supabase_service import supabase_service
+
+
+class TextLayerService:
+    """
+    Routes slides to text-only or vision summary prompts using the deck PDF's
+    text layer
+
+    A page with enough selectable text and few images, charts or equations is
+    summarized from its text, which is far cheaper and faster than sending the
+    rendered slide to the vision model. Extracted text layers are cached per
+    deck, and the number of slides routed each way is counted.
+    """
+
+    def __init__(
+        self,
+        max_decks: int = settings.TEXT_LAYER_CACHE_MAX_DECKS,
+        min_chars: int = settings.TEXT_LAYER_MIN_CHARS,
+        max_visual_coverage: float = settings.TEXT_LAYER_MAX_VISUAL_COVERAGE,
+        max_symbol_ratio: float = settings.TEXT_LAYER_MAX_SYMBOL_RATIO,
+        wait_timeout: float = settings.TEXT_LAYER_WAIT_TIMEOUT
+    ):
+        self.max_decks = max_decks
+        self.min_chars = min_chars
+        self.max_visual_coverage = max_visual_coverage
+        self.max_symbol_ratio = max_symbol_ratio
+        self.wait_timeout = wait_timeout
+        # slide_deck_id -> (owner user ID, pages), least recently used first
+        self._decks: "OrderedDict[str, tuple]" = OrderedDict()
+        self._extractions = SingleFlight()
+        self.text_slides = 0
+        self.vision_slides = 0
+        # Slides sent to vision because the text layer wasn't ready in time
+        self.unavailable_slides = 0
+
+    def is_text_heavy(self, page: PageText) -> bool:
+        return (
+            len(page.text) >= self.min_chars
+            and page.visual_coverage <= self.max_visual_coverage
+            and page.symbol_ratio <= self.max_symbol_ratio
+        )
+
+    def route(self, pages: List[PageText], slide_number: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Decide how to summarize a slide and count the decision
+
+        :param pages: Text layer of the deck
+        :param slide_number: Slide number (1-based page number)
+        :return: The slide's and previous slide's text if the slide should be
+                 summarized from text, else (None, None)
+        """
+        page = pages[slide_number - 1] if 0 < slide_number <= len(pages) else None
+        if page is None or not self.is_text_heavy(page):
+            self.vision_slides += 1
+            return None, None
+
+        self.text_slides += 1
+        previous_text = pages[slide_number - 2].text if slide_number > 1 else None
+        return page.text, previous_text or None
+
+    def _store(self, slide_deck_id: str, user_id: str, pages: List[PageText]):
+        self._decks[slide_deck_id] = (user_id, pages)
+        self._decks.move_to_end(slide_deck_id)
+        while len(self._decks) > self.max_decks:
+            self._decks.popitem(last=False)
+
+    async def extract(self, slide_deck: dict, pdf_bytes: bytes) -> List[PageText]:
+        """
+        Extract and cache the text layer of a deck whose PDF is already downloaded
+
+        :param slide_deck: Slide deck record
+        :param pdf_bytes: Raw PDF bytes
+        :return: One PageText per page
+        """
+        pages = await pdf_service.extract_text(pdf_bytes)
+        self._store(slide_deck['id'], slide_deck['user_id'], pages)
+        return pages
+
+    async def get_pages(self, slide_deck: dict, pdf_bytes: bytes) -> List[PageText]:
+        """
+        Cached text layer of a deck, extracting it from pdf_bytes on a miss
+
+        :param slide_deck: Slide deck record
+        :param pdf_bytes: Raw PDF bytes
+        :return: One PageText per page
+        """
+        entry = self._decks.get(slide_deck['id'])
+        if entry is not None and entry[0] == slide_deck['user_id']:
+            self._decks.move_to_end(slide_deck['id'])
+            return entry[1]
+        return await self.extract(slide_deck, pdf_bytes)
+
+    async def _load(self, slide_deck_id: str, user_data: dict) -> Optional[List[PageText]]:
+        slide_deck = await supabase_service.get_slide_deck_by_id(
+            slide_deck_id,
+            user_token=user_data["token"],
+            refresh_token=user_data["refresh_token"]
+        )
+        if not slide_deck or slide_deck['user_id'] != user_data["user_id"]:
+            return None
+        try:
+            pdf_bytes = await pdf_service.download_pdf(slide_deck['pdf_url'])
+            return await self.extract(slide_deck, pdf_bytes)
+        except Exception as e:
+            # Remember the failure so the deck's other slides go straight to vision
+            print(f"Error extracting text layer of deck {slide_deck_id}: {e}")
+            self._store(slide_deck_id, slide_deck['user_id'], [])
+            return []
+
+    async def route_slide(
+        self,
+        user_data: dict,
+        slide_deck_id: str,
+        slide_number: int
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Text to summarize a slide from, if its page is text-heavy
+
+        The first slide of a deck downloads and extracts the PDF. If that takes
+        longer than TEXT_LAYER_WAIT_TIMEOUT the slide goes to vision, and the
+        extraction carries on in the background for the slides that follow.
+
+        :param user_data: Dictionary containing user ID and token
+        :param slide_deck_id: ID of the slide deck
+        :param slide_number: Slide number (1-based page number)
+        :return: The slide's and previous slide's text, or (None, None) to
+                 summarize it from the image
+        """
+        if not settings.SUMMARY_TEXT_LAYER:
+            return None, None
+
+        entry = self._decks.get(slide_deck_id)
+        if entry is not None and entry[0] == user_data["user_id"]:
+            self._decks.move_to_end(slide_deck_id)
+            return self.route(entry[1], slide_number)
+
+        try:
+            pages = await asyncio.wait_for(
+                self._extractions.do(
+                    (slide_deck_id, user_data["user_id"]),
+                    lambda: self._load(slide_deck_id, user_data)
+                ),
+                self.wait_timeout
+            )
+        except Exception as e:
+            # Timed out, or the deck couldn't be looked up
+            print(f"Text layer of deck {slide_deck_id} unavailable: {e!r}")
+            pages = None
+
+        if pages is None:
+            self.unavailable_slides += 1
+            return None, None
+        return self.route(pages, slide_number)
+
+    def stats(self) -> dict:
+        return {
+            "decks": len(self._decks),
+            "text_slides": self.text_slides,
+            "vision_slides": self.vision_slides,
+            "unavailable_slides": self.unavailable_slides,
+        }
+
+
+text_layer_service = TextLayerService()
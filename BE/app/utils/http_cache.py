@@ -0,0 +1,128 @@
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the values that determine a response
+
+    :param parts: JSON-serializable values (list version, query parameters, ...)
+    :return: ETag header value
+    """
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+    return etag.removeprefix('W/') in candidates
+
+
+def list_version(rows: Iterable[dict], timestamp_column: str) -> dict:
+    """
+    Version of a list of rows: its size and newest timestamp
+
+    Adding or editing a row moves the newest timestamp and removing one
+    changes the count, so the version changes whenever the list does.
+
+    :param rows: Rows including timestamp_column
+    :param timestamp_column: Column set on insert/update (e.g. "updated_at")
+    :return: {"count": ..., "newest": ...}
+    """
+    count = 0
+    newest = None
+    for row in rows:
+        count += 1
+        timestamp = row.get(timestamp_column)
+        if timestamp and (newest is None or timestamp > newest):
+            newest = timestamp
+    return {"count": count, "newest": newest}
+
+
+def encode_cursor(values: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode('ascii').rstrip('=')
+
+
+def check_timestamp(value: Any):
+    """
+    Cursor check for ISO-8601 timestamps
+    """
+    if not isinstance(value, str):
+        raise ValueError("Not a timestamp")
+    datetime.fromisoformat(value)
+
+
+def check_uuid(value: Any):
+    """
+    Cursor check for UUIDs in their canonical form
+    """
+    if not isinstance(value, str) or str(uuid.UUID(value)) != value.lower():
+        raise ValueError("Not a UUID")
+
+
+def check_int(value: Any):
+    """
+    Cursor check for integers
+    """
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError("Not an integer")
+
+
+def decode_cursor(cursor: Optional[str], fields: Dict[str, Callable[[Any], None]]) -> Optional[dict]:
+    """
+    Decode a pagination cursor from encode_cursor
+
+    Cursors come from the client and their values end up in PostgREST
+    filters, so every value is checked against its expected type.
+
+    :param cursor: Cursor sent by the client
+    :param fields: Keys the cursor must contain, each with a check that
+                   raises ValueError if the value is not of the expected type
+    :raises HTTPException: 400 if the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, dict) or any(key not in values for key in fields):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        for key, check in fields.items():
+            check(values[key])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_columns(columns: Optional[str], allowed: Iterable[str], required: Iterable[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated column selection
+
+    :param columns: Requested columns, or None for all
+    :param allowed: Columns that may be selected
+    :param required: Columns always returned (keys used for cursors and ETags)
+    :return: Columns to select, or None for all
+    :raises HTTPException: 400 on unknown columns
+    """
+    if not columns:
+        return None
+    requested = [column.strip() for column in columns.split(',') if column.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    return list(dict.fromkeys([*required, *requested]))
@@ -0,0 +1,64 @@
+import time
+
+from fastapi.responses import JSONResponse
+
+from app.services.metrics_service import metrics_service
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse that records rendering time as the request's serialization phase
+    """
+
+    def render(self, content) -> bytes:
+        with metrics_service.phase('serialization'):
+            return super().render(content)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording each request's latency and phase breakdown
+
+    Timing runs until the last body chunk is sent, so streamed responses are
+    measured end to end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        phases = metrics_service.start_request()
+        start = time.perf_counter()
+        status = 500
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            route = scope.get('route')
+            metrics_service.finish_request(
+                phases,
+                time.perf_counter() - start,
+                route=route.path if route else 'unmatched',
+                method=scope['method'],
+                status=status
+            )
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
@@ -0,0 +1,19 @@
+import json
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # Stop reverse proxies (nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Format a server-sent event
+
+    :param event: Event name (e.g. "token", "done", "error")
+    :param data: JSON-serializable event payload
+    :return: Encoded event ready to be written to the stream
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
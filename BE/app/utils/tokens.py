@@ -0,0 +1,9 @@
+import math
+from typing import Optional
+
+# Rough GPT tokenizer ratio for English text; close enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
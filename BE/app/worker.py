@@ -0,0 +1,178 @@
+"""
+Summarization worker pool
+
+Runs jobs from the durable job queue, separately from the web process.
+Start as many as needed next to the web processes:
+
+    python -m app.worker [--concurrency N]
+
+Every worker calls OpenAI with its own gateway, so set LLM_PROCESSES to the
+number of web plus worker processes to split the rate limits between them.
+A single-process deployment can instead set JOB_WORKER_PROCESSES to have the
+web process start its workers.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+from typing import List
+
+from app.config import settings
+from app.resources import resources
+from app.services.deck_summarization_service import deck_summarization_service
+from app.services.job_queue import job_queue
+from app.services.llm_gateway import LLMOverloadedError
+
+HANDLERS = {
+    'deck': deck_summarization_service.run_deck_job,
+    'slide': deck_summarization_service.run_slide_job,
+}
+
+# Finished jobs are pruned this often
+PRUNE_INTERVAL = 3600
+
+
+class Worker:
+    """
+    Claims jobs from the queue and runs up to `concurrency` of them at a time
+
+    The lease of each running job is renewed until it finishes; a job whose
+    lease is lost (e.g. the worker stalled and another claimed it) is
+    stopped. On SIGTERM the worker stops claiming, gives running jobs
+    SHUTDOWN_TIMEOUT to finish and puts the rest back in the queue.
+    """
+
+    def __init__(self, concurrency: int = settings.SUMMARIZE_CONCURRENCY, poll_interval: float = settings.JOB_POLL_INTERVAL):
+        self.id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _renew_lease(self, job: dict, work: asyncio.Task):
+        while True:
+            await asyncio.sleep(job_queue.lease / 3)
+            if not await job_queue.renew(job['id'], self.id):
+                print(f"Lost the lease on job {job['id']}, stopping it")
+                work.cancel()
+                return
+
+    async def _run_job(self, job: dict):
+        handler = HANDLERS.get(job['kind'])
+        if handler is None:
+            print(f"Job {job['id']} has unknown kind {job['kind']}")
+            await job_queue.fail(job, self.id, f"Unknown job kind: {job['kind']}")
+            return
+
+        work = asyncio.create_task(handler(job))
+        renew = asyncio.create_task(self._renew_lease(job, work))
+        try:
+            result = await work
+        except asyncio.CancelledError:
+            if not asyncio.current_task().cancelling():
+                # Lease lost: the job is someone else's now, leave it be
+                return
+            await job_queue.release(job['id'], self.id)
+            raise
+        except LLMOverloadedError as e:
+            await job_queue.fail(job, self.id, str(e), retry_after=e.retry_after)
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+            await job_queue.fail(job, self.id, str(e))
+        else:
+            await job_queue.succeed(job['id'], self.id, result)
+        finally:
+            renew.cancel()
+
+    async def _wait_for_stop(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run_slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await job_queue.claim(self.id)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                await self._wait_for_stop(self.poll_interval)
+                continue
+            await self._run_job(job)
+
+    async def _prune(self):
+        while not self._stopping.is_set():
+            try:
+                await job_queue.prune()
+            except Exception as e:
+                print(f"Error pruning finished jobs: {e}")
+            await self._wait_for_stop(PRUNE_INTERVAL)
+
+    async def run(self):
+        await resources.startup()
+        print(f"Worker {self.id} running {self.concurrency} jobs at a time")
+
+        slots = [asyncio.create_task(self._run_slot()) for _ in range(self.concurrency)]
+        prune = asyncio.create_task(self._prune())
+        await self._stopping.wait()
+
+        # Running jobs get a grace period, then go back to the queue
+        _, pending = await asyncio.wait(slots, timeout=settings.SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*slots, prune, return_exceptions=True)
+
+        await resources.shutdown()
+
+
+async def start_worker_processes(count: int) -> List[asyncio.subprocess.Process]:
+    """
+    Start worker processes alongside the web process
+
+    :param count: Number of processes
+    :return: The started processes
+    """
+    return [
+        await asyncio.create_subprocess_exec(sys.executable, '-m', 'app.worker')
+        for _ in range(count)
+    ]
+
+
+async def stop_worker_processes(processes: List[asyncio.subprocess.Process], timeout: float):
+    """
+    Ask worker processes to stop, killing those that don't within the timeout
+    """
+    for process in processes:
+        if process.returncode is None:
+            process.terminate()
+    for process in processes:
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run summarization jobs from the job queue")
+    parser.add_argument('--concurrency', type=int, default=settings.SUMMARIZE_CONCURRENCY)
+    args = parser.parse_args()
+
+    async def run():
+        worker = Worker(concurrency=args.concurrency)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
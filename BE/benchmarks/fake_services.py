@@ -0,0 +1,260 @@
+"""
+Local stand-ins for Supabase (PostgREST, auth, storage) and the OpenAI API
+
+Serves just enough of each API for the backend's request paths, with
+configurable latency injected into every response. Data is generated, not
+stored: reads return a fixed set of decks and summaries, writes echo their
+rows back, and every deck's PDF is the same small generated text PDF.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import jwt
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+FAKE_SUMMARY_WORDS = (
+    "lecture slide covers key definitions examples and derivations "
+    "including assumptions results limitations and connections to earlier material"
+).split()
+
+
+@dataclass
+class Latency:
+    """
+    Injected latency in seconds; each delay is jittered by +/- jitter (a fraction)
+    """
+    db: float = 0.02
+    auth: float = 0.03
+    storage: float = 0.05
+    llm: float = 0.8
+    llm_token: float = 0.01
+    embedding: float = 0.1
+    jitter: float = 0.2
+
+    async def sleep(self, seconds: float):
+        if seconds > 0:
+            await asyncio.sleep(seconds * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+def fake_summary(seed: str, words: int = 60) -> str:
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(FAKE_SUMMARY_WORDS) for _ in range(words))
+
+
+def fake_embedding(text: str, dimensions: int) -> list:
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+    return vector
+
+
+def fake_pdf(pages: int) -> bytes:
+    """
+    A minimal PDF with one line of fake summary text per page
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{4 + 2 * i} 0 R".encode() for i in range(pages))
+        + f"] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        text = fake_summary(f"page-{i + 1}", words=12).encode()
+        stream = b"BT /F1 18 Tf 40 300 Td (" + text + b") Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 720 405] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def _eq_filter(request: Request, column: str):
+    value = request.query_params.get(column)
+    return value[3:] if value and value.startswith('eq.') else None
+
+
+def create_app(latency: Latency, decks_per_user: int = 10, slides_per_deck: int = 30) -> FastAPI:
+    app = FastAPI()
+    deck_pdf = fake_pdf(slides_per_deck)
+
+    # PostgREST
+
+    @app.get("/rest/v1/SlideDeck")
+    async def list_slide_decks(request: Request):
+        await latency.sleep(latency.db)
+        user_id = _eq_filter(request, 'user_id') or str(uuid.uuid4())
+        deck_id = _eq_filter(request, 'id')
+        deck_ids = [deck_id] if deck_id else [f"{user_id}-deck-{i}" for i in range(decks_per_user)]
+        base_url = str(request.base_url).rstrip('/')
+        return [
+            {
+                "id": deck_id,
+                "user_id": user_id,
+                "title": f"Deck {deck_id}",
+                "pdf_url": f"{base_url}/storage/v1/object/public/slidedecks/{deck_id}.pdf",
+                "created_at": "2025-01-01T00:00:00",
+            }
+            for deck_id in deck_ids
+        ]
+
+    @app.get("/rest/v1/SlideSummary")
+    async def list_slide_summaries(request: Request):
+        await latency.sleep(latency.db)
+        deck_id = _eq_filter(request, 'slide_deck_id') or 'deck'
+        slide_number = _eq_filter(request, 'slide_number')
+        slide_numbers = [int(slide_number)] if slide_number else range(1, slides_per_deck + 1)
+        return [
+            {
+                "id": f"{deck_id}-{n}",
+                "slide_deck_id": deck_id,
+                "slide_number": n,
+                "summary_text": fake_summary(f"{deck_id}-{n}"),
+                "updated_at": "2025-01-01T00:00:00",
+            }
+            for n in slide_numbers
+        ]
+
+    @app.post("/rest/v1/{table}")
+    async def upsert_rows(table: str, request: Request):
+        await latency.sleep(latency.db)
+        data = await request.json()
+        rows = data if isinstance(data, list) else [data]
+        return JSONResponse([{"id": str(uuid.uuid4()), **row} for row in rows], status_code=201)
+
+    @app.delete("/rest/v1/{table}")
+    async def delete_rows(table: str, request: Request):
+        await latency.sleep(latency.db)
+        row_id = _eq_filter(request, 'id')
+        return [{"id": row_id}] if row_id else []
+
+    # Auth (only reached when tokens can't be verified locally)
+
+    @app.get("/auth/v1/user")
+    async def get_user(request: Request):
+        await latency.sleep(latency.auth)
+        token = request.headers.get('authorization', '').removeprefix('Bearer ')
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return {"id": claims['sub'], "aud": "authenticated", "role": "authenticated",
+                "app_metadata": {}, "user_metadata": {}, "created_at": "2025-01-01T00:00:00Z"}
+
+    # Storage
+
+    @app.get("/storage/v1/object/public/{bucket}/{path:path}")
+    async def download_object(bucket: str, path: str):
+        await latency.sleep(latency.storage)
+        return Response(deck_pdf, media_type='application/pdf')
+
+    @app.delete("/storage/v1/object/{bucket}")
+    async def remove_objects(bucket: str, request: Request):
+        await latency.sleep(latency.storage)
+        body = await request.json()
+        return [{"name": name} for name in body.get('prefixes', [])]
+
+    # OpenAI
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt_tokens = len(json.dumps(body['messages'])) // 4
+        words = fake_summary(str(time.time()), words=min(body.get('max_tokens') or 80, 80)).split()
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        created = int(time.time())
+
+        if not body.get('stream'):
+            await latency.sleep(latency.llm + latency.llm_token * len(words))
+            return {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": body['model'],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": ' '.join(words)}}],
+                "usage": usage,
+            }
+
+        async def events():
+            await latency.sleep(latency.llm)
+            for word in words:
+                await latency.sleep(latency.llm_token)
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": body['model'],
+                         "choices": [{"index": 0, "delta": {"content": word + ' '}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            if (body.get('stream_options') or {}).get('include_usage'):
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": body['model'], "choices": [], "usage": usage}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": []}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await latency.sleep(latency.embedding)
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        dimensions = body.get('dimensions') or 256
+        tokens = sum(len(text) // 4 for text in texts)
+        return {
+            "object": "list", "model": body['model'],
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+                     for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake Supabase and OpenAI services")
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--decks-per-user', type=int, default=10)
+    parser.add_argument('--slides-per-deck', type=int, default=30)
+    parser.add_argument('--db-latency', type=float, default=Latency.db)
+    parser.add_argument('--auth-latency', type=float, default=Latency.auth)
+    parser.add_argument('--storage-latency', type=float, default=Latency.storage)
+    parser.add_argument('--llm-latency', type=float, default=Latency.llm)
+    parser.add_argument('--llm-token-latency', type=float, default=Latency.llm_token)
+    parser.add_argument('--embedding-latency', type=float, default=Latency.embedding)
+    parser.add_argument('--jitter', type=float, default=Latency.jitter)
+    args = parser.parse_args()
+
+    latency = Latency(
+        db=args.db_latency,
+        auth=args.auth_latency,
+        storage=args.storage_latency,
+        llm=args.llm_latency,
+        llm_token=args.llm_token_latency,
+        embedding=args.embedding_latency,
+        jitter=args.jitter
+    )
+    uvicorn.run(
+        create_app(latency, args.decks_per_user, args.slides_per_deck),
+        host='127.0.0.1',
+        port=args.port,
+        log_level='warning'
+    )
@@ -0,0 +1,319 @@
+"""
+Load-test the backend against local Supabase and OpenAI stand-ins
+
+Starts benchmarks.fake_services and the real app (uvicorn app.main:app) as
+separate processes, then drives a weighted mix of requests at each
+concurrency level and reports throughput and p50/p95/p99 latency per
+endpoint. Nothing leaves the machine.
+
+Run from BE/:
+
+    python -m benchmarks.run --concurrency 1,8,32,64 --duration 20
+    python -m benchmarks.run --mix generate=1,chat=2,summaries=4,decks=3 --llm-latency 1.5
+    python -m benchmarks.run --json results.json
+
+The app's own per-phase breakdown is printed from /metrics after the run.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+import jwt
+
+BE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JWT_SECRET = 'benchmark-jwt-secret-with-at-least-32-bytes'
+DEFAULT_MIX = 'generate=1,chat=2,summaries=4,decks=3'
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def make_token(user_id: str) -> str:
+    return jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 24 * 3600},
+        JWT_SECRET,
+        algorithm='HS256'
+    )
+
+
+def make_slide_images(count: int, size=(1280, 720)) -> List[str]:
+    """
+    Slide-like JPEG data URLs, each different so they hash differently
+    """
+    from PIL import Image, ImageDraw
+
+    images = []
+    for i in range(count):
+        rng = random.Random(i)
+        image = Image.new('RGB', size, 'white')
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            draw.rectangle([x, y, x + rng.randrange(20, 300), y + rng.randrange(5, 40)],
+                           fill=tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85)
+        images.append(f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}")
+    return images
+
+
+class Workload:
+    def __init__(self, users: int, decks_per_user: int, slides_per_deck: int, images: List[str]):
+        self.users = [f"00000000-0000-4000-8000-{i:012d}" for i in range(users)]
+        self.tokens = {user_id: make_token(user_id) for user_id in self.users}
+        self.decks_per_user = decks_per_user
+        self.slides_per_deck = slides_per_deck
+        self.images = images
+
+    def pick(self):
+        user_id = random.choice(self.users)
+        deck_id = f"{user_id}-deck-{random.randrange(self.decks_per_user)}"
+        slide_number = random.randint(1, self.slides_per_deck)
+        return user_id, deck_id, slide_number
+
+    def request(self, operation: str) -> dict:
+        user_id, deck_id, slide_number = self.pick()
+        headers = {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+        if operation == 'generate':
+            return dict(method='POST', url='/api/slide-summaries/generate', headers=headers, json={
+                "slide_deck_id": deck_id,
+                "slide_number": slide_number,
+                "slide_image": random.choice(self.images),
+                "previous_summary": "The previous slide introduced the topic." if slide_number > 1 else None,
+            })
+        if operation == 'chat':
+            return dict(method='POST', url='/api/chat', headers=headers, json={
+                "userMessage": "Can you explain the key definitions and how they relate to the examples?",
+                "slideDeckId": deck_id,
+                "slideNumber": slide_number,
+                "slideSummary": "This slide covers key definitions with examples.",
+                "chatHistory": [f"User: question {i} Assistant: answer {i}" for i in range(random.randrange(8))],
+            })
+        if operation == 'summaries':
+            return dict(method='GET', url='/api/slide-summaries', headers=headers,
+                        params={"slide_deck_id": deck_id})
+        if operation == 'decks':
+            return dict(method='GET', url='/api/slide-decks', headers=headers)
+        raise ValueError(f"Unknown operation: {operation}")
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, mix: Dict[str, float],
+                    concurrency: int, duration: float) -> dict:
+    operations, weights = zip(*mix.items())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            operation = random.choices(operations, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await client.request(**workload.request(operation))
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                latencies[operation].append(elapsed)
+            else:
+                errors[operation] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    result = {"concurrency": concurrency, "seconds": wall, "operations": {}}
+    for operation in list(operations) + ['all']:
+        values = [v for vs in latencies.values() for v in vs] if operation == 'all' else latencies[operation]
+        failed = sum(errors.values()) if operation == 'all' else errors[operation]
+        result["operations"][operation] = {
+            "requests": len(values),
+            "errors": failed,
+            "throughput": len(values) / wall,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+    return result
+
+
+def print_result(result: dict):
+    print(f"\nconcurrency {result['concurrency']} ({result['seconds']:.1f}s)")
+    print(f"  {'operation':<10} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, stats in result["operations"].items():
+        print(
+            f"  {operation:<10} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput']:>8.1f}"
+            f" {stats['p50'] * 1000:>8.0f} {stats['p95'] * 1000:>8.0f} {stats['p99'] * 1000:>8.0f}"
+        )
+
+
+def print_phase_breakdown(metrics_text: str):
+    """
+    Average time per request phase and route, from the app's /metrics
+    """
+    sums = defaultdict(dict)
+    counts = {}
+    for line in metrics_text.splitlines():
+        if not line.startswith('deck_study_buddy_request_phase_seconds_'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        labels = dict(part.split('=', 1) for part in name[name.index('{') + 1:-1].split(','))
+        route, phase = labels['route'].strip('"'), labels['phase'].strip('"')
+        if name.startswith('deck_study_buddy_request_phase_seconds_sum'):
+            sums[route][phase] = float(value)
+        elif name.startswith('deck_study_buddy_request_phase_seconds_count') and phase == 'app':
+            counts[route] = float(value)
+
+    print("\naverage ms per request by phase (from /metrics)")
+    phases = ['auth', 'db', 'storage', 'llm_queue', 'llm', 'serialization', 'app']
+    print(f"  {'route':<32}" + ''.join(f"{phase:>14}" for phase in phases))
+    for route, phase_sums in sums.items():
+        if route in ('/metrics', '/health') or not counts.get(route):
+            continue
+        print(f"  {route:<32}" + ''.join(
+            f"{phase_sums.get(phase, 0) / counts[route] * 1000:>14.1f}" for phase in phases
+        ))
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the backend against local fake services")
+    parser.add_argument('--concurrency', default='1,8,32,64', help="Comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=15, help="Seconds per concurrency level")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Weighted operations: generate, chat, summaries, decks")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--decks-per-user', type=int, default=10)
+    parser.add_argument('--slides-per-deck', type=int, default=30)
+    parser.add_argument('--images', type=int, default=64, help="Distinct slide images to send")
+    parser.add_argument('--summary-cache', action='store_true', help="Keep the summary cache enabled")
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--storage-latency', type=float, default=0.05)
+    parser.add_argument('--llm-latency', type=float, default=0.8)
+    parser.add_argument('--llm-token-latency', type=float, default=0.01)
+    parser.add_argument('--embedding-latency', type=float, default=0.1)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes for the app")
+    parser.add_argument('--json', help="Write results to this file")
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (part.split('=') for part in args.mix.split(','))}
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    fake_port, app_port = free_port(), free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {
+            **os.environ,
+            "SUPABASE_URL": fake_url,
+            "SUPABASE_ANON_KEY": make_token('anon'),
+            "SUPABASE_SERVICE_KEY": make_token('service'),
+            "SUPABASE_JWT_SECRET": JWT_SECRET,
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_BASE_URL": f"{fake_url}/v1",
+            "SUMMARY_CACHE_PATH": os.path.join(cache_dir, 'summary_cache.sqlite3'),
+            "RETRIEVAL_INDEX_DIR": os.path.join(cache_dir, 'retrieval'),
+            "JOB_QUEUE_PATH": os.path.join(cache_dir, 'jobs.sqlite3'),
+            # The workload doesn't submit jobs
+            "JOB_WORKER_PROCESSES": "0",
+            "METRICS_TOKEN": "",
+        }
+        if not args.summary_cache:
+            env["SUMMARY_CACHE_MAX_BYTES"] = "0"
+        # Measure our own code, not OpenAI quotas, unless limits are set explicitly
+        env.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+        env.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+        # Every request sends its own image: measure the vision path without
+        # the text layer answering from the PDF or prefetch racing the workload
+        env.setdefault("SUMMARY_TEXT_LAYER", "false")
+        env.setdefault("PREFETCH_SLIDES", "0")
+
+        fake = subprocess.Popen([
+            sys.executable, '-m', 'benchmarks.fake_services',
+            '--port', str(fake_port),
+            '--decks-per-user', str(args.decks_per_user),
+            '--slides-per-deck', str(args.slides_per_deck),
+            '--db-latency', str(args.db_latency),
+            '--storage-latency', str(args.storage_latency),
+            '--llm-latency', str(args.llm_latency),
+            '--llm-token-latency', str(args.llm_token_latency),
+            '--embedding-latency', str(args.embedding_latency),
+            '--jitter', str(args.jitter),
+        ], cwd=BE_DIR, env=env)
+        server = subprocess.Popen([
+            sys.executable, '-m', 'uvicorn', 'app.main:app',
+            '--host', '127.0.0.1', '--port', str(app_port),
+            '--workers', str(args.workers), '--log-level', 'warning',
+        ], cwd=BE_DIR, env=env)
+
+        try:
+            wait_for(f"{fake_url}/docs", fake)
+            wait_for(f"{app_url}/health", server)
+
+            workload = Workload(args.users, args.decks_per_user, args.slides_per_deck, make_slide_images(args.images))
+            results = []
+
+            async def run_all():
+                limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+                async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120) as client:
+                    for level in levels:
+                        result = await run_level(client, workload, mix, level, args.duration)
+                        print_result(result)
+                        results.append(result)
+                    if args.workers == 1:
+                        print_phase_breakdown((await client.get('/metrics')).text)
+
+            asyncio.run(run_all())
+
+            if args.json:
+                with open(args.json, 'w') as f:
+                    json.dump({"args": vars(args), "results": results}, f, indent=2)
+        finally:
+            for process in (server, fake):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+-- Deleting a slide deck removes its summaries in the same statement:
+-- SupabaseService.delete_slide_deck deletes only the SlideDeck row and
+-- relies on this cascade.
+
+-- Summaries of decks deleted before the foreign key existed
+delete from public."SlideSummary" summary
+where not exists (
+    select 1 from public."SlideDeck" deck where deck.id = summary.slide_deck_id
+);
+
+-- Replace the existing foreign key, whatever it was named
+do $$
+declare
+    existing_constraint text;
+begin
+    for existing_constraint in
+        select con.conname
+        from pg_constraint con
+        join pg_attribute att
+            on att.attrelid = con.conrelid and att.attnum = any (con.conkey)
+        where con.contype = 'f'
+            and con.conrelid = 'public."SlideSummary"'::regclass
+            and con.confrelid = 'public."SlideDeck"'::regclass
+            and att.attname = 'slide_deck_id'
+    loop
+        execute format('alter table public."SlideSummary" drop constraint %I', existing_constraint);
+    end loop;
+end
+$$;
+
+alter table public."SlideSummary"
+    add constraint "SlideSummary_slide_deck_id_fkey"
+    foreign key (slide_deck_id) references public."SlideDeck" (id)
+    on delete cascade;
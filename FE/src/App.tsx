@@ -25,7 +25,6 @@ function App() {
   const [totalSlides, setTotalSlides] = useState(0);
   const [isProcessing, setIsProcessing] = useState(false);
   const [canNavigateNext, setCanNavigateNext] = useState(true);
-  const [slideImages, setSlideImages] = useState<File[]>([]);
   const [chatHistory, setChatHistory] = useState<string[]>([]);
   const [user, setUser] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
@@ -281,18 +280,11 @@ function App() {
           // If we have existing summaries, use them
           console.log('Using existing summaries from backend');
           setStudyGuide({ sections: existingSummaries });
-          
-          // We still need to capture the first slide image for the UI
-          const firstSlideImage = await captureSlide(file, 1);
-          if (firstSlideImage) {
-            setSlideImages([firstSlideImage]);
-          }
         } else {
           // If no existing summaries, process the first slide
           const firstSlideImage = await captureSlide(file, 1);
           console.log('First slide image:', firstSlideImage);
           if (firstSlideImage) {
-            setSlideImages([firstSlideImage]);
             const firstSection = await processFirstSlide(firstSlideImage, slideDeckId);
             setStudyGuide({ sections: [firstSection] });
           } else {
@@ -381,26 +373,7 @@ function App() {
       const newSlideImage = await captureSlide(selectedFile, newSlide);
       if (!newSlideImage) throw new Error('Failed to capture slide image');
 
-      // Check if we have the previous slide image
-      const previousSlideImageName = `slide_${newSlide - 1}.png`;
-      let previousSlideImage = slideImages.find(img => img.name === previousSlideImageName);
-      
-      // If previous slide image doesn't exist, capture it
-      if (!previousSlideImage) {
-        console.log(`Previous slide image ${previousSlideImageName} not found, capturing it now...`);
-        previousSlideImage = await captureSlide(selectedFile, newSlide - 1);
-        
-        if (!previousSlideImage) {
-          throw new Error('Failed to capture previous slide image');
-        }
-        
-        // Add the previous slide image to our collection
-        setSlideImages(prev => [...prev, previousSlideImage!]);
-      }
-
-      // Add the new slide image to our collection
-      setSlideImages(prev => [...prev, newSlideImage]);
-
+      // The server keeps the previous slide's image; only its number is sent
       // Get the previous slide's summary for context
       const previousSection = studyGuide.sections.find(s => s.slideNumber === newSlide - 1);
       if (!previousSection) throw new Error('Previous summary data not found');
@@ -410,7 +383,6 @@ function App() {
         newSlide,
         newSlideImage,
         previousSection,
-        previousSlideImage,
         currentSlideDeckId || undefined
       );
 
@@ -652,12 +624,6 @@ function App() {
         const totalPages = pdf.numPages;
         setTotalSlides(totalPages);
 
-        // Capture the first slide image for display
-        const firstSlideImage = await captureSlide(pdfFile, 1);
-        if (firstSlideImage) {
-          setSlideImages([firstSlideImage]);
-        }
-
         setUploadStatus('complete');
         setIsProcessing(false);
       };
@@ -677,7 +643,6 @@ function App() {
     setCurrentSlideDeckId(null);
     setSelectedFile(null);
     setStudyGuide({ sections: [] });
-    setSlideImages([]);
     setUploadStatus('idle');
     setCurrentSlide(1);
   };
@@ -130,7 +130,6 @@ async function processNextSlide(
   slideNumber: number,
   currentSlideImage: File,
   previousSection: StudySection,
-  previousSlideImage: File,
   slideDeckId?: string
 ): Promise<StudySection> {
   try {
@@ -142,7 +141,7 @@ async function processNextSlide(
       throw new Error('Authentication required');
     }
     
-    // Convert images to base64
+    // Convert image to base64
     const currentImageBase64 = await new Promise<string>((resolve, reject) => {
       const reader = new FileReader();
       reader.onloadend = () => resolve(reader.result as string);
@@ -150,14 +149,8 @@ async function processNextSlide(
       reader.readAsDataURL(currentSlideImage);
     });
     
-    const previousImageBase64 = await new Promise<string>((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => resolve(reader.result as string);
-      reader.onerror = reject;
-      reader.readAsDataURL(previousSlideImage);
-    });
-    
-    // Call backend API to generate summary
+    // Call backend API to generate summary; the server keeps the previous
+    // slide's image from the last call, so it is referenced by number only
     const response = await fetch(`${import.meta.env.VITE_API_URL}/api/slide-summaries/generate`, {
       method: 'POST',
       headers: {
@@ -169,7 +162,6 @@ async function processNextSlide(
         slide_deck_id: slideDeckId || 'temp',
         slide_number: slideNumber,
         slide_image: currentImageBase64,
-        previous_slide_image: previousImageBase64,
         previous_summary: previousSection.summary,
         previous_slide_number: previousSection.slideNumber
       })